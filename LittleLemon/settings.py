@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 
+from . import sqlite
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'LittleLemonAPI.profiling.ProfilingMiddleware',
+    'LittleLemonAPI.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,11 +82,59 @@ WSGI_APPLICATION = 'LittleLemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# WAL, busy timeout and other pragmas on every connection and write
+# transactions started with BEGIN IMMEDIATE; see LittleLemon/sqlite and
+# manage.py bench_contention. Connections are not kept between requests
+# (CONN_MAX_AGE = 0): under ASGI, which the async views and the event stream
+# need, persistent connections can be left open per async context. Raise
+# conn_max_age only for a WSGI-only deployment.
 DATABASES = {
+    'default': sqlite.database(BASE_DIR / 'db.sqlite3'),
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+
+# Menu and category list pages, keyed by catalog version and query parameters.
+# 'catalog' is process-local, so a write reaches the other workers only when
+# their pages expire after LOCAL_TIMEOUT seconds; use a cache shared by all
+# workers (e.g. Redis) to cache for TIMEOUT and invalidate everywhere.
+CATALOG_CACHE = {
+    'ALIAS': 'catalog',
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 5,
+    'ENABLED': True,
+}
+
+# Group names per user, shared by the permission classes and serializers.
+# 'default' is process-local, so role changes reach the other workers only
+# when their entries expire after LOCAL_TIMEOUT seconds; use a cache shared by
+# all workers (e.g. Redis) to cache for TIMEOUT and invalidate everywhere.
+ROLE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 5,
+}
+
+# In-process token -> user cache used by CachedTokenAuthentication.
+# Revocations are recorded in REVOCATION_ALIAS; 'default' is process-local, so
+# point it at a cache shared by all workers (e.g. Redis) for a logout or a
+# deactivation in one process to revoke the cached tokens in the others.
+TOKEN_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    'REVOCATION_ALIAS': 'default',
 }
 
 
@@ -129,9 +181,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'LittleLemonAPI.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication', 
     ],
+    # Picked by the Accept header (or ?format=): JSON, orjson-backed when
+    # installed with the same bytes as rest_framework's JSONRenderer, then
+    # columnar JSON and MessagePack (when msgpack is installed)
+    'DEFAULT_RENDERER_CLASSES': [
+        'LittleLemonAPI.renderers.FastJSONRenderer',
+        'LittleLemonAPI.renderers.ColumnarJSONRenderer',
+        'LittleLemonAPI.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'LittleLemonAPI.renderers.ContentNegotiation',
+    # Read by LittleLemonAPI.compression.CompressionMiddleware: zstd (when
+    # zstandard is installed) or gzip by Accept-Encoding, for bodies of at
+    # least MIN_SIZE bytes
+    'COMPRESSION': {
+        'ENABLED': True,
+        'MIN_SIZE': 1024,
+        'ENCODINGS': ['zstd', 'gzip'],
+        'LEVELS': {'gzip': 6, 'zstd': 3},
+    },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination', 
     'PAGE_SIZE': 3,
     'DEFAULT_FILTER_BACKENDS': [
@@ -139,6 +210,57 @@ REST_FRAMEWORK = {
     'rest_framework.filters.OrderingFilter',
     'rest_framework.filters.SearchFilter',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'LittleLemonAPI.throttles.UserTokenBucketThrottle',
+        'LittleLemonAPI.throttles.EndpointTokenBucketThrottle',
+    ],
+    # Per client across the API by role, then per client and endpoint
+    # ('<url name or throttle_scope>[.<role>]', falling back to 'endpoint[.<role>]')
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '60/min',
+        'customer': '300/min',
+        'delivery_crew': '600/min',
+        'manager': '1200/min',
+        'endpoint': '120/min',
+        'endpoint.manager': '600/min',
+        'order-list-create': '60/min',
+        'order-list-create.delivery_crew': '120/min',
+        'order-list-create.manager': '300/min',
+        'async-order-list': '60/min',
+        'async-order-list.delivery_crew': '120/min',
+        'async-order-list.manager': '300/min',
+    },
+}
+
+# Share of requests profiled into Server-Timing headers and the histograms
+# of api/metrics/; raise it while investigating a slow endpoint
+PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,
+    'SERVER_TIMING': True,
+}
+
+# Token bucket store behind the throttle classes, kept in process memory
+THROTTLING = {
+    'ENABLED': True,
+    'MAX_KEYS': 100000,
+}
+
+# Server-sent order events (LittleLemonAPI/events.py): seconds between
+# keep-alive comments and before a stream is closed for the client to
+# reconnect, events a slow client may fall behind, and events kept for
+# Last-Event-ID replay
+ORDER_EVENTS = {
+    'KEEPALIVE': 15,
+    'MAX_AGE': 300,
+    'QUEUE_SIZE': 256,
+    'HISTORY': 1024,
+}
+
+# List endpoints built from values() rows instead of the serializers
+# (LittleLemonAPI/fastpath.py); same output
+FASTPATH = {
+    'ENABLED': True,
 }
 
 DJOSER ={
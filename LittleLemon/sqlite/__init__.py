@@ -0,0 +1,52 @@
+"""
+SQLite connection profile for serving traffic.
+
+``database()`` builds the DATABASES entry; its ENGINE is this package, whose
+DatabaseWrapper (base.py) applies PRAGMAS to every new connection and starts
+``atomic()`` blocks with ``BEGIN <TRANSACTION_MODE>``.
+
+- journal_mode=WAL lets readers run alongside the single writer. It is
+  stored in the database file, so LittleLemonAPI's migration 0007 sets it
+  once instead of every connection rewriting the file (and leaving -wal and
+  -shm files next to it) on any manage.py command.
+- busy_timeout makes a writer wait for the lock instead of failing with
+  "database is locked".
+- BEGIN IMMEDIATE takes the write lock up front, so a transaction that reads
+  and then writes (checkout) waits on busy_timeout too. A deferred BEGIN
+  would fail straight away when it tries to upgrade its read lock.
+- synchronous=NORMAL is durable in WAL mode except for the last transactions
+  before a power loss, and avoids an fsync per commit.
+- mmap_size and cache_size keep hot pages in memory.
+
+Connections are closed at the end of each request (CONN_MAX_AGE = 0). The
+async views and the event stream run under ASGI, where every async context
+opens its own connection and Django may never close a persistent one; only
+a WSGI-only deployment should pass a ``conn_max_age``.
+"""
+JOURNAL_MODE = 'WAL'
+
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 134217728,
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
+
+def database(name, conn_max_age=0, pragmas=None, transaction_mode='IMMEDIATE'):
+    """DATABASES entry for the SQLite file ``name``, kept open for ``conn_max_age`` seconds."""
+    return {
+        'ENGINE': 'LittleLemon.sqlite',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age != 0,
+        'PRAGMAS': {**DEFAULT_PRAGMAS, **(pragmas or {})},
+        'TRANSACTION_MODE': transaction_mode,
+    }
+
+
+def apply_pragmas(connection, pragmas):
+    """Run ``PRAGMA name = value`` for each item on a DB-API sqlite3 connection."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,218 @@
+"""
+Native async versions of the hot read endpoints, mounted under /api/async/.
+
+They use Django's async ORM and return the same JSON as their DRF
+counterparts in views.py, so under an ASGI server a request waiting on the
+database does not hold a worker thread.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import events, search
+from .authentication import detached_user, token_cache
+from .models import Cart, Category, FeaturedItem, MenuItem, Order
+from .pagination import MenuItemCursorPagination, OrderCursorPagination
+from .renderers import FastJSONRenderer
+from .roles import DELIVERY_CREW, MANAGER, get_roles
+from .throttles import throttling_config
+from .serializers import CartSerializer, CategorySerializer, MenuItemSerializer, OrderSerializer
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def error_response(detail, status):
+    headers = {'WWW-Authenticate': 'Token'} if status == 401 else None
+    return json_response({'detail': detail}, status=status, headers=headers)
+
+
+async def authenticate(request):
+    """Token authentication first, then the session, like REST_FRAMEWORK's defaults."""
+    auth = request.headers.get('Authorization', '').split()
+    if auth and auth[0].lower() == 'token':
+        if len(auth) != 2:
+            return None
+        start = time.perf_counter()
+        cached = token_cache.get(auth[1])
+        if cached is not None:
+            token_cache.record(hit=True, seconds=time.perf_counter() - start)
+            return detached_user(cached[0])
+        token = await Token.objects.select_related('user').filter(key=auth[1]).afirst()
+        if token is None or not token.user.is_active:
+            return None
+        token_cache.set(token.key, token.user, token)
+        token_cache.record(hit=False, seconds=time.perf_counter() - start)
+        return token.user
+    user = await sync_to_async(get_user)(request)
+    return user if user.is_authenticated else None
+
+
+async def check_throttles(request):
+    """Apply DEFAULT_THROTTLE_CLASSES like APIView.check_throttles; return the 429 response if throttled."""
+    if not throttling_config()['ENABLED']:
+        return None
+    # Resolve the roles off the event loop so the throttles only read the memo
+    await sync_to_async(get_roles)(request.user)
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            waits.append(throttle.wait())
+    if not waits:
+        return None
+    exc = Throttled(max(waits))
+    return json_response({'detail': exc.detail}, status=exc.status_code, headers={'Retry-After': str(exc.wait)})
+
+
+def async_get(view):
+    """Authenticate and allow GET only, returning DRF-style errors otherwise, also for API exceptions."""
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return error_response(f'Method "{request.method}" not allowed.', status.HTTP_405_METHOD_NOT_ALLOWED)
+        user = await authenticate(request)
+        if user is None:
+            return error_response('Authentication credentials were not provided.', status.HTTP_401_UNAUTHORIZED)
+        request = Request(request)
+        request.user = user
+        throttled = await check_throttles(request)
+        if throttled is not None:
+            return throttled
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            # Raised by the paginators, for an invalid cursor for one
+            return error_response(exc.detail, exc.status_code)
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+@async_get
+async def menu_items(request):
+    queryset = MenuItem.objects.select_related('category')
+    category_id = request.query_params.get('category_id')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    search_query = request.query_params.get('search')
+    if search_query:
+        # Checking for the FTS index touches the database connection
+        queryset = await sync_to_async(search.search_menu_items)(queryset, search_query)
+
+    paginator = MenuItemCursorPagination()
+    page = paginator.paginate_results([item async for item in paginator.get_page_queryset(queryset, request)])
+    serializer = MenuItemSerializer(page, many=True, context={'featured_id': await FeaturedItem.acurrent_id()})
+    return json_response(paginator.get_paginated_response(serializer.data).data)
+
+
+@async_get
+async def menu_item(request, pk):
+    item = await MenuItem.objects.select_related('category').filter(pk=pk).afirst()
+    if item is None:
+        return error_response('Not found.', status.HTTP_404_NOT_FOUND)
+    serializer = MenuItemSerializer(item, context={'featured_id': await FeaturedItem.acurrent_id()})
+    return json_response(serializer.data)
+
+
+@async_get
+async def categories(request):
+    # Same page-number pagination as CategoryListCreateAPIView
+    page_size = api_settings.PAGE_SIZE
+    queryset = Category.objects.order_by('pk')
+    count = await queryset.acount()
+    try:
+        page_number = int(request.query_params.get('page', 1))
+    except ValueError:
+        page_number = 0
+    num_pages = max(1, -(-count // page_size))
+    if not 1 <= page_number <= num_pages:
+        return error_response('Invalid page.', status.HTTP_404_NOT_FOUND)
+    offset = (page_number - 1) * page_size
+    page = [category async for category in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page_number + 1) if page_number < num_pages else None
+    if page_number == 1:
+        previous_link = None
+    elif page_number == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page_number - 1)
+    return json_response({
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': CategorySerializer(page, many=True).data,
+    })
+
+
+@async_get
+async def cart(request):
+    cart_items = [item async for item in Cart.objects.filter(user=request.user).select_related('menuitem')]
+    return json_response(CartSerializer(cart_items, many=True).data)
+
+
+@async_get
+async def orders(request):
+    user = request.user
+    roles = await sync_to_async(get_roles)(user)
+    if MANAGER in roles:
+        queryset = Order.objects.with_items()
+    elif DELIVERY_CREW in roles:
+        queryset = Order.objects.with_items().filter(delivery_crew=user)
+    else:
+        queryset = Order.objects.with_items().filter(user=user)
+
+    paginator = OrderCursorPagination()
+    page = paginator.paginate_results([order async for order in paginator.get_page_queryset(queryset, request)])
+    serializer = OrderSerializer(page, many=True, context={'featured_id': await FeaturedItem.acurrent_id()})
+    return json_response(paginator.get_paginated_response(serializer.data).data)
+
+
+@async_get
+async def order(request, orderId):
+    order = await Order.objects.with_items().filter(id=orderId).afirst()
+    if order is None:
+        return error_response('Not found.', status.HTTP_404_NOT_FOUND)
+    if order.user_id != request.user.pk:
+        return json_response(
+            {'message': 'This order does not belong to the current user.'}, status=status.HTTP_403_FORBIDDEN)
+    serializer = OrderSerializer(order, context={'featured_id': await FeaturedItem.acurrent_id()})
+    return json_response(serializer.data)
+
+
+@async_get
+async def order_events(request):
+    """
+    Server-sent events for changes to the orders the user can list: all of
+    them for managers, the assigned ones for the delivery crew, their own for
+    customers. See events.py.
+    """
+    user = request.user
+    roles = await sync_to_async(get_roles)(user)
+    if MANAGER in roles:
+        scope = events.MANAGER_SCOPE
+    elif DELIVERY_CREW in roles:
+        scope = events.delivery_crew_scope(user.pk)
+    else:
+        scope = events.customer_scope(user.pk)
+
+    config = events.events_config()
+    subscription = events.hub.subscribe(scope, request.headers.get('Last-Event-ID'), config['QUEUE_SIZE'])
+    response = StreamingHttpResponse(events.EventStream(subscription, config), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx hold events back in its buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
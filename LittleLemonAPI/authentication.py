@@ -0,0 +1,181 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+from .roles import forget_request_roles
+
+TOKEN_CACHE_DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+    # Cache alias where revocations are recorded so that other processes drop
+    # their copy too. They only see it if the alias is shared by all workers
+    # (Redis, Memcached); None keeps revocation process-local.
+    'REVOCATION_ALIAS': 'default',
+}
+
+
+class TokenCache:
+    """
+    Bounded LRU + TTL map of token key -> (user, token).
+
+    Entries are evicted least recently used first once MAX_SIZE is reached and
+    are never served after TTL seconds.
+
+    Revocations are also written to the REVOCATION_ALIAS cache: one marker per
+    token key, and one per user holding the time of the revocation, so that
+    every process drops the user's entries cached before it, including those
+    for keys this process never saw.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self.reset_stats()
+
+    @property
+    def config(self):
+        return {**TOKEN_CACHE_DEFAULTS, **getattr(settings, 'TOKEN_CACHE', {})}
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and self._revoked_elsewhere(key, entry):
+            self.revoke(key, broadcast=False)
+            entry = None
+        return None if entry is None else entry[2]
+
+    def set(self, key, user, token):
+        config = self.config
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + config['TTL'], time.time(), (user, token))
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > config['MAX_SIZE']:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def revoke(self, key, broadcast=True):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.revocations += 1
+        if broadcast:
+            self._broadcast(key)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            keys = list(self._keys_by_user.get(user_id, ()))
+        for key in keys:
+            self.revoke(key, broadcast=False)
+        backend = self._revocation_backend()
+        if backend is not None:
+            backend.set(f'tokens:revoked-user:{user_id}', time.time(), self.config['TTL'])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _remove(self, key):
+        _, _, (user, _) = self._entries.pop(key)
+        keys = self._keys_by_user.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user.pk]
+
+    def _revocation_backend(self):
+        alias = self.config['REVOCATION_ALIAS']
+        return caches[alias] if alias else None
+
+    def _revoked_elsewhere(self, key, entry):
+        backend = self._revocation_backend()
+        if backend is None:
+            return False
+        _, cached_at, (user, _) = entry
+        key_marker, user_marker = f'tokens:revoked:{key}', f'tokens:revoked-user:{user.pk}'
+        markers = backend.get_many([key_marker, user_marker])
+        return key_marker in markers or markers.get(user_marker, float('-inf')) >= cached_at
+
+    def _broadcast(self, key):
+        backend = self._revocation_backend()
+        if backend is not None:
+            backend.set(f'tokens:revoked:{key}', True, self.config['TTL'])
+
+    def record(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+        self.evictions = 0
+        self.revocations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'revocations': self.revocations,
+                'hit_latency_seconds': self.hit_seconds / self.hits if self.hits else 0.0,
+                'miss_latency_seconds': self.miss_seconds / self.misses if self.misses else 0.0,
+            }
+
+
+token_cache = TokenCache()
+
+
+def detached_user(user):
+    """
+    Copy of a cached user for one request, so per-request state such as the
+    role memo never leaks between requests.
+    """
+    user = copy.copy(user)
+    forget_request_roles(user)
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> user lookups in ``token_cache``
+    instead of joining the authtoken and user tables on every request.
+    """
+
+    def authenticate_credentials(self, key):
+        start = time.perf_counter()
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            token_cache.record(hit=False, seconds=time.perf_counter() - start)
+            return user, token
+        user, token = cached
+        user = detached_user(user)
+        token_cache.record(hit=True, seconds=time.perf_counter() - start)
+        return user, token
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+# A version bump only reaches the workers that share the cache. With a
+# process-local backend (LocMemCache) the other workers would keep serving
+# their pages for TIMEOUT seconds after a write, so pages there live
+# LOCAL_TIMEOUT seconds instead; point ALIAS at a cache shared by all workers
+# (Redis, Memcached) to keep them for TIMEOUT.
+CATALOG_CACHE_DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 5,
+    'KEY_PREFIX': 'catalog',
+    'ENABLED': True,
+}
+
+
+class CatalogCache:
+    """
+    Read-through cache for the menu and category catalog.
+
+    Every entry key embeds the current catalog version, so bumping the version
+    (done from the model signals on each catalog write) makes all cached pages
+    unreachable at once without having to enumerate them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def config(self):
+        return {**CATALOG_CACHE_DEFAULTS, **getattr(settings, 'CATALOG_CACHE', {})}
+
+    @property
+    def backend(self):
+        return caches[self.config['ALIAS']]
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    @property
+    def timeout(self):
+        config = self.config
+        if isinstance(self.backend, LocMemCache):
+            return min(config['TIMEOUT'], config['LOCAL_TIMEOUT'])
+        return config['TIMEOUT']
+
+    def _version_key(self):
+        return f"{self.config['KEY_PREFIX']}:version"
+
+    def version(self):
+        backend = self.backend
+        version = backend.get(self._version_key())
+        if version is None:
+            # Seed from the clock so a version key lost to eviction or a restart
+            # can never come back lower than one that is still referenced.
+            backend.add(self._version_key(), int(time.time() * 1000), None)
+            version = backend.get(self._version_key())
+        return version
+
+    def bump(self):
+        try:
+            self.backend.incr(self._version_key())
+        except ValueError:
+            self.version()
+
+    def bump_on_commit(self):
+        # Bump right away so this thread never reads its own stale pages, and
+        # again on commit so a page rebuilt by another request before the
+        # commit landed is not kept around.
+        self.bump()
+        transaction.on_commit(self.bump)
+
+    def make_key(self, name, request):
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+        digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+        return f"{self.config['KEY_PREFIX']}:{self.version()}:{name}:{digest}"
+
+    def get_or_set(self, name, request, producer):
+        if not self.enabled:
+            return producer()
+        backend = self.backend
+        key = self.make_key(name, request)
+        data = backend.get(key)
+        if data is not None:
+            self._count(hit=True)
+            return data
+        self._count(hit=False)
+        data = producer()
+        backend.set(key, data, self.timeout)
+        return data
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+catalog_cache = CatalogCache()
+
+
+class CatalogCacheMixin:
+    """Serve successful GET list responses through the catalog cache."""
+    catalog_cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        data = catalog_cache.get_or_set(
+            self.catalog_cache_name,
+            request,
+            lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs).data,
+        )
+        return Response(data)
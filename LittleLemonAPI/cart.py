@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Cart
+
+# What the cart columns hold: a SmallIntegerField and DecimalField(6, 2)
+MAX_QUANTITY = 32767
+_price = Cart._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (_price.max_digits - _price.decimal_places) - Decimal(10) ** -_price.decimal_places
+
+
+def check_cart_lines(lines, current=None):
+    """
+    Raise a ``ValidationError`` naming the menu items of ``lines`` whose
+    quantity is below 1, or whose quantity, plus the quantity already in the
+    cart given by ``current`` (``{menuitem_id: quantity}``), or whose price
+    doesn't fit the cart columns.
+    """
+    too_small = sorted(menuitem.pk for menuitem, quantity in lines if quantity < 1)
+    if too_small:
+        raise ValidationError({'quantity': f'At least 1 of an item per cart line: {too_small}'})
+    current = current or {}
+    too_large = []
+    for menuitem, quantity in lines:
+        quantity += current.get(menuitem.pk, 0)
+        if quantity > MAX_QUANTITY or menuitem.price * quantity > MAX_PRICE:
+            too_large.append(menuitem.pk)
+    if too_large:
+        raise ValidationError({'quantity': (
+            f'At most {MAX_QUANTITY} of an item and a price of at most {MAX_PRICE} '
+            f'per cart line: {sorted(too_large)}'
+        )})
+
+
+def upsert_cart_lines(user, lines, mode='add'):
+    """
+    Write ``lines`` (``(menuitem, quantity)`` pairs) to the user's cart in one
+    ``INSERT ... ON CONFLICT DO UPDATE`` statement. With ``mode='add'`` the
+    quantity of a line already in the cart is increased, with ``mode='set'``
+    it is replaced. Prices are taken from the menu items.
+
+    The lines already in the cart are read first, in the same transaction,
+    and a ``ValidationError`` is raised before anything is written if a line
+    would outgrow its columns.
+    """
+    if not lines:
+        return
+    table = connection.ops.quote_name(Cart._meta.db_table)
+    values, params = [], []
+    for menuitem, quantity in lines:
+        values.append('(%s, %s, %s, %s, %s)')
+        params += [user.pk, menuitem.pk, quantity, menuitem.price, menuitem.price * quantity]
+    if mode == 'add':
+        quantity = f'{table}.quantity + excluded.quantity'
+    else:
+        quantity = 'excluded.quantity'
+    sql = (
+        f'INSERT INTO {table} (user_id, menuitem_id, quantity, unit_price, price) '
+        f'VALUES {", ".join(values)} '
+        'ON CONFLICT (user_id, menuitem_id) DO UPDATE SET '
+        f'quantity = {quantity}, unit_price = excluded.unit_price, '
+        f'price = excluded.unit_price * ({quantity})'
+    )
+    with transaction.atomic():
+        if mode == 'add':
+            current = dict(
+                Cart.objects.filter(user=user, menuitem__in=[menuitem for menuitem, _ in lines])
+                .values_list('menuitem_id', 'quantity')
+            )
+        else:
+            current = None
+        check_cart_lines(lines, current)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
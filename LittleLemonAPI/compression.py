@@ -0,0 +1,112 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+zstd is used when the zstandard package is installed and the client accepts
+it, otherwise gzip; on equal q-values ENCODINGS gives the order of preference.
+Bodies under MIN_SIZE are sent as they are, since the saving would not cover
+the extra headers, as are streaming responses, responses that already have a
+Content-Encoding and bodies that would not get smaller.
+
+Configured by REST_FRAMEWORK['COMPRESSION'] over COMPRESSION_DEFAULTS.
+"""
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_DEFAULTS = {
+    'ENABLED': True,
+    'MIN_SIZE': 1024,
+    'ENCODINGS': ['zstd', 'gzip'],
+    'LEVELS': {'gzip': 6, 'zstd': 3},
+}
+
+CODECS = {
+    # mtime=0 so the same body always compresses to the same bytes
+    'gzip': lambda content, level: gzip.compress(content, compresslevel=level, mtime=0),
+}
+if zstandard is not None:
+    CODECS['zstd'] = lambda content, level: zstandard.ZstdCompressor(level=level).compress(content)
+
+
+def compression_config():
+    config = getattr(settings, 'REST_FRAMEWORK', {}).get('COMPRESSION', {})
+    return {**COMPRESSION_DEFAULTS, **config, 'LEVELS': {**COMPRESSION_DEFAULTS['LEVELS'], **config.get('LEVELS', {})}}
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` of an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def negotiate(header, encodings):
+    """The coding of ``encodings`` to use for ``header``, or None for identity."""
+    accepted = accepted_encodings(header)
+    default = accepted.get('*', 0.0)
+    candidates = [
+        (-accepted.get(coding, default), rank, coding)
+        for rank, coding in enumerate(encodings)
+        if coding in CODECS
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] < 0]
+    return min(candidates)[2] if candidates else None
+
+
+def compress_response(request, response, config):
+    if not config['ENABLED'] or response.streaming or response.has_header('Content-Encoding'):
+        return response
+    if len(response.content) < config['MIN_SIZE']:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), config['ENCODINGS'])
+    if coding is None:
+        return response
+    compressed = CODECS[coding](response.content, config['LEVELS'][coding])
+    if len(compressed) >= len(response.content):
+        return response
+    response.content = compressed
+    response.headers['Content-Length'] = str(len(compressed))
+    response.headers['Content-Encoding'] = coding
+    # The encoded bytes differ, so a strong ETag of the identity body can't stay strong
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+    return response
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return compress_response(request, self.get_response(request), compression_config())
+
+    async def __acall__(self, request):
+        return compress_response(request, await self.get_response(request), compression_config())
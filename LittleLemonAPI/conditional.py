@@ -0,0 +1,120 @@
+"""
+Conditional GET (ETag, Last-Modified, 304) for the catalog and order views.
+
+The validators are computed from one aggregate query over the rows a response
+is built from, their count and latest ``updated_at`` plus the latest
+``updated_at`` of what they embed, instead of from the rendered body. A client
+whose If-None-Match or If-Modified-Since still matches gets a 304 without the
+objects being loaded or serialized.
+
+The catalog lists are validated the same way even when their body comes
+from the catalog cache: the catalog version lives in a per-process cache, so
+a worker that did not see a write would otherwise keep sending an ETag for
+content it no longer serves.
+
+Keyset-paginated lists take their ETag from the page they return instead:
+the ``(pk, updated_at)`` of the ``perpage + 1`` rows the page query fetches
+(the extra row decides the next link) and the ``updated_at`` of what they
+embed, read with the page's own ``LIMIT`` on the sort key's index. That costs
+the same for a manager's first page as for a customer's, where an aggregate
+over the whole role-scoped set would read every order.
+
+Lists only send an ETag: deleting a row lowers the count but not the latest
+``updated_at``, so Last-Modified alone could not tell. Writes that bypass
+save() (QuerySet.update()) have to set ``updated_at`` themselves.
+"""
+import calendar
+import hashlib
+
+from django.db.models import Count, Max, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .pagination import KeysetPagination
+
+
+def latest(model):
+    # Newest updated_at of a whole table, read off its index
+    return Subquery(model.objects.order_by('-updated_at').values('updated_at')[:1])
+
+
+def make_etag(request, *parts):
+    # Weak: equal validators mean equal content, not necessarily equal bytes
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    parts = (request.path, params, getattr(request, 'accepted_media_type', None), *parts)
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def validators(request, queryset, related=(), scope=()):
+    """
+    Return ``(count, etag, last_modified)`` for the rows of ``queryset``.
+
+    ``related`` are expressions for the ``updated_at`` of rows embedded in the
+    representation (``'category__updated_at'``, ``latest(MenuItem)``), and
+    ``scope`` anything else the response depends on, like the user it was
+    filtered for. The path, query string and negotiated media type are always
+    part of the ETag.
+    """
+    state = queryset.order_by().aggregate(
+        count=Count('pk'),
+        last_modified=Max('updated_at'),
+        **{f'related_{i}': Max(expression) for i, expression in enumerate(related)},
+    )
+    etag = make_etag(request, tuple(scope), sorted(state.items()))
+    last_modified = max((value for key, value in state.items() if key != 'count' and value is not None), default=None)
+    return state['count'], etag, last_modified
+
+
+def page_validators(request, page_queryset, related=(), scope=()):
+    """
+    The ETag of one page of a keyset-paginated list, from the rows of
+    ``page_queryset`` (KeysetPagination.get_page_queryset()); ``related`` and
+    ``scope`` as for validators().
+    """
+    rows = list(page_queryset.values_list('pk', 'updated_at', *related))
+    return make_etag(request, tuple(scope), rows)
+
+
+def conditional_response(request, etag, last_modified, respond):
+    """
+    A 304 (or 412) when the request's preconditions match ``etag`` and
+    ``last_modified``, otherwise ``respond()``; the validators are set on both.
+    """
+    timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = respond()
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag on list() and ETag plus Last-Modified on retrieve() of generic views.
+    ``conditional_related`` lists the updated_at expressions of embedded rows.
+    Goes before CatalogCacheMixin, so a 304 skips the cache as well.
+    """
+    conditional_related = ()
+
+    def list(self, request, *args, **kwargs):
+        if isinstance(self.paginator, KeysetPagination):
+            queryset = self.filter_queryset(self.get_queryset())
+            etag = page_validators(request, self.paginator.get_page_queryset(queryset, request), self.conditional_related)
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            _, etag, _ = validators(request, queryset, self.conditional_related)
+        return conditional_response(
+            request, etag, None, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        count, etag, last_modified = validators(request, queryset, self.conditional_related)
+        respond = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        if not count:
+            # Let retrieve() answer the 404
+            return respond()
+        return conditional_response(request, etag, last_modified, respond)
@@ -0,0 +1,60 @@
+import heapq
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import events
+from .models import Order
+from .roles import DELIVERY_CREW
+
+
+def dispatch_orders(limit=None):
+    """
+    Assign the unassigned, undelivered orders (oldest first, at most ``limit``)
+    to the delivery crew, each to whoever has the fewest open orders at that
+    point, in one transaction.
+
+    The crew's open order counts go into a min-heap, so each assignment is an
+    O(log crew) pop and push, and the writes are one UPDATE per crew member
+    however many orders there are. Returns ``None`` when there is no crew,
+    otherwise ``{crew_id: {'username': ..., 'orders': [...], 'open_orders': n}}``
+    for the crew members that received orders.
+    """
+    with transaction.atomic():
+        crew = dict(
+            User.objects.filter(groups__name=DELIVERY_CREW, is_active=True).values_list('pk', 'username')
+        )
+        if not crew:
+            return None
+        open_orders = dict(
+            Order.objects.filter(delivery_crew__in=crew, status=False)
+            .values_list('delivery_crew').annotate(Count('id')).order_by()
+        )
+        pending = Order.objects.filter(delivery_crew__isnull=True, status=False).order_by('date', 'id')
+        if limit is not None:
+            pending = pending[:limit]
+
+        # Ties go to the lower user id so dispatch is deterministic
+        heap = [(open_orders.get(crew_id, 0), crew_id) for crew_id in crew]
+        heapq.heapify(heap)
+        assigned = defaultdict(list)
+        dispatched = []
+        for order_id, user_id in pending.values_list('pk', 'user'):
+            load, crew_id = heapq.heappop(heap)
+            assigned[crew_id].append(order_id)
+            dispatched.append(Order(pk=order_id, user_id=user_id, delivery_crew_id=crew_id, status=False))
+            heapq.heappush(heap, (load + 1, crew_id))
+
+        now = timezone.now()
+        for crew_id, order_ids in assigned.items():
+            Order.objects.filter(pk__in=order_ids).update(delivery_crew=crew_id, updated_at=now)
+        events.order_changed('order.updated', dispatched)
+
+    loads = {crew_id: load for load, crew_id in heap}
+    return {
+        crew_id: {'username': crew[crew_id], 'orders': order_ids, 'open_orders': loads[crew_id]}
+        for crew_id, order_ids in sorted(assigned.items())
+    }
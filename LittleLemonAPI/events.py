@@ -0,0 +1,214 @@
+"""
+Order change events for the server-sent event feed (api/async/orders/events/).
+
+Checkout, OrderSerializer.update(), dispatch and order deletion call
+order_changed(), which publishes to the in-process Hub once the transaction
+commits. Every event is rendered once, as SSE text, and handed to the
+subscribers whose scope is in its audience: managers see every order, the
+delivery crew the orders assigned to them (or just taken off them) and
+customers their own orders, like the order list views. Subscribers are looked
+up by scope, so a publish costs the same however many unrelated clients are
+connected.
+
+A subscriber is an asyncio queue on the event loop of the ASGI worker that
+serves it, so an idle connection is one parked coroutine. Publishers can run
+on any thread (sync views run in a thread pool under ASGI) and hand events
+over with call_soon_threadsafe(). A client that falls QUEUE_SIZE events behind
+gets a ``reset`` event and is disconnected rather than buffered without
+bound. A reconnecting client's Last-Event-ID is answered from the last
+HISTORY events, or with ``reset`` when it is older than those, and a
+``reset`` means: refetch the orders.
+
+The hub lives in one process: only the subscribers of the worker that made
+the write are told about it. Run the feed on a single ASGI worker, or publish
+through a broker shared by the workers.
+"""
+import asyncio
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+
+from .renderers import FastJSONRenderer
+
+ORDER_EVENTS_DEFAULTS = {
+    'KEEPALIVE': 15,
+    'QUEUE_SIZE': 256,
+    'HISTORY': 1024,
+    'MAX_AGE': 300,
+    'RETRY': 3000,
+}
+
+MANAGER_SCOPE = ('manager',)
+
+RESET = 'event: reset\ndata: {}\n\n'
+KEEPALIVE = ': keep-alive\n\n'
+
+
+def events_config():
+    return {**ORDER_EVENTS_DEFAULTS, **getattr(settings, 'ORDER_EVENTS', {})}
+
+
+def customer_scope(user_id):
+    return ('customer', user_id)
+
+
+def delivery_crew_scope(user_id):
+    return ('delivery_crew', user_id)
+
+
+class Subscription:
+    __slots__ = ('hub', 'scope', 'loop', 'queue', 'queue_size', 'dropped')
+
+    def __init__(self, hub, scope, queue_size):
+        self.hub = hub
+        self.scope = scope
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.queue_size = queue_size
+        self.dropped = False
+
+    def put(self, message):
+        # Runs on the subscriber's event loop
+        if self.dropped:
+            return
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped = True
+            self.hub.unsubscribe(self)
+            message = None
+        self.queue.put_nowait(message)
+
+
+class Hub:
+    def __init__(self, history=ORDER_EVENTS_DEFAULTS['HISTORY']):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+
+    def subscribe(self, scope, last_event_id=None, queue_size=ORDER_EVENTS_DEFAULTS['QUEUE_SIZE']):
+        """
+        Register a subscriber for ``scope``, on the running event loop. The
+        events it missed since ``last_event_id`` (or a reset) are queued
+        before any new one.
+        """
+        subscription = Subscription(self, scope, queue_size)
+        with self._lock:
+            self._subscribers[scope].add(subscription)
+            if last_event_id is not None:
+                for message in self._missed(scope, last_event_id):
+                    subscription.queue.put_nowait(message)
+        return subscription
+
+    def _missed(self, scope, last_event_id):
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return [RESET]
+        oldest = self._history[0][0] if self._history else self._last_id + 1
+        # From another process or before a restart, or beyond the history
+        if last_event_id > self._last_id or last_event_id < oldest - 1:
+            return [RESET]
+        return [message for id_, audience, message in self._history if id_ > last_event_id and scope in audience]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.scope)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.scope]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, kind, data, audience):
+        """Send event ``kind`` with ``data`` to the subscribers of the ``audience`` scopes; returns its id."""
+        text = FastJSONRenderer().render(data).decode()
+        with self._lock:
+            self._last_id += 1
+            id_ = self._last_id
+            message = f'id: {id_}\nevent: {kind}\ndata: {text}\n\n'
+            self._history.append((id_, audience, message))
+            targets = [subscription for scope in audience for subscription in self._subscribers.get(scope, ())]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Its event loop is closed
+                self.unsubscribe(subscription)
+        return id_
+
+
+hub = Hub(history=events_config()['HISTORY'])
+
+
+def order_event(kind, order, previous_crew_id=None):
+    """``(kind, data, audience)`` of an event about ``order``."""
+    audience = {MANAGER_SCOPE, customer_scope(order.user_id)}
+    for crew_id in (order.delivery_crew_id, previous_crew_id):
+        if crew_id is not None:
+            audience.add(delivery_crew_scope(crew_id))
+    data = {
+        'id': order.pk,
+        'user': order.user_id,
+        'delivery_crew': order.delivery_crew_id,
+        'status': order.status,
+    }
+    return kind, data, frozenset(audience)
+
+
+def order_changed(kind, orders, previous_crew_id=None):
+    """
+    Publish a ``kind`` event (``order.created``, ``order.updated``,
+    ``order.deleted``) for each of ``orders`` when the current transaction
+    commits, so subscribers never hear of a write that was rolled back.
+    """
+    events = [order_event(kind, order, previous_crew_id) for order in orders]
+
+    def publish():
+        for event in events:
+            hub.publish(*event)
+    transaction.on_commit(publish)
+
+
+class EventStream:
+    """
+    The body of one feed response: a retry hint, then the subscription's
+    events, with a comment every KEEPALIVE seconds of silence so proxies keep
+    the connection open. Ends after MAX_AGE seconds (the client reconnects
+    with its Last-Event-ID) or after a reset. Django calls close() when the
+    response is done, which unsubscribes.
+    """
+    def __init__(self, subscription, config):
+        self.subscription = subscription
+        self.keepalive = config['KEEPALIVE']
+        self.deadline = subscription.loop.time() + config['MAX_AGE']
+        self.pending = f"retry: {config['RETRY']}\n\n"
+        self.done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.pending is not None:
+            message, self.pending = self.pending, None
+            return message
+        remaining = self.deadline - self.subscription.loop.time()
+        if self.done or remaining <= 0:
+            self.close()
+            raise StopAsyncIteration
+        try:
+            message = await asyncio.wait_for(self.subscription.queue.get(), min(self.keepalive, remaining))
+        except asyncio.TimeoutError:
+            return KEEPALIVE
+        if message is None or message is RESET:
+            self.done = True
+            return RESET
+        return message
+
+    def close(self):
+        self.done = True
+        self.subscription.hub.unsubscribe(self.subscription)
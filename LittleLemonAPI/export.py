@@ -0,0 +1,103 @@
+import csv
+import datetime
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+from .models import Order, OrderItem
+from .renderers import NDJSONRenderer
+
+# Orders fetched per round trip; memory use is bounded by this, not by the export size
+EXPORT_CHUNK_SIZE = 1000
+
+CSV_HEADER = [
+    'order_id', 'user', 'delivery_crew', 'status', 'total', 'date',
+    'order_item_id', 'menuitem', 'quantity', 'unit_price', 'price',
+]
+
+
+def parse_date_range(query_params):
+    """``(date_from, date_to)`` from the query parameters, None where absent."""
+    dates = []
+    for param in ('date_from', 'date_to'):
+        value = query_params.get(param)
+        try:
+            dates.append(datetime.date.fromisoformat(value) if value else None)
+        except ValueError:
+            raise ValidationError({param: 'Enter a date in YYYY-MM-DD format.'})
+    return tuple(dates)
+
+
+def parse_filters(query_params):
+    filters = {}
+    date_from, date_to = parse_date_range(query_params)
+    if date_from is not None:
+        filters['date__gte'] = date_from
+    if date_to is not None:
+        filters['date__lte'] = date_to
+    value = query_params.get('status')
+    if value:
+        if value.lower() not in ('0', '1', 'true', 'false'):
+            raise ValidationError({'status': 'Must be 0, 1, true or false.'})
+        filters['status'] = value.lower() in ('1', 'true')
+    return filters
+
+
+def export_queryset(filters):
+    return (
+        Order.objects.filter(**filters)
+        .prefetch_related(Prefetch('order_items', queryset=OrderItem.objects.order_by('id')))
+        .order_by('id')
+    )
+
+
+def iter_orders(queryset):
+    # With a chunk_size, prefetch_related runs once per chunk instead of once
+    # for the whole result.
+    return queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def order_row(order):
+    return {
+        'id': order.id,
+        'user': order.user_id,
+        'delivery_crew': order.delivery_crew_id,
+        'status': order.status,
+        'total': str(order.total),
+        'date': order.date.isoformat(),
+        'order_items': [
+            {
+                'id': item.id,
+                'menuitem': item.menuitem_id,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'price': str(item.price),
+            }
+            for item in order.order_items.all()
+        ],
+    }
+
+
+def stream_ndjson(queryset):
+    for order in iter_orders(queryset):
+        yield NDJSONRenderer.render_row(order_row(order))
+
+
+class _Echo:
+    # csv.writer only needs write(); hand each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in iter_orders(queryset):
+        row = order_row(order)
+        head = [row['id'], row['user'], row['delivery_crew'], int(row['status']), row['total'], row['date']]
+        if not row['order_items']:
+            yield writer.writerow(head + [''] * 5)
+        for item in row['order_items']:
+            yield writer.writerow(head + [
+                item['id'], item['menuitem'], item['quantity'], item['unit_price'], item['price'],
+            ])
@@ -0,0 +1,201 @@
+"""
+Read-only fast path for the GET list endpoints.
+
+Builds the same dicts as CategorySerializer, MenuItemSerializer,
+CartSerializer and OrderSerializer straight from values() rows. The field
+lookups and the functions that turn a row into a dict are set up once at
+import, so a request skips the serializers' per-object field lookup, model
+instantiation and to_representation() calls. FastJSONRenderer then writes
+the page.
+
+The output has to stay identical to the serializers', assuming DRF's default
+COERCE_DECIMAL_TO_STRING and ISO 8601 date format. FastPathTest compares
+the rendered bytes of both paths, so change a serializer and its listing here
+together. FASTPATH['ENABLED'] = False falls back to the serializers.
+"""
+from django.conf import settings
+from rest_framework.response import Response
+
+from .models import FeaturedItem, OrderItem
+from .pagination import KeysetPagination
+from .profiling import timed
+
+FASTPATH_DEFAULTS = {
+    'ENABLED': True,
+}
+
+
+def fastpath_config():
+    return {**FASTPATH_DEFAULTS, **getattr(settings, 'FASTPATH', {})}
+
+
+def enabled():
+    return fastpath_config()['ENABLED']
+
+
+def decimal_string(value):
+    # DecimalField.to_representation(); the database values are already quantized
+    return '{:f}'.format(value)
+
+
+def _category(prefix):
+    id_, slug, title = (prefix + name for name in ('id', 'slug', 'title'))
+    lookups = [id_, slug, title]
+
+    def build(row):
+        return {
+            'id': row[id_],
+            'slug': row[slug],
+            'title': row[title],
+        }
+    return lookups, build
+
+
+def _menu_item(prefix):
+    id_, title, price = (prefix + name for name in ('id', 'title', 'price'))
+    category_lookups, category = _category(prefix + 'category__')
+    lookups = [id_, title, price, *category_lookups]
+
+    def build(row, featured_id):
+        return {
+            'id': row[id_],
+            'title': row[title],
+            'price': decimal_string(row[price]),
+            'featured': row[id_] == featured_id,
+            'category': category(row),
+        }
+    return lookups, build
+
+
+CATEGORY_LOOKUPS, category_row = _category('')
+MENU_ITEM_LOOKUPS, menu_item_row = _menu_item('')
+ORDER_ITEM_MENU_ITEM_LOOKUPS, order_item_menu_item_row = _menu_item('menuitem__')
+
+
+class Listing:
+    """
+    How one list endpoint renders: ``values(queryset)`` narrows a queryset to
+    the lookups the rows need, ``build(rows)`` turns the fetched rows into the
+    serializer's dicts. Subclasses implement build_rows(); build() is what the
+    profiler times as the serializer phase.
+    """
+    lookups = []
+
+    def values(self, queryset, extra=()):
+        return queryset.prefetch_related(None).values(*self.lookups, *extra)
+
+    @timed('serializer')
+    def build(self, rows, **kwargs):
+        return self.build_rows(rows, **kwargs)
+
+    def build_rows(self, rows):
+        raise NotImplementedError
+
+
+class Categories(Listing):
+    lookups = CATEGORY_LOOKUPS
+
+    def build_rows(self, rows):
+        return [category_row(row) for row in rows]
+
+
+class MenuItems(Listing):
+    lookups = MENU_ITEM_LOOKUPS
+
+    def build_rows(self, rows, featured_id=None):
+        if not rows:
+            return []
+        if featured_id is None:
+            featured_id = FeaturedItem.current_id()
+        return [menu_item_row(row, featured_id) for row in rows]
+
+
+class CartLines(Listing):
+    lookups = ['id', 'menuitem', 'quantity', 'menuitem__price']
+
+    def build_rows(self, rows):
+        # unit_price and price are a ReadOnlyField and a SerializerMethodField,
+        # so they stay Decimals and the renderer writes them as numbers
+        return [
+            {
+                'id': row['id'],
+                'menuitem': row['menuitem'],
+                'quantity': row['quantity'],
+                'unit_price': row['menuitem__price'],
+                'price': row['menuitem__price'] * row['quantity'],
+            }
+            for row in rows
+        ]
+
+
+class Orders(Listing):
+    lookups = ['id', 'user', 'delivery_crew', 'status', 'total', 'date']
+    item_lookups = ['order', 'id', 'quantity', 'unit_price', 'price', *ORDER_ITEM_MENU_ITEM_LOOKUPS]
+
+    def build_rows(self, rows):
+        if not rows:
+            return []
+        # The same WHERE order_id IN (...) as the with_items() prefetch, so
+        # the items of each order come back in the same order
+        items = {row['id']: [] for row in rows}
+        featured_id = None
+        item_rows = list(OrderItem.objects.filter(order__in=list(items)).values(*self.item_lookups))
+        if item_rows:
+            featured_id = FeaturedItem.current_id()
+        for row in item_rows:
+            items[row['order']].append({
+                'id': row['id'],
+                'menuitem': order_item_menu_item_row(row, featured_id),
+                'quantity': row['quantity'],
+                'unit_price': decimal_string(row['unit_price']),
+                'price': decimal_string(row['price']),
+            })
+        return [
+            {
+                'id': row['id'],
+                'user': row['user'],
+                'delivery_crew': row['delivery_crew'],
+                'status': row['status'],
+                'total': decimal_string(row['total']),
+                'date': row['date'].isoformat(),
+                'order_items': items[row['id']],
+            }
+            for row in rows
+        ]
+
+
+CATEGORIES = Categories()
+MENU_ITEMS = MenuItems()
+CART_LINES = CartLines()
+ORDERS = Orders()
+
+
+def paginate(listing, paginator, queryset, request, view=None):
+    """
+    The requested page of ``queryset`` built by ``listing``. Keyset pages also
+    fetch their sort key so the paginator can make the cursors.
+    """
+    if isinstance(paginator, KeysetPagination):
+        page_queryset = paginator.get_page_queryset(queryset, request)
+        keys = [field.lstrip('-') for field in paginator.ordering]
+        rows = paginator.paginate_results(list(listing.values(page_queryset, keys)))
+    else:
+        rows = paginator.paginate_queryset(listing.values(queryset), request, view=view)
+    return listing.build(rows)
+
+
+class FastListMixin:
+    """
+    Serve list() through ``fast_listing`` while the fast path is enabled.
+    Goes after the caching and conditional GET mixins, which wrap list().
+    """
+    fast_listing = None
+
+    def list(self, request, *args, **kwargs):
+        if not enabled():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = self.paginator
+        if paginator is None:
+            return Response(self.fast_listing.build(list(self.fast_listing.values(queryset))))
+        return paginator.get_paginated_response(paginate(self.fast_listing, paginator, queryset, request, view=self))
@@ -0,0 +1,182 @@
+"""
+Helpers shared by the benchmark commands. Not a command itself (Django skips
+modules whose name starts with an underscore).
+"""
+import datetime
+import json
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI import roles, sales, search
+from LittleLemonAPI.cache import catalog_cache
+from LittleLemonAPI.models import Cart, Category, FeaturedItem, MenuItem, Order, OrderItem
+
+
+@contextmanager
+def scratch_database(verbosity=0, throttling=False):
+    """
+    Run the block against a throwaway test database so seeding benchmark data
+    never touches the configured one. Throttling is off unless asked for, as
+    the benchmarks would otherwise measure 429 responses.
+    """
+    # The test environment also lets the test clients use the 'testserver' host
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        with override_settings(THROTTLING={**getattr(settings, 'THROTTLING', {}), 'ENABLED': throttling}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+def timed(func, repeat):
+    """Call ``func`` ``repeat`` times and return the durations in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """p50/p95/p99 and mean of ``samples``, in milliseconds."""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def write_report(command, report, output=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    command.stdout.write(text)
+
+
+DEFAULT_VOLUMES = {
+    'users': 1000,
+    'categories': 20,
+    'menu_items': 2000,
+    'cart_lines': 3,
+    'orders': 5000,
+    'items_per_order': 3,
+}
+
+BENCH_PASSWORD = 'bench@10!'
+
+ADJECTIVES = ['lemon', 'grilled', 'spicy', 'roasted', 'greek', 'smoked', 'crispy', 'garlic', 'honey', 'herb']
+NOUNS = ['chicken', 'salad', 'pasta', 'bruschetta', 'lamb', 'soup', 'cake', 'risotto', 'falafel', 'shrimp']
+
+
+def seed_dataset(volumes, seed=0):
+    """
+    Bulk-load users (1% managers, 5% delivery crew, the rest customers),
+    categories, menu items, carts and orders with their items, deterministic
+    for a given ``seed``. Returns the ids and tokens the benchmarks need.
+    """
+    rng = random.Random(seed)
+    volumes = {**DEFAULT_VOLUMES, **volumes}
+    password = make_password(BENCH_PASSWORD)
+
+    admin = User.objects.create_superuser('bench_admin', 'admin@example.com', BENCH_PASSWORD)
+    users = User.objects.bulk_create([
+        User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com', password=password)
+        for i in range(max(volumes['users'], 3))
+    ])
+    manager_count = max(1, len(users) // 100)
+    crew_count = max(1, len(users) // 20)
+    managers = users[:manager_count]
+    crews = users[manager_count:manager_count + crew_count]
+    customers = users[manager_count + crew_count:]
+    manager_group = Group.objects.create(name=roles.MANAGER)
+    crew_group = Group.objects.create(name=roles.DELIVERY_CREW)
+    membership = User.groups.through
+    membership.objects.bulk_create(
+        [membership(user=user, group=manager_group) for user in [admin, *managers]]
+        + [membership(user=user, group=crew_group) for user in crews]
+    )
+
+    categories = Category.objects.bulk_create([
+        Category(slug=f'category-{i}', title=f'{rng.choice(NOUNS).title()} {i}')
+        for i in range(max(volumes['categories'], 1))
+    ])
+    menu_items = MenuItem.objects.bulk_create([
+        MenuItem(
+            title=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+            price=Decimal(rng.randint(2, 100)) / 2,
+            featured=False,
+            category=rng.choice(categories),
+        )
+        for i in range(max(volumes['menu_items'], volumes['items_per_order'], volumes['cart_lines'], 1))
+    ])
+    FeaturedItem.feature(menu_items[0])
+
+    Cart.objects.bulk_create([
+        Cart(user=user, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+        for user in customers
+        for menuitem in rng.sample(menu_items, volumes['cart_lines'])
+    ])
+
+    today = datetime.date.today()
+    orders, lines = [], []
+    for i in range(volumes['orders']):
+        chosen = rng.sample(menu_items, volumes['items_per_order'])
+        orders.append(Order(
+            user=customers[i % len(customers)],
+            delivery_crew=crews[i // 2 % len(crews)] if i % 2 else None,
+            status=i % 4 == 3,
+            total=sum(menuitem.price for menuitem in chosen),
+            date=today - datetime.timedelta(days=rng.randrange(365)),
+        ))
+        lines.append(chosen)
+    orders = Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, menuitem=menuitem, quantity=1, unit_price=menuitem.price, price=menuitem.price)
+        for order, chosen in zip(orders, lines)
+        for menuitem in chosen
+    ])
+
+    # bulk_create skips the signals and checkout code that keep these in step
+    sales.rebuild()
+    search.rebuild_index()
+    catalog_cache.bump()
+    roles.invalidate_all()
+
+    customer = customers[0]
+    return {
+        'tokens': {
+            'admin': Token.objects.create(user=admin).key,
+            'manager': Token.objects.create(user=managers[0]).key,
+            'delivery_crew': Token.objects.create(user=crews[0]).key,
+            'customer': Token.objects.create(user=customer).key,
+        },
+        'customer': customer,
+        'spare_user': customers[-1],
+        'category': categories[0],
+        'menuitem': menu_items[len(menu_items) // 2],
+        'menu_items': menu_items,
+        'order': next((order for order in orders if order.user_id == customer.pk), None),
+        'month_ago': (today - datetime.timedelta(days=30)).isoformat(),
+    }
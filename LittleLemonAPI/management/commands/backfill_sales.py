@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from LittleLemonAPI import sales
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'{value!r} is not a date in YYYY-MM-DD format.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the daily sales rollups (DailySales, DailyMenuItemSales, '
+        'DailyCategorySales) from the existing orders, for all days or a date range.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=parse_date, help='First day to rebuild (YYYY-MM-DD).')
+        parser.add_argument('--date-to', type=parse_date, help='Last day to rebuild (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        days = sales.rebuild(options['date_from'], options['date_to'])
+        self.stdout.write(f'Rebuilt the sales rollups of {days} day(s).')
@@ -0,0 +1,289 @@
+import itertools
+import logging
+import re
+import time
+from collections import Counter, namedtuple
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from rest_framework.test import APIClient
+
+from LittleLemonAPI import roles, sales, urls
+from LittleLemonAPI.cache import catalog_cache
+from LittleLemonAPI.cart import upsert_cart_lines
+from LittleLemonAPI.models import Order, OrderItem
+
+from ._bench import BENCH_PASSWORD, DEFAULT_VOLUMES, scratch_database, seed_dataset, summarize, write_report
+
+# ``route`` is the URL pattern as listed by routes(). ``path`` and ``data`` are
+# formatted with the seeded context (and whatever ``setup`` returns), ``n``
+# being the iteration number. ``setup`` runs untimed before each request.
+Scenario = namedtuple('Scenario', 'route label method role path data setup repeat', defaults=(None, None, None))
+
+ANON = None
+USERNAME_ACTIONS = ['activation', 'resend_activation', 'reset_password', 'reset_password_confirm',
+                    'reset_username', 'reset_username_confirm', 'set_password', 'set_username']
+
+
+def add_to_group(name, key):
+    def setup(context, n):
+        Group.objects.get(name=name).user_set.add(context[key])
+    return setup
+
+
+# A shift's worth of users for the bulk membership scenarios, and one that doesn't exist
+BULK_USERS = [f'bench_user_{i}' for i in range(100, 130)] + ['nobody']
+
+
+def add_bulk_users_to_group(name):
+    def setup(context, n):
+        Group.objects.get(name=name).user_set.add(*User.objects.filter(username__in=BULK_USERS))
+    return setup
+
+
+def remove_bulk_users_from_group(name):
+    def setup(context, n):
+        Group.objects.get(name=name).user_set.remove(*User.objects.filter(username__in=BULK_USERS))
+    return setup
+
+
+def fill_cart(context, n):
+    upsert_cart_lines(context['customer'], [(menuitem, 1) for menuitem in context['menu_items'][:3]], mode='set')
+
+
+def new_order(context, n):
+    order = Order.objects.create(user=context['customer'], total=context['menuitem'].price)
+    item = OrderItem.objects.create(
+        order=order, menuitem=context['menuitem'], quantity=1,
+        unit_price=context['menuitem'].price, price=context['menuitem'].price)
+    sales.record_order(order, [item])
+    return {'new_order': order.pk}
+
+
+def cold_catalog(context, n):
+    # Measure the uncached list as well as the cache hit
+    catalog_cache.bump()
+
+
+SCENARIOS = [
+    Scenario('', 'root', 'GET', ANON, ''),
+    # Staff see every user, everyone else only themselves
+    Scenario('users/', 'list', 'GET', 'admin', 'users/'),
+    Scenario('users/', 'prefix search', 'GET', 'admin', 'users/?search=bench_user_1&perpage=50'),
+    # Password hashing dominates the register and login routes; a few samples are enough
+    Scenario('users/', 'register', 'POST', ANON, 'users/',
+             {'username': 'bench_new_{n}', 'password': BENCH_PASSWORD, 'email': 'bench_new_{n}@example.com'},
+             repeat=5),
+    Scenario('users/me/', 'me', 'GET', 'customer', 'users/me/'),
+    Scenario('users/<username>/', 'retrieve', 'GET', 'customer', 'users/{customer.username}/'),
+    Scenario('users/users/me/', 'me', 'GET', 'customer', 'users/users/me/'),
+    *[
+        # Invalid or unknown input: measures validation without changing accounts
+        Scenario(f'users/{action}/', 'invalid', 'POST', 'customer' if action.startswith('set_') else ANON,
+                 f'users/{action}/', {'email': 'nobody@example.com'})
+        for action in USERNAME_ACTIONS
+    ],
+    Scenario('token/login/', 'login', 'POST', ANON, 'token/login/',
+             {'username': '{customer.username}', 'password': BENCH_PASSWORD}, repeat=5),
+    Scenario('auth-token/', 'login', 'POST', ANON, 'auth-token/',
+             {'username': '{customer.username}', 'password': BENCH_PASSWORD}, repeat=5),
+    Scenario('menu-items/', 'list', 'GET', 'customer', 'menu-items/'),
+    Scenario('menu-items/', 'list uncached', 'GET', 'customer', 'menu-items/?perpage=50', setup=cold_catalog),
+    Scenario('menu-items/', 'search', 'GET', 'customer', 'menu-items/?search=lemon', setup=cold_catalog),
+    Scenario('menu-items/', 'by price', 'GET', 'customer',
+             'menu-items/?ordering=-price&category_id={category.pk}', setup=cold_catalog),
+    Scenario('menu-items/', 'create', 'POST', 'manager', 'menu-items/',
+             {'title': 'bench new item {n}', 'price': '9.50', 'featured': False, 'category_id': '{category.pk}'}),
+    # Half new items, half updates of the previous request's
+    Scenario('menu-items/import/', '100 rows', 'POST', 'manager', 'menu-items/import/', [
+        {'title': f'Bench import {{n}}-{i}' if i % 2 else f'Bench import {i}', 'price': '9.50',
+         'category_id': '{category.pk}'}
+        for i in range(100)
+    ]),
+    Scenario('menu-items/<int:pk>/', 'retrieve', 'GET', 'customer', 'menu-items/{menuitem.pk}/'),
+    Scenario('menu-items/<int:pk>/', 'update', 'PATCH', 'manager', 'menu-items/{menuitem.pk}/',
+             {'price': '{menuitem.price}'}),
+    Scenario('categories/', 'list', 'GET', 'customer', 'categories/'),
+    Scenario('categories/', 'create', 'POST', 'manager', 'categories/',
+             {'slug': 'bench-new-{n}', 'title': 'Bench new {n}'}),
+    Scenario('groups/manager/users/', 'list', 'GET', 'admin', 'groups/manager/users/'),
+    Scenario('groups/manager/users/', 'add', 'POST', 'admin', 'groups/manager/users/',
+             {'username': '{spare_user.username}'}),
+    Scenario('groups/manager/users/<int:pk>/', 'remove', 'DELETE', 'admin',
+             'groups/manager/users/{spare_user.pk}/', setup=add_to_group(roles.MANAGER, 'spare_user')),
+    Scenario('groups/manager/users/bulk/', 'add 30', 'POST', 'admin', 'groups/manager/users/bulk/',
+             {'users': BULK_USERS}, setup=remove_bulk_users_from_group(roles.MANAGER)),
+    Scenario('groups/manager/users/bulk/', 'remove 30', 'DELETE', 'admin', 'groups/manager/users/bulk/',
+             {'users': BULK_USERS}, setup=add_bulk_users_to_group(roles.MANAGER)),
+    Scenario('groups/delivery-crew/users/', 'list', 'GET', 'manager', 'groups/delivery-crew/users/'),
+    Scenario('groups/delivery-crew/users/', 'add', 'POST', 'manager', 'groups/delivery-crew/users/',
+             {'username': '{spare_user.username}'}),
+    Scenario('groups/delivery-crew/users/<int:pk>/', 'remove', 'DELETE', 'manager',
+             'groups/delivery-crew/users/{spare_user.pk}/', setup=add_to_group(roles.DELIVERY_CREW, 'spare_user')),
+    Scenario('groups/delivery-crew/users/bulk/', 'add 30', 'POST', 'manager', 'groups/delivery-crew/users/bulk/',
+             {'users': BULK_USERS}, setup=remove_bulk_users_from_group(roles.DELIVERY_CREW)),
+    Scenario('groups/delivery-crew/users/bulk/', 'remove 30', 'DELETE', 'manager', 'groups/delivery-crew/users/bulk/',
+             {'users': BULK_USERS}, setup=add_bulk_users_to_group(roles.DELIVERY_CREW)),
+    Scenario('cart/menu-items/', 'list', 'GET', 'customer', 'cart/menu-items/', setup=fill_cart),
+    Scenario('cart/menu-items/', 'add', 'POST', 'customer', 'cart/menu-items/',
+             {'menuitem': '{menuitem.pk}', 'quantity': 1}),
+    Scenario('cart/menu-items/', 'clear', 'DELETE', 'customer', 'cart/menu-items/', setup=fill_cart),
+    Scenario('cart/menu-items/bulk/', 'set', 'POST', 'customer', 'cart/menu-items/bulk/',
+             {'items': [{'menuitem': '{menuitem.pk}', 'quantity': 2}], 'mode': 'set'}),
+    Scenario('orders/', 'list customer', 'GET', 'customer', 'orders/'),
+    Scenario('orders/', 'list delivery crew', 'GET', 'delivery_crew', 'orders/'),
+    Scenario('orders/', 'list manager', 'GET', 'manager', 'orders/?perpage=50'),
+    Scenario('orders/', 'checkout', 'POST', 'customer', 'orders/', {}, setup=fill_cart),
+    Scenario('cart/orders/', 'list customer', 'GET', 'customer', 'cart/orders/'),
+    Scenario('orders/export/', 'ndjson', 'GET', 'manager', 'orders/export/', repeat=5),
+    # The first (warm-up) request dispatches the seeded backlog, the timed
+    # ones the order created by setup
+    Scenario('orders/dispatch/', 'new order', 'POST', 'manager', 'orders/dispatch/', {}, setup=new_order),
+    Scenario('orders/<int:orderId>/', 'retrieve', 'GET', 'customer', 'orders/{order.pk}/'),
+    Scenario('orders/<int:orderId>/', 'update', 'PATCH', 'manager', 'orders/{order.pk}/', {'status': True}),
+    Scenario('orders/<int:orderId>/', 'delete', 'DELETE', 'manager', 'orders/{new_order}/', setup=new_order),
+    Scenario('metrics/', 'read', 'GET', 'manager', 'metrics/'),
+    Scenario('reports/sales/', 'all time', 'GET', 'manager', 'reports/sales/'),
+    Scenario('reports/sales/', 'last 30 days', 'GET', 'manager', 'reports/sales/?date_from={month_ago}'),
+    Scenario('async/menu-items/', 'list', 'GET', 'customer', 'async/menu-items/'),
+    Scenario('async/menu-items/<int:pk>/', 'retrieve', 'GET', 'customer', 'async/menu-items/{menuitem.pk}/'),
+    Scenario('async/categories/', 'list', 'GET', 'customer', 'async/categories/'),
+    Scenario('async/cart/menu-items/', 'list', 'GET', 'customer', 'async/cart/menu-items/', setup=fill_cart),
+    Scenario('async/orders/', 'list customer', 'GET', 'customer', 'async/orders/'),
+    Scenario('async/orders/<int:orderId>/', 'retrieve', 'GET', 'customer', 'async/orders/{order.pk}/'),
+    Scenario('async/orders/events/', 'connect', 'GET', 'customer', 'async/orders/events/'),
+]
+
+
+def routes(patterns=None, prefix=''):
+    """Every URL pattern of LittleLemonAPI.urls, without the format suffix variants."""
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from routes(pattern.url_patterns, route)
+        elif '(?P<format>' not in route:
+            # Router patterns are regexes: '^users/(?P<username>[^/.]+)/$' -> 'users/<username>/'
+            yield re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', route).lstrip('^').rstrip('$')
+
+
+def fill(template, context):
+    if isinstance(template, str):
+        return template.format(**context)
+    if isinstance(template, dict):
+        return {key: fill(value, context) for key, value in template.items()}
+    if isinstance(template, list):
+        return [fill(value, context) for value in template]
+    return template
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scratch database with configurable volumes, call every route of '
+        'LittleLemonAPI/urls.py in-process and report latency percentiles, '
+        'queries per request and response sizes as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default, dest=name)
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--route', action='append', help='Only run scenarios of this route (repeatable).')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+        # The 4xx scenarios would log a warning per request
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        with scratch_database():
+            context = seed_dataset(volumes, seed=options['seed'])
+            clients = self.clients(context['tokens'])
+            results = {}
+            for scenario in SCENARIOS:
+                if options['route'] and scenario.route not in options['route']:
+                    continue
+                results.setdefault(scenario.route, {})[scenario.label] = self.run(
+                    scenario, context, clients, options['requests'])
+        covered = {scenario.route for scenario in SCENARIOS}
+        write_report(self, {
+            'volumes': volumes,
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'routes': results,
+            # Routes added to urls.py without a scenario show up here
+            'uncovered': [route for route in routes() if route not in covered],
+        }, options['output'])
+
+    def clients(self, tokens):
+        clients = {}
+        for role, token in [(ANON, None), *tokens.items()]:
+            client = APIClient()
+            headers = {}
+            if token is not None:
+                client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+                headers['Authorization'] = f'Token {token}'
+            clients[role] = (client, AsyncClient(), headers)
+        return clients
+
+    @staticmethod
+    async def async_get(client, path, headers):
+        response = await client.get(path, headers=headers)
+        if response.streaming and response.is_async:
+            # An event stream does not end: time it to its first chunk
+            first = b''
+            async for first in response.streaming_content:
+                break
+            response.streaming_content = [first]
+            # What the server does when the client goes away, minus
+            # close_old_connections, which would drop the scratch database
+            request_finished.disconnect(close_old_connections)
+            response.close()
+            request_finished.connect(close_old_connections)
+        return response
+
+    def run(self, scenario, context, clients, requests):
+        client, async_client, headers = clients[scenario.role]
+        counter = itertools.count()
+        latencies, queries, sizes, statuses = [], [], [], Counter()
+
+        def one():
+            n = next(counter)
+            values = {**context, 'n': n}
+            if scenario.setup is not None:
+                values.update(scenario.setup(context, n) or {})
+            path = '/api/' + fill(scenario.path, values)
+            data = fill(scenario.data, values)
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                if path.startswith('/api/async/'):
+                    # async_to_sync keeps the ORM on this thread's connection so queries are counted
+                    response = async_to_sync(self.async_get)(async_client, path, headers)
+                else:
+                    response = getattr(client, scenario.method.lower())(path, data, format='json')
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+            return elapsed, len(ctx.captured_queries), len(body), response.status_code
+
+        one()  # warm up per-process caches (roles, tokens, catalog)
+        for _ in range(min(requests, scenario.repeat or requests)):
+            elapsed, query_count, size, status_code = one()
+            latencies.append(elapsed)
+            queries.append(query_count)
+            sizes.append(size)
+            statuses[status_code] += 1
+        return {
+            'method': scenario.method,
+            'role': scenario.role or 'anonymous',
+            'status': dict(statuses),
+            **summarize(latencies),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'bytes_mean': round(sum(sizes) / len(sizes)),
+            'bytes_max': max(sizes),
+        }
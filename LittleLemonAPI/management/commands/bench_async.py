@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from LittleLemonAPI.models import Category, MenuItem, Order, OrderItem
+
+from ._bench import scratch_database, summarize, write_report
+
+ENDPOINTS = ['menu-items/', 'categories/', 'cart/menu-items/', 'orders/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare request throughput of the async (ASGI) read endpoints with their '
+        'WSGI counterparts at several concurrency levels, in-process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and level.')
+        parser.add_argument(
+            '--wsgi-threads', type=int, default=32,
+            help='Worker threads of the simulated WSGI server; extra clients queue for a thread.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            token = self.seed()
+            headers = {'Authorization': f'Token {token}'}
+            report = {'requests': options['requests'], 'wsgi_threads': options['wsgi_threads'], 'levels': {}}
+            for level in options['concurrency']:
+                report['levels'][level] = {}
+                for endpoint in ENDPOINTS:
+                    report['levels'][level][endpoint] = {
+                        'asgi': asyncio.run(self.run_asgi(f'/api/async/{endpoint}', headers, level, options['requests'])),
+                        'wsgi': self.run_wsgi(
+                            f'/api/{endpoint}', headers, level, options['requests'], options['wsgi_threads']),
+                    }
+        write_report(self, report, options['output'])
+
+    def seed(self):
+        user = User.objects.create_user(username='bench_customer', password='bench@10!')
+        category = Category.objects.create(slug='mains', title='Mains')
+        items = MenuItem.objects.bulk_create([
+            MenuItem(title=f'Item {i}', price=i % 20 + 1, featured=False, category=category) for i in range(50)
+        ])
+        for i in range(20):
+            order = Order.objects.create(user=user, total=2)
+            OrderItem.objects.create(order=order, menuitem=items[i], quantity=1, unit_price=2, price=2)
+        return Token.objects.create(user=user).key
+
+    async def run_asgi(self, path, headers, concurrency, total):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return self.result(latencies, errors, time.perf_counter() - start)
+
+    def run_wsgi(self, path, headers, concurrency, total, threads):
+        # A Client keeps cookies and the last response, so each thread gets its own
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            start = time.perf_counter()
+            response = local.client.get(path, headers=headers)
+            return time.perf_counter() - start, response.status_code != 200
+
+        # ``concurrency`` clients share ``threads`` workers, as with a threaded WSGI server
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(concurrency, threads)) as pool:
+            outcomes = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+        return self.result([latency for latency, _ in outcomes], sum(failed for _, failed in outcomes), elapsed)
+
+    @staticmethod
+    def result(latencies, errors, elapsed):
+        return {
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'errors': errors,
+            **summarize(latencies),
+        }
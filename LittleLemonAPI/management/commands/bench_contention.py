@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from LittleLemon.sqlite import DEFAULT_PRAGMAS, JOURNAL_MODE, apply_pragmas
+
+from ._bench import summarize, write_report
+
+SCHEMA = [
+    'CREATE TABLE cart (user_id INTEGER, menuitem_id INTEGER, quantity INTEGER, price REAL,'
+    ' UNIQUE (menuitem_id, user_id))',
+    'CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, total REAL)',
+    'CREATE INDEX orders_user ON orders (user_id)',
+    'CREATE TABLE order_items (order_id INTEGER, menuitem_id INTEGER, quantity INTEGER, price REAL)',
+    'CREATE INDEX order_items_order ON order_items (order_id)',
+]
+
+# Django's stock SQLite setup: rollback journal, deferred BEGIN, a new
+# connection per request and sqlite3's default 5 s busy handler. 'tuned' is
+# what settings.DATABASES uses; 'tuned-persistent' adds the kept connections
+# a WSGI-only deployment could enable with conn_max_age. Both run on a WAL
+# file, as migration 0007 leaves the database.
+TUNED_PRAGMAS = {'journal_mode': JOURNAL_MODE, **DEFAULT_PRAGMAS}
+PROFILES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'persistent': False},
+    'tuned': {'pragmas': TUNED_PRAGMAS, 'begin': 'BEGIN IMMEDIATE', 'persistent': False},
+    'tuned-persistent': {'pragmas': TUNED_PRAGMAS, 'begin': 'BEGIN IMMEDIATE', 'persistent': True},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer a scratch SQLite file with concurrent cart writes, checkouts and '
+        'order reads, with the stock connection setup and with the tuned one '
+        '(LittleLemon/sqlite), and report throughput and "database is locked" errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Threads filling carts and checking out.')
+        parser.add_argument('--readers', type=int, default=8, help='Threads listing orders.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile.')
+        parser.add_argument('--profile', choices=sorted(PROFILES), action='append')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        report = {'writers': options['writers'], 'readers': options['readers'], 'duration': options['duration']}
+        for name in options['profile'] or sorted(PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'contention.sqlite3')
+                report[name] = self.run_profile(path, PROFILES[name], options)
+        write_report(self, report, options['output'])
+
+    def run_profile(self, path, profile, options):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, profile['pragmas'])
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.close()
+
+        stop = threading.Event()
+        results = {'checkout': [], 'read': []}
+        errors = {'checkout': 0, 'read': 0}
+        lock = threading.Lock()
+
+        def worker(kind, user_id):
+            latencies, failures = [], 0
+            connection = None
+            while not stop.is_set():
+                if connection is None:
+                    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+                    apply_pragmas(connection, profile['pragmas'])
+                start = time.perf_counter()
+                try:
+                    if kind == 'checkout':
+                        self.checkout(connection, profile['begin'], user_id)
+                    else:
+                        self.read(connection, user_id)
+                    latencies.append(time.perf_counter() - start)
+                except sqlite3.OperationalError as exc:
+                    if 'locked' not in str(exc) and 'busy' not in str(exc):
+                        raise
+                    failures += 1
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                if not profile['persistent']:
+                    connection.close()
+                    connection = None
+            if connection is not None:
+                connection.close()
+            with lock:
+                results[kind] += latencies
+                errors[kind] += failures
+
+        threads = [threading.Thread(target=worker, args=('checkout', i)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=('read', i)) for i in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        return {
+            kind: {
+                'per_second': round(len(latencies) / options['duration'], 1),
+                'locked_errors': errors[kind],
+                **summarize(latencies),
+            }
+            for kind, latencies in results.items()
+        }
+
+    @staticmethod
+    def checkout(connection, begin, user_id):
+        # Fill the cart, then move it into an order like checkout.checkout()
+        connection.execute(begin)
+        connection.executemany(
+            'INSERT INTO cart VALUES (?, ?, 1, 9.5) ON CONFLICT DO UPDATE SET quantity = quantity + 1',
+            [(user_id, menuitem_id) for menuitem_id in range(3)])
+        connection.execute('COMMIT')
+
+        connection.execute(begin)
+        lines = connection.execute(
+            'SELECT menuitem_id, quantity, price FROM cart WHERE user_id = ?', (user_id,)).fetchall()
+        order_id = connection.execute(
+            'INSERT INTO orders (user_id, total) VALUES (?, ?)',
+            (user_id, sum(quantity * price for _, quantity, price in lines))).lastrowid
+        connection.executemany(
+            'INSERT INTO order_items VALUES (?, ?, ?, ?)',
+            [(order_id, menuitem_id, quantity, price) for menuitem_id, quantity, price in lines])
+        connection.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def read(connection, user_id):
+        connection.execute(
+            'SELECT o.id, o.total, i.menuitem_id, i.quantity FROM orders o '
+            'JOIN order_items i ON i.order_id = o.id WHERE o.user_id = ? ORDER BY o.id DESC LIMIT 20',
+            (user_id,)).fetchall()
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import fastpath
+from LittleLemonAPI.compression import CODECS, COMPRESSION_DEFAULTS
+from LittleLemonAPI.models import MenuItem, Order
+from LittleLemonAPI.renderers import ColumnarJSONRenderer, FastJSONRenderer, MessagePackRenderer
+
+from ._bench import scratch_database, seed_dataset, summarize, timed, write_report
+
+# name: (queryset of the list endpoint, its fast path listing)
+CASES = {
+    'menu-items': (lambda: MenuItem.objects.select_related('category').order_by('id'), fastpath.MENU_ITEMS),
+    'orders': (lambda: Order.objects.with_items().order_by('id'), fastpath.ORDERS),
+}
+
+RENDERERS = [FastJSONRenderer, ColumnarJSONRenderer, MessagePackRenderer]
+
+
+class Command(BaseCommand):
+    help = (
+        'Render a page of the menu item and order lists with each response format, '
+        'then compress it with each content coding, and report the payload size and '
+        'the encode time of every combination.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per page.')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--menu-items', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--case', choices=sorted(CASES), action='append')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        renderers = [renderer() for renderer in RENDERERS if getattr(renderer, 'available', True)]
+        with scratch_database():
+            seed_dataset({'menu_items': options['menu_items'], 'orders': options['orders']})
+            report = {
+                'rows': options['rows'],
+                'repeat': options['repeat'],
+                'formats': [renderer.format for renderer in renderers],
+                'encodings': sorted(CODECS),
+            }
+            for name in options['case'] or sorted(CASES):
+                report[name] = self.run_case(*CASES[name], renderers, options)
+        write_report(self, report, options['output'])
+
+    def run_case(self, make_queryset, listing, renderers, options):
+        queryset = make_queryset()[:options['rows']]
+        rows = listing.build(list(listing.values(queryset)))
+        # The envelope of a paginated response
+        data = {'count': len(rows), 'next': None, 'previous': None, 'results': rows}
+        result = {}
+        baseline = None
+        for renderer in renderers:
+            body = renderer.render(data, renderer.media_type)
+            baseline = baseline or len(body)
+            entry = {
+                'bytes': len(body),
+                'ratio': round(len(body) / baseline, 3),
+                **summarize(timed(lambda: renderer.render(data, renderer.media_type), options['repeat'])),
+            }
+            for coding, codec in sorted(CODECS.items()):
+                level = COMPRESSION_DEFAULTS['LEVELS'][coding]
+                compressed = codec(body, level)
+                entry[coding] = {
+                    'bytes': len(compressed),
+                    'ratio': round(len(compressed) / baseline, 3),
+                    **summarize(timed(lambda: codec(body, level), options['repeat'])),
+                }
+            result[renderer.format] = entry
+        return result
@@ -0,0 +1,68 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from LittleLemonAPI import search
+from LittleLemonAPI.models import Category, MenuItem
+
+from ._bench import ADJECTIVES, NOUNS, scratch_database, summarize, timed, write_report
+
+CATEGORIES = ['Starters', 'Mains', 'Desserts', 'Drinks', 'Specials', 'Sides', 'Salads', 'Kids']
+
+QUERIES = ['lemon', 'chick', 'greek salad', 'smoked lamb', 'dess', 'zzz']
+
+
+class Command(BaseCommand):
+    help = 'Compare FTS5 ranked menu search with the title__icontains scan on a seeded catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.seed(options['items'])
+            report = {
+                'items': options['items'],
+                'fts_available': search.fts_available(),
+                'queries': {},
+            }
+            page_size = options['page_size']
+            for text in QUERIES:
+                icontains = MenuItem.objects.select_related('category').filter(title__icontains=text).order_by('id')
+                ranked = search.search_menu_items(
+                    MenuItem.objects.select_related('category'), text).order_by('search_rank', 'id')
+                # first_page: what the API serves (icontains stops at the first
+                # matches in id order, FTS has to rank every match);
+                # all_matches: the cost of finding the full match set.
+                report['queries'][text] = {
+                    'icontains': {
+                        'first_page': summarize(timed(lambda: list(icontains[:page_size]), options['repeat'])),
+                        'all_matches': summarize(timed(lambda: list(icontains.values_list('id', flat=True)), options['repeat'])),
+                        'matches': icontains.count(),
+                    },
+                    'fts': {
+                        'first_page': summarize(timed(lambda: list(ranked[:page_size]), options['repeat'])),
+                        'all_matches': summarize(timed(lambda: list(ranked.values_list('id', flat=True)), options['repeat'])),
+                        'matches': ranked.count(),
+                    },
+                }
+        write_report(self, report, options['output'])
+
+    def seed(self, count):
+        rng = random.Random(0)
+        categories = Category.objects.bulk_create(
+            [Category(slug=title.lower(), title=title) for title in CATEGORIES])
+        batch = []
+        for i in range(count):
+            title = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(NOUNS)} no {i}'.title()
+            batch.append(MenuItem(
+                title=title, price=rng.randint(100, 9999) / 100, featured=False, category=rng.choice(categories)))
+            if len(batch) == 5000:
+                MenuItem.objects.bulk_create(batch)
+                batch = []
+        MenuItem.objects.bulk_create(batch)
+        # bulk_create skips the post_save signals that keep the index in sync
+        search.rebuild_index()
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from LittleLemonAPI import fastpath
+from LittleLemonAPI.models import Cart, Category, MenuItem, Order
+from LittleLemonAPI.renderers import FastJSONRenderer, orjson
+from LittleLemonAPI.serializers import CartSerializer, CategorySerializer, MenuItemSerializer, OrderSerializer
+
+from ._bench import scratch_database, seed_dataset, summarize, timed, write_report
+
+# name: (queryset of the list endpoint, its serializer, its fast path listing)
+CASES = {
+    'categories': (lambda: Category.objects.order_by('pk'), CategorySerializer, fastpath.CATEGORIES),
+    'menu-items': (lambda: MenuItem.objects.select_related('category').order_by('id'),
+                   MenuItemSerializer, fastpath.MENU_ITEMS),
+    'cart': (lambda: Cart.objects.select_related('menuitem').order_by('id'), CartSerializer, fastpath.CART_LINES),
+    'orders': (lambda: Order.objects.with_items().order_by('id'), OrderSerializer, fastpath.ORDERS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the list endpoints\' rows through the DRF serializers and JSONRenderer '
+        'and through the values() fast path and FastJSONRenderer, check that the bytes '
+        'match and report rows per second for both.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows rendered per call.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--menu-items', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--case', choices=sorted(CASES), action='append')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed_dataset({'menu_items': options['menu_items'], 'orders': options['orders']})
+            report = {'rows': options['rows'], 'repeat': options['repeat'], 'orjson': orjson is not None}
+            for name in options['case'] or sorted(CASES):
+                report[name] = self.run_case(*CASES[name], options)
+        write_report(self, report, options['output'])
+
+    def run_case(self, make_queryset, serializer_class, listing, options):
+        queryset = make_queryset()[:options['rows']]
+
+        def serializer():
+            return JSONRenderer().render(serializer_class(list(queryset), many=True).data)
+
+        def fast():
+            return FastJSONRenderer().render(listing.build(list(listing.values(queryset))))
+
+        expected, actual = serializer(), fast()
+        rows = len(list(queryset))
+        result = {'rows': rows, 'identical': expected == actual}
+        for path, func in (('serializer', serializer), ('fastpath', fast)):
+            samples = timed(func, options['repeat'])
+            mean = sum(samples) / len(samples)
+            result[path] = {'rows_per_second': round(rows / mean) if mean else 0, **summarize(samples)}
+        if result['fastpath']['rows_per_second'] and result['serializer']['rows_per_second']:
+            result['speedup'] = round(result['fastpath']['rows_per_second'] / result['serializer']['rows_per_second'], 2)
+        return result
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+from LittleLemonAPI.models import Category, MenuItem
+from LittleLemonAPI.roles import get_roles
+from LittleLemonAPI.throttles import EndpointTokenBucketThrottle, UserTokenBucketThrottle, bucket_store
+
+from ._bench import percentile, scratch_database, summarize, timed, write_report
+
+
+class DRFUserRateThrottle(UserRateThrottle):
+    """DRF's sliding window throttle, which keeps every request time in the cache."""
+
+
+class DRFAnonRateThrottle(AnonRateThrottle):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request cost of the token bucket throttles, against '
+        "DRF's cache-based rate throttles and against no throttling at all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=100000, help='allow_request calls per case.')
+        parser.add_argument('--keys', type=int, default=100000, help='Distinct clients in the many-keys case.')
+        parser.add_argument('--requests', type=int, default=2000, help='Full requests per end-to-end case.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        # One client never runs out within the run, so the cost of the check is measured
+        # rather than the cost of a 429; the many-clients case keeps the configured anon rate.
+        single = f"{options['calls'] + options['requests'] * 2 + 10}/day"
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'customer': single, 'endpoint': single}
+        DRFUserRateThrottle.rate = single
+        DRFAnonRateThrottle.rate = rates['anon']
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+        with scratch_database(throttling=True), override_settings(REST_FRAMEWORK=rest_framework):
+            user = User.objects.create_user(username='bench_customer', password='bench@10!')
+            category = Category.objects.create(slug='mains', title='Mains')
+            MenuItem.objects.bulk_create([
+                MenuItem(title=f'Item {i}', price=i % 20 + 1, featured=False, category=category) for i in range(10)
+            ])
+            token = Token.objects.create(user=user).key
+            report = {
+                'allow_request': self.micro(user, options['calls'], options['keys']),
+                'request_ms': self.end_to_end(token, options['requests']),
+            }
+        write_report(self, report, options['output'])
+
+    def micro(self, user, calls, keys):
+        factory = RequestFactory()
+        request = Request(factory.get('/api/menu-items/'))
+        request.user = user
+        get_roles(user)
+        view = type('View', (), {'throttle_scope': 'menu-items'})()
+        drf_cache_throttle = DRFUserRateThrottle()
+        cases = {
+            'none': lambda: True,
+            'token_bucket': lambda: (
+                UserTokenBucketThrottle().allow_request(request, view)
+                and EndpointTokenBucketThrottle().allow_request(request, view)),
+            'drf_user_rate': lambda: drf_cache_throttle.allow_request(request, view),
+        }
+        report = {name: self.per_call(case, calls) for name, case in cases.items()}
+
+        # One bucket per client address, cycling through ``keys`` clients
+        anon_requests = []
+        for i in range(keys):
+            anon_request = Request(factory.get('/api/menu-items/', REMOTE_ADDR=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'))
+            anon_request.user = AnonymousUser()
+            anon_requests.append(anon_request)
+        bucket_store.clear()
+        position = iter(range(calls))
+        report['token_bucket_many_keys'] = self.per_call(
+            lambda: UserTokenBucketThrottle().allow_request(anon_requests[next(position) % keys], view), calls)
+        report['buckets_after_many_keys'] = len(bucket_store)
+        position = iter(range(calls))
+        report['drf_anon_rate_many_keys'] = self.per_call(
+            lambda: DRFAnonRateThrottle().allow_request(anon_requests[next(position) % keys], view), calls)
+        return report
+
+    @staticmethod
+    def per_call(func, calls):
+        samples = timed(func, calls)
+        return {
+            'p50_us': round(percentile(samples, 50) * 1e6, 2),
+            'p99_us': round(percentile(samples, 99) * 1e6, 2),
+            'mean_us': round(sum(samples) / len(samples) * 1e6, 2),
+        }
+
+    def end_to_end(self, token, requests):
+        client = Client()
+        headers = {'Authorization': f'Token {token}'}
+        report = {}
+        for name, enabled in (('throttled', True), ('unthrottled', False)):
+            with override_settings(THROTTLING={**settings.THROTTLING, 'ENABLED': enabled}):
+                client.get('/api/menu-items/', headers=headers)
+                report[name] = summarize(timed(lambda: client.get('/api/menu-items/', headers=headers), requests))
+        return report
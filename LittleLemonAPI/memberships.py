@@ -0,0 +1,74 @@
+"""
+Bulk group membership changes.
+
+Users are given as ids or usernames and resolved in one query, the group id
+comes from roles.group_id(), and the group's rows of the user/group through
+table are read and then inserted or deleted in one transaction, so a change
+costs the same handful of queries for one user or hundreds.
+
+Neither bulk_create() nor delete() on the through model sends m2m_changed,
+so the cached roles of the users that changed are dropped here: right away,
+and again on commit so a request racing the transaction can't cache the old
+roles. Like every role change, this reaches the other workers only through a
+shared ROLE_CACHE; with a process-local one they see it once their entries
+expire, after LOCAL_TIMEOUT seconds (see roles.py).
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from . import roles
+
+Membership = User.groups.through
+
+
+def resolve_users(identifiers):
+    """
+    ``({pk: username}, not_found)`` for ``identifiers``, user ids (int) and
+    usernames (str); ``not_found`` keeps the identifiers as given.
+    """
+    ids = {value for value in identifiers if isinstance(value, int)}
+    usernames = {value for value in identifiers if isinstance(value, str)}
+    users = dict(User.objects.filter(Q(pk__in=ids) | Q(username__in=usernames)).values_list('pk', 'username'))
+    found = set(users) | set(users.values())
+    not_found = list(dict.fromkeys(value for value in identifiers if value not in found))
+    return users, not_found
+
+
+def _invalidate(user_ids):
+    roles.invalidate(*user_ids)
+    transaction.on_commit(lambda: roles.invalidate(*user_ids))
+
+
+def _usernames(users, pks):
+    return sorted(users[pk] for pk in pks)
+
+
+def add_members(group_name, identifiers):
+    """Add the users to ``group_name``; returns the usernames added, already members and not found."""
+    group_id = roles.group_id(group_name)
+    with transaction.atomic():
+        users, not_found = resolve_users(identifiers)
+        members = set(
+            Membership.objects.filter(group_id=group_id, user_id__in=users).values_list('user_id', flat=True))
+        added = [pk for pk in users if pk not in members]
+        if added:
+            # A concurrent add of the same user is not an error
+            Membership.objects.bulk_create(
+                [Membership(user_id=pk, group_id=group_id) for pk in added], ignore_conflicts=True)
+            _invalidate(added)
+    return {'added': _usernames(users, added), 'unchanged': _usernames(users, members), 'not_found': not_found}
+
+
+def remove_members(group_name, identifiers):
+    """Remove the users from ``group_name``; returns the usernames removed, not members and not found."""
+    group_id = roles.group_id(group_name)
+    with transaction.atomic():
+        users, not_found = resolve_users(identifiers)
+        members = Membership.objects.filter(group_id=group_id, user_id__in=users)
+        removed = list(members.values_list('user_id', flat=True))
+        if removed:
+            members.delete()
+            _invalidate(removed)
+    unchanged = set(users) - set(removed)
+    return {'removed': _usernames(users, removed), 'unchanged': _usernames(users, unchanged), 'not_found': not_found}
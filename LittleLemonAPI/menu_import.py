@@ -0,0 +1,220 @@
+"""
+Bulk menu import.
+
+Rows (``title``, ``price``, ``category_id`` and optionally ``featured``) are
+read one at a time from a CSV, JSON or NDJSON upload, validated with the same
+field rules as MenuItemSerializer (titles go through bleach) and written
+IMPORT_BATCH_SIZE at a time. Each batch is one ``INSERT ... ON CONFLICT
+(title, price) DO UPDATE``, which creates the new items and moves existing
+ones to the row's category. Rows that fail validation are reported and
+skipped without affecting the rest of the batch.
+
+CSV and NDJSON uploads must be UTF-8: they are checked in a first streaming
+pass, so a file with a stray byte is rejected before any batch is written.
+
+bulk_create() sends no post_save, so the search index is updated per batch
+here and the catalog version bumped once at the end.
+"""
+import codecs
+import csv
+import io
+import json
+
+import bleach
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from . import search
+from .cache import catalog_cache
+from .models import Category, FeaturedItem, MenuItem
+
+# Rows validated and written per statement; bounds memory and statement size
+IMPORT_BATCH_SIZE = 500
+
+FORMATS = {
+    '.csv': 'csv', 'text/csv': 'csv',
+    '.json': 'json', 'application/json': 'json',
+    '.ndjson': 'ndjson', '.jsonl': 'ndjson', 'application/x-ndjson': 'ndjson',
+}
+
+FIELDS = {
+    'title': serializers.CharField(max_length=255),
+    'price': serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0),
+    'category_id': serializers.IntegerField(),
+    'featured': serializers.BooleanField(required=False, default=False),
+}
+
+
+def upload_format(upload):
+    name = upload.name.lower()
+    for suffix, format in FORMATS.items():
+        if suffix.startswith('.') and name.endswith(suffix):
+            return format
+    content_type = (upload.content_type or '').split(';')[0].strip()
+    if content_type in FORMATS:
+        return FORMATS[content_type]
+    raise serializers.ValidationError({'file': 'Upload a .csv, .json or .ndjson file.'})
+
+
+def check_encoding(upload):
+    """Raise ValidationError unless ``upload`` is UTF-8 text, reading it chunk by chunk."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for chunk in upload.chunks():
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise serializers.ValidationError({'file': 'The file is not UTF-8 text.'})
+    upload.seek(0)
+
+
+def read_rows(upload):
+    """
+    Yield the rows of ``upload`` as dicts, None for an NDJSON line that does
+    not parse or a ValidationError for a CSV row that does not. CSV and
+    NDJSON are read as they stream; a JSON file must hold one list and is
+    parsed whole.
+    """
+    format = upload_format(upload)
+    if format == 'json':
+        try:
+            rows = json.load(upload)
+        except ValueError:
+            raise serializers.ValidationError({'file': 'Not a valid JSON file.'})
+        if not isinstance(rows, list):
+            raise serializers.ValidationError({'file': 'Expected a JSON list of rows.'})
+        yield from rows
+        return
+
+    check_encoding(upload)
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='' if format == 'csv' else None)
+    if format == 'csv':
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                # The reader carries on with the next line
+                yield serializers.ValidationError({'non_field_errors': [f'Not a valid CSV row: {exc}.']})
+                continue
+            # Empty cells count as missing, extra cells (key None) are ignored
+            yield {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+    for line in text:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def clean_row(row, category_ids):
+    """The validated values of ``row``, or raise ValidationError with its errors."""
+    if isinstance(row, serializers.ValidationError):
+        raise row
+    if not isinstance(row, dict):
+        raise serializers.ValidationError({'non_field_errors': ['Expected an object.']})
+    values, errors = {}, {}
+    for name, field in FIELDS.items():
+        try:
+            values[name] = field.run_validation(row.get(name, empty))
+        except serializers.ValidationError as exc:
+            errors[name] = exc.detail
+    if 'category_id' in values and values['category_id'] not in category_ids:
+        errors['category_id'] = [f'Invalid pk "{values["category_id"]}" - object does not exist.']
+    if errors:
+        raise serializers.ValidationError(errors)
+    values['title'] = bleach.clean(values['title'])
+    return values
+
+
+def write_batch(batch, report):
+    """
+    Upsert ``batch`` (``(row number, values)`` pairs). Returns the ids of the
+    items written and the rows they were written from, both keyed by
+    (title, price).
+    """
+    # A statement may not update the same row twice: the last row wins
+    rows = {}
+    for number, values in batch:
+        key = (values['title'], values['price'])
+        if key in rows:
+            report['errors'].append({
+                'row': rows[key][0],
+                'errors': {'non_field_errors': [f'Same title and price as row {number}, which was used instead.']},
+            })
+        rows[key] = (number, values)
+    titles = {title for title, _ in rows}
+
+    try:
+        with transaction.atomic():
+            existing = set(MenuItem.objects.filter(title__in=titles).values_list('title', 'price'))
+            MenuItem.objects.bulk_create(
+                [
+                    # The FeaturedItem slot, set after the batches, says which
+                    # item is featured; the legacy column is left False
+                    MenuItem(title=values['title'], price=values['price'],
+                             category_id=values['category_id'], featured=False)
+                    for _, values in rows.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['title', 'price'],
+                update_fields=['category', 'updated_at'],
+            )
+            ids = {
+                (title, price): pk
+                for title, price, pk in MenuItem.objects.filter(title__in=titles).values_list('title', 'price', 'pk')
+                if (title, price) in rows
+            }
+            search.index_menu_items(list(ids.values()))
+    except DatabaseError as exc:
+        # A category deleted since it was looked up, for instance
+        for number, _ in rows.values():
+            report['errors'].append({'row': number, 'errors': {'non_field_errors': [str(exc)]}})
+        return {}, {}
+
+    report['updated'] += len(rows.keys() & existing)
+    report['created'] += len(rows.keys() - existing)
+    return ids, rows
+
+
+def import_menu_items(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and upsert ``rows`` (an iterable of dicts) in batches. Returns
+    the row count, how many items were created and updated, and the errors
+    of the rows that were skipped (numbered from 1).
+    """
+    category_ids = set(Category.objects.values_list('pk', flat=True))
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'errors': []}
+    featured = (0, None)  # (row number, item id) of the last featured row written
+    batch = []
+
+    def flush():
+        nonlocal featured
+        ids, written = write_batch(batch, report)
+        for key, (number, values) in written.items():
+            if values['featured'] and key in ids:
+                featured = max(featured, (number, ids[key]))
+        batch.clear()
+
+    for number, row in enumerate(rows, 1):
+        report['rows'] = number
+        try:
+            batch.append((number, clean_row(row, category_ids)))
+        except serializers.ValidationError as exc:
+            report['errors'].append({'row': number, 'errors': exc.detail})
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if featured[1] is not None:
+        # The last featured row takes the slot, as if the rows were posted in order
+        FeaturedItem.feature(MenuItem(pk=featured[1]))
+    if report['created'] or report['updated']:
+        catalog_cache.bump_on_commit()
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
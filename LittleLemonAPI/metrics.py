@@ -0,0 +1,15 @@
+"""
+Runtime counters of the in-process caches and the sampled request
+histograms, served by the metrics endpoint as JSON or Prometheus text.
+"""
+from .authentication import token_cache
+from .cache import catalog_cache
+from .profiling import histograms
+
+
+def collect():
+    return {
+        'token_cache': token_cache.stats(),
+        'catalog_cache': catalog_cache.stats(),
+        'requests': histograms.snapshot(),
+    }
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:56
+
+import LittleLemonAPI.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'LittleLemonAPI_menuitem_fts'
+
+# bm25() column weights: a hit in the item title counts more than one in its category title
+TITLE_WEIGHT = 10.0
+CATEGORY_WEIGHT = 1.0
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite only; elsewhere search falls back to title__icontains
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5('
+        "title, category_title, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # Make the rank column bm25() with per-column weights
+    schema_editor.execute(
+        f'INSERT INTO "{FTS_TABLE}" ("{FTS_TABLE}", rank) VALUES (%s, %s)',
+        ['rank', f'bm25({TITLE_WEIGHT}, {CATEGORY_WEIGHT})'],
+    )
+    schema_editor.execute(
+        f'INSERT INTO "{FTS_TABLE}" (rowid, title, category_title) '
+        'SELECT m.id, m.title, c.title FROM "LittleLemonAPI_menuitem" m '
+        'JOIN "LittleLemonAPI_category" c ON c.id = m.category_id'
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{FTS_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemSearchEntry',
+            fields=[
+                ('menuitem', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='LittleLemonAPI.menuitem')),
+                ('title', models.TextField()),
+                ('category_title', models.TextField()),
+                ('document', LittleLemonAPI.models.FullTextField(db_column='LittleLemonAPI_menuitem_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'LittleLemonAPI_menuitem_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.2 on 2026-10-18 20:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_featured_item(apps, schema_editor):
+    # Databases from before the slot flag the item in MenuItem.featured; the
+    # newest flagged item takes the slot
+    MenuItem = apps.get_model('LittleLemonAPI', 'MenuItem')
+    FeaturedItem = apps.get_model('LittleLemonAPI', 'FeaturedItem')
+    db_alias = schema_editor.connection.alias
+    menuitem_id = (MenuItem.objects.using(db_alias).filter(featured=True)
+                   .order_by('-id').values_list('id', flat=True).first())
+    if menuitem_id is not None:
+        FeaturedItem.objects.using(db_alias).create(slot=1, menuitem_id=menuitem_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LittleLemonAPI', '0002_menuitemsearchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeaturedItem',
+            fields=[
+                ('slot', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('menuitem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='LittleLemonAPI.menuitem')),
+            ],
+        ),
+        migrations.RunPython(backfill_featured_item, migrations.RunPython.noop),
+    ]
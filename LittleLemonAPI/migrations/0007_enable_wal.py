@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from LittleLemon.sqlite import JOURNAL_MODE
+
+
+def set_journal_mode(mode):
+    def set_mode(apps, schema_editor):
+        # Persistent in the database file; a no-op for in-memory test databases
+        if schema_editor.connection.vendor == 'sqlite':
+            schema_editor.execute(f'PRAGMA journal_mode = {mode}')
+    return set_mode
+
+
+class Migration(migrations.Migration):
+    # The journal mode cannot change inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('LittleLemonAPI', '0006_alter_cart_unique_together_alter_cart_user_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode(JOURNAL_MODE), set_journal_mode('DELETE')),
+    ]
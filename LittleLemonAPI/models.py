@@ -6,6 +6,8 @@ from django.contrib.auth import get_user_model
 class Category(models.Model):
     slug = models.SlugField()
     title = models.CharField(max_length=255, db_index=True)
+    # Set by save(); QuerySet.update() calls must set it too (see conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.title
@@ -13,31 +15,118 @@ class Category(models.Model):
 class MenuItem(models.Model):
     title = models.CharField(max_length=255, db_index=True)
     price = models.DecimalField(max_digits=6, decimal_places=2, db_index=True)
+    # Legacy flag, only read by migration 0003 to fill the FeaturedItem slot; the
+    # API leaves it False and features items through the slot
     featured = models.BooleanField( db_index=True)
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('title', 'price')
+        # ?category_id= with the price and title orderings of the menu item
+        # list; the category_id index serves the id ordering (SQLite indexes
+        # end with the rowid)
+        indexes = [
+            models.Index(fields=['category', 'price'], name='menuitem_category_price_idx'),
+            models.Index(fields=['category', 'title'], name='menuitem_category_title_idx'),
+        ]
     def __str__(self):
         return self.title
         
+class FeaturedItem(models.Model):
+    # The "item of the day". Featuring an item rewrites this one row instead of
+    # clearing MenuItem.featured across the catalog, and reading it is a
+    # primary key lookup.
+    GLOBAL = 1
+    slot = models.PositiveSmallIntegerField(primary_key=True)
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    # When the slot last moved, which changes two items' featured flag;
+    # indexed for conditional.latest()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def current_id(cls):
+        return cls.objects.filter(pk=cls.GLOBAL).values_list('menuitem_id', flat=True).first()
+
+    @classmethod
+    async def acurrent_id(cls):
+        return await cls.objects.filter(pk=cls.GLOBAL).values_list('menuitem_id', flat=True).afirst()
+
+    @classmethod
+    def feature(cls, menuitem):
+        # A primary key lookup and a one-row write, through save() so post_save
+        # fires; if a concurrent request inserts the slot first, get_or_create()
+        # catches the IntegrityError and this one updates it instead
+        cls.objects.update_or_create(pk=cls.GLOBAL, defaults={'menuitem': menuitem})
+
+class FullTextField(models.TextField):
+    # FTS5 column that supports the __match lookup
+    pass
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+class MenuItemSearchEntry(models.Model):
+    # Row of the FTS5 index kept by search.py; its rowid is the menu item id
+    menuitem = models.OneToOneField(
+        MenuItem, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry')
+    title = models.TextField()
+    category_title = models.TextField()
+    # FTS5 hidden columns: the table-named one matches across all columns, rank is bm25()
+    document = FullTextField(db_column='LittleLemonAPI_menuitem_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'LittleLemonAPI_menuitem_fts'
+        
 class Cart(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed by the unique index, which leads with it: a cart is read by user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.SmallIntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     price = models.DecimalField(max_digits=6, decimal_places=2)
     
     class Meta:
-        unique_together = ('menuitem', 'user')
+        unique_together = ('user', 'menuitem')
     
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        # Everything OrderSerializer -> OrderItemSerializer -> MenuItemSerializer
+        # -> CategorySerializer touches, in two queries however many orders.
+        return self.prefetch_related(
+            models.Prefetch('order_items', queryset=OrderItem.objects.select_related('menuitem__category'))
+        )
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     delivery_crew = models.ForeignKey(User, on_delete=models.SET_NULL, related_name="delivery_crew", null=True, blank=True)
     status = models.BooleanField( db_index=True, default=0)
     total = models.DecimalField(max_digits=6, decimal_places=2)
     date = models.DateField(db_index=True, default=date.today)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        # The customer and delivery crew branches of the order list sorted by
+        # date, and dispatch's open and unassigned orders. SQLite indexes end
+        # with the rowid, which breaks date ties like the cursor's id does,
+        # and lets the user_id and delivery_crew_id indexes serve ?ordering=id
+        indexes = [
+            models.Index(fields=['user', 'date'], name='order_user_date_idx'),
+            models.Index(fields=['delivery_crew', 'date'], name='order_crew_date_idx'),
+            models.Index(fields=['delivery_crew', 'status', 'date'], name='order_crew_status_date_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
@@ -48,4 +137,31 @@ class OrderItem(models.Model):
     
     class Meta:
         unique_together = ('order', 'menuitem')
-     
\ No newline at end of file
+     
+
+
+class DailySales(models.Model):
+    # Per-day totals kept up to date by sales.record_order() at checkout and
+    # rebuilt from the orders by manage.py backfill_sales
+    date = models.DateField(primary_key=True)
+    orders = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+class DailyMenuItemSales(models.Model):
+    date = models.DateField()
+    menuitem = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'menuitem')
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'category')
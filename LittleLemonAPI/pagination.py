@@ -0,0 +1,232 @@
+import base64
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite, unique sort key.
+
+    ``orderings`` maps each accepted value of the ``ordering`` query parameter
+    to the fields of the key, the last one being unique (normally ``id``).
+    Pages are fetched with ``WHERE key > last_key ORDER BY key LIMIT n + 1``,
+    so a deep page costs the same as the first one and no ``COUNT(*)`` is run.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'perpage'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    orderings = {}
+    default_ordering = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_results(list(self.get_page_queryset(queryset, request)))
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Return the (unevaluated) queryset for the requested page. Feed the rows
+        it yields to ``paginate_results`` to get the page itself.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering_key = self.get_ordering_key(request)
+        self.ordering = self.orderings[self.ordering_key]
+        self.cursor = self.decode_cursor(request, queryset)
+
+        reverse = self.cursor is not None and self.cursor['reverse']
+        ordering = [self._flip(field) if reverse else field for field in self.ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._after(self.cursor['key'], reverse))
+        return queryset[:self.page_size + 1]
+
+    def paginate_results(self, results):
+        reverse = self.cursor is not None and self.cursor['reverse']
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.first_key = self.get_key(results[0]) if results else None
+        self.last_key = self.get_key(results[-1]) if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering_key(self, request):
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering in self.orderings:
+            return ordering
+        return self.default_ordering
+
+    def get_key(self, row):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [self._encode_value(row[field]) for field in fields]
+        return [self._encode_value(getattr(row, field)) for field in fields]
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self._link(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_key is None:
+            return None
+        return self._link(self.first_key, reverse=True)
+
+    def _link(self, key, reverse):
+        url = self.request.build_absolute_uri()
+        token = self.encode_cursor({'ordering': self.ordering_key, 'key': key, 'reverse': reverse})
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def encode_cursor(self, cursor):
+        payload = json.dumps([cursor['ordering'], cursor['key'], int(cursor['reverse'])], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            ordering, key, reverse = json.loads(payload)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering != self.ordering_key or not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors come back from clients: convert each value as its field
+        # would, so an edited one is a 404 rather than a database error
+        try:
+            key = [
+                self._decode_value(self._field(queryset, field.lstrip('-')), value)
+                for field, value in zip(self.ordering, key)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'ordering': ordering, 'key': key, 'reverse': bool(reverse)}
+
+    @staticmethod
+    def _field(queryset, name):
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation, like search_rank
+            return queryset.query.annotations[name].output_field
+
+    @staticmethod
+    def _decode_value(field, value):
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(value)
+        value = field.to_python(value)
+        field.run_validators(value)
+        # SQLite reports no integer range, but binds 64-bit integers only
+        if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+            raise ValueError(value)
+        return value
+
+    def _after(self, key, reverse):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y), per field direction
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, key):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
+
+
+class MenuItemCursorPagination(KeysetPagination):
+    orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'title': ('title', 'id'),
+        '-title': ('-title', '-id'),
+        # Relevance; only meaningful on querysets from search.search_menu_items()
+        'rank': ('search_rank', 'id'),
+    }
+    default_ordering = 'id'
+    search_param = 'search'
+
+    def get_ordering_key(self, request):
+        searching = bool(request.query_params.get(self.search_param))
+        ordering = request.query_params.get(self.ordering_param)
+        if ordering == 'rank' and not searching:
+            return self.default_ordering
+        if searching and ordering not in self.orderings:
+            return 'rank'
+        return super().get_ordering_key(request)
+
+
+class OrderCursorPagination(KeysetPagination):
+    orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'date': ('date', 'id'),
+        '-date': ('-date', '-id'),
+    }
+    default_ordering = 'date'
+
+
+class UserCursorPagination(KeysetPagination):
+    # username is unique, so it is a key on its own
+    orderings = {
+        'username': ('username',),
+        '-username': ('-username',),
+        'id': ('id',),
+        '-id': ('-id',),
+    }
+    default_ordering = 'username'
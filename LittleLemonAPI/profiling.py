@@ -0,0 +1,273 @@
+"""
+Sampled per-request profiling.
+
+ProfilingMiddleware picks a fraction of requests (PROFILING['SAMPLE_RATE']) and
+for those records the database query count and time, the time spent producing
+serializer output and checking permissions, and the total time. They are sent
+back in a ``Server-Timing`` header and added to per-route histograms that the
+metrics endpoint exposes.
+
+Queries are timed by a connection execute wrapper installed from
+AppConfig.ready(). Serializer and permission time are measured by the
+project's own classes only: views take ProfiledAPIViewMixin (function views
+get it from this module's api_view), serializers ProfiledSerializerMixin, and
+the fast path times Listing.build(); DRF's and third-party classes are left
+as they are. The timers return straight away unless the context variable
+holds a profile, so requests that are not sampled pay for a random() call
+and one lookup per timer. Database time is also part of the serializer and
+permission time when they trigger queries.
+"""
+import contextvars
+import functools
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.decorators import api_view as drf_api_view
+from rest_framework.serializers import ListSerializer
+
+PROFILING_DEFAULTS = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.01,
+    'SERVER_TIMING': True,
+}
+
+PHASES = ('total', 'db', 'serializer', 'permissions')
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar('littlelemon_profile', default=None)
+
+
+def profiling_config():
+    return {**PROFILING_DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db', 'serializer', 'permissions', 'depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.permissions = 0.0
+        # Nesting level of timed calls, so a serializer used inside another
+        # serializer's .data is only counted once
+        self.depth = 0
+
+
+class Histograms:
+    """Cumulative histograms per (route, method), kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, method, durations, queries):
+        with self._lock:
+            entry = self._routes.get((route, method))
+            if entry is None:
+                entry = self._routes[(route, method)] = {
+                    'phases': {phase: self._empty(DURATION_BUCKETS) for phase in PHASES},
+                    'queries': self._empty(QUERY_BUCKETS),
+                }
+            for phase, value in durations.items():
+                self._add(entry['phases'][phase], DURATION_BUCKETS, value)
+            self._add(entry['queries'], QUERY_BUCKETS, queries)
+
+    @staticmethod
+    def _empty(buckets):
+        return {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+
+    @staticmethod
+    def _add(histogram, buckets, value):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'sample_rate': profiling_config()['SAMPLE_RATE'],
+                'duration_buckets': list(DURATION_BUCKETS),
+                'query_buckets': list(QUERY_BUCKETS),
+                'routes': [
+                    {
+                        'route': route,
+                        'method': method,
+                        'phases': {
+                            phase: {**histogram, 'buckets': list(histogram['buckets'])}
+                            for phase, histogram in entry['phases'].items()
+                        },
+                        'queries': {**entry['queries'], 'buckets': list(entry['queries']['buckets'])},
+                    }
+                    for (route, method), entry in sorted(self._routes.items())
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+histograms = Histograms()
+
+
+def timed(phase):
+    """Add the time spent in the decorated function to ``phase`` of a sampled request."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None or profile.depth:
+                return func(*args, **kwargs)
+            profile.depth += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(profile, phase, getattr(profile, phase) + time.perf_counter() - start)
+                profile.depth -= 1
+        return wrapper
+    return decorator
+
+
+class ProfiledAPIViewMixin:
+    """Time the view's permission checks as the permissions phase."""
+
+    @timed('permissions')
+    def check_permissions(self, request):
+        super().check_permissions(request)
+
+    @timed('permissions')
+    def check_object_permissions(self, request, obj):
+        super().check_object_permissions(request, obj)
+
+
+def api_view(http_method_names=None):
+    """rest_framework's @api_view, with the view class made a ProfiledAPIViewMixin."""
+    def decorator(func):
+        wrapped = drf_api_view(http_method_names)(func).cls
+        view_class = type(wrapped.__name__, (ProfiledAPIViewMixin, wrapped), {
+            '__doc__': wrapped.__doc__,
+            '__module__': wrapped.__module__,
+        })
+        return view_class.as_view()
+    return decorator
+
+
+class ProfiledSerializerMixin:
+    """
+    Time ``.data`` as the serializer phase. Model serializers that are listed
+    set ``Meta.list_serializer_class = ProfiledListSerializer``, since a
+    ListSerializer does not go through its child's ``.data``.
+    """
+
+    @property
+    @timed('serializer')
+    def data(self):
+        return super().data
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin, ListSerializer):
+    pass
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db += time.perf_counter() - start
+        profile.queries += 1
+
+
+def _add_query_hook(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+_installed = False
+
+
+def install():
+    """Hook the database timer into every connection; idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    for connection in connections.all():
+        _add_query_hook(connection)
+    connection_created.connect(_add_query_hook, dispatch_uid='littlelemon-profiling')
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, config = self.start()
+        if profile is None:
+            return self.get_response(request)
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - start, config)
+
+    async def __acall__(self, request):
+        profile, config = self.start()
+        if profile is None:
+            return await self.get_response(request)
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile, time.perf_counter() - start, config)
+
+    @staticmethod
+    def start():
+        config = profiling_config()
+        if not config['ENABLED'] or random.random() >= config['SAMPLE_RATE']:
+            return None, config
+        return RequestProfile(), config
+
+    @staticmethod
+    def finish(request, response, profile, total, config):
+        durations = {
+            'total': total,
+            'db': profile.db,
+            'serializer': profile.serializer,
+            'permissions': profile.permissions,
+        }
+        match = request.resolver_match
+        if match is not None:
+            histograms.observe(match.route, request.method, durations, profile.queries)
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={profile.db * 1000:.2f};desc="{profile.queries} queries"',
+                f'serializer;dur={profile.serializer * 1000:.2f}',
+                f'permissions;dur={profile.permissions * 1000:.2f}',
+                f'total;dur={total * 1000:.2f}',
+            ])
+        return response
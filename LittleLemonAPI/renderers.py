@@ -0,0 +1,206 @@
+import csv
+import io
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ContentNegotiation(DefaultContentNegotiation):
+    """
+    DRF's negotiation, leaving out renderers whose optional package is not
+    installed (``available = False``), so those media types get a 406.
+    """
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'available', True)]
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON, one object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(self.render_row(row) for row in rows).encode(self.charset)
+
+    @staticmethod
+    def render_row(row):
+        return json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed, producing the
+    same bytes for the compact output the API serves: what orjson does not
+    handle the same way (Decimal, dates, lazy strings, querysets) goes through
+    DRF's encoder, and U+2028/U+2029 are escaped like JSONRenderer does. Falls
+    back to JSONRenderer for indented output, without orjson, or when orjson
+    rejects the data (integers over 64 bits). Floats are only written the same
+    between 1e-4 and 1e16, which covers prices.
+    """
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def columnar(data):
+    """
+    ``data`` with every list of objects turned into ``{"columns": [...],
+    "rows": [[...], ...]}``, nested lists included, so the keys are written
+    once per list instead of once per object. A key missing from some objects
+    comes back as null.
+    """
+    if isinstance(data, dict):
+        return {key: columnar(value) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        if data and all(isinstance(row, dict) for row in data):
+            columns = list(dict.fromkeys(key for row in data for key in row))
+            return {'columns': columns, 'rows': [[columnar(row.get(key)) for key in columns] for row in data]}
+        return [columnar(value) for value in data]
+    return data
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """Compact JSON with lists of objects written as columns and rows; see columnar()."""
+    media_type = 'application/vnd.littlelemon.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return super().render(columnar(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack of the data the JSON renderers write. What MessagePack has no
+    type for (Decimal, dates, lazy strings) goes through DRF's JSON encoder,
+    so values decode to what the JSON response holds. Needs msgpack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.default, use_bin_type=True)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        header = []
+        for row in rows:
+            header += [key for key in row if key not in header]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=header)
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode(self.charset)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Prometheus text exposition of metrics.collect(): cache counters and gauges,
+    plus the per-route request histograms of the profiling middleware.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+    prefix = 'littlelemon'
+    counters = ('hits', 'misses', 'evictions', 'revocations')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if 'detail' in data:
+            return f"# {data['detail']}\n".encode(self.charset)
+        lines = []
+        for section, stats in data.items():
+            if section != 'requests':
+                self.render_stats(lines, section, stats)
+        if 'requests' in data:
+            self.render_requests(lines, data['requests'])
+        return ''.join(line + '\n' for line in lines).encode(self.charset)
+
+    def render_stats(self, lines, section, stats):
+        for name, value in stats.items():
+            if name in self.counters:
+                metric = f'{self.prefix}_{section}_{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+            else:
+                metric = f'{self.prefix}_{section}_{name}'
+                lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {value}')
+
+    def render_requests(self, lines, requests):
+        metric = f'{self.prefix}_profiling_sample_rate'
+        lines += [f'# TYPE {metric} gauge', f"{metric} {requests['sample_rate']}"]
+
+        metric = f'{self.prefix}_request_phase_seconds'
+        lines += [
+            f'# HELP {metric} Time spent per phase of sampled requests; db and serializer overlap.',
+            f'# TYPE {metric} histogram',
+        ]
+        for entry in requests['routes']:
+            for phase, histogram in entry['phases'].items():
+                labels = self.labels(route=entry['route'], method=entry['method'], phase=phase)
+                self.render_histogram(lines, metric, labels, requests['duration_buckets'], histogram)
+
+        metric = f'{self.prefix}_request_db_queries'
+        lines += [f'# HELP {metric} Database queries per sampled request.', f'# TYPE {metric} histogram']
+        for entry in requests['routes']:
+            labels = self.labels(route=entry['route'], method=entry['method'])
+            self.render_histogram(lines, metric, labels, requests['query_buckets'], entry['queries'])
+
+    @staticmethod
+    def render_histogram(lines, metric, labels, bounds, histogram):
+        for bound, count in zip(bounds, histogram['buckets']):
+            lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{metric}_sum{{{labels}}} {histogram["sum"]}')
+        lines.append(f'{metric}_count{{{labels}}} {histogram["count"]}')
+
+    @staticmethod
+    def labels(**values):
+        def escape(value):
+            return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        return ','.join(f'{name}="{escape(value)}"' for name, value in values.items())
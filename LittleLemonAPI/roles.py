@@ -0,0 +1,112 @@
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+MANAGER = 'Manager'
+DELIVERY_CREW = 'Delivery crew'
+
+# invalidate() and invalidate_all() only reach the workers that share the
+# cache. With a process-local backend (LocMemCache) the other workers would
+# keep a demoted user's roles for TIMEOUT seconds, so entries there live
+# LOCAL_TIMEOUT seconds instead; point ALIAS at a cache shared by all workers
+# (Redis, Memcached) to keep them for TIMEOUT.
+ROLE_CACHE_DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_TIMEOUT': 5,
+    'KEY_PREFIX': 'roles',
+}
+
+# Per-request memo, stored on the user instance the authentication class built
+# for this request.
+ROLES_ATTR = '_littlelemon_roles'
+
+
+def _config():
+    return {**ROLE_CACHE_DEFAULTS, **getattr(settings, 'ROLE_CACHE', {})}
+
+
+def _backend():
+    return caches[_config()['ALIAS']]
+
+
+def _timeout():
+    config = _config()
+    if isinstance(_backend(), LocMemCache):
+        return min(config['TIMEOUT'], config['LOCAL_TIMEOUT'])
+    return config['TIMEOUT']
+
+
+def _generation():
+    # Bumped whenever a change can affect users we cannot enumerate cheaply,
+    # e.g. a group being renamed or cleared.
+    key = f"{_config()['KEY_PREFIX']}:generation"
+    backend = _backend()
+    generation = backend.get(key)
+    if generation is None:
+        backend.add(key, 1, None)
+        generation = backend.get(key)
+    return generation
+
+
+def _key(user_id):
+    return f"{_config()['KEY_PREFIX']}:{_generation()}:{user_id}"
+
+
+def get_roles(user):
+    """Return the set of group names of ``user``, loading it at most once per request."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, ROLES_ATTR, None)
+    if roles is None:
+        key = _key(user.pk)
+        roles = _backend().get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            _backend().set(key, roles, _timeout())
+        setattr(user, ROLES_ATTR, roles)
+    return roles
+
+
+def is_manager(user):
+    return MANAGER in get_roles(user)
+
+
+def is_delivery_crew(user):
+    return DELIVERY_CREW in get_roles(user)
+
+
+def forget_request_roles(user):
+    """Drop the per-request memo so the next lookup goes back to the cache."""
+    user.__dict__.pop(ROLES_ATTR, None)
+
+
+def group_id(name):
+    """
+    The pk of group ``name``, created if missing. Cached under the current
+    generation, which every group save or delete bumps.
+    """
+    def key():
+        return f"{_config()['KEY_PREFIX']}:{_generation()}:group:{quote(name)}"
+    pk = _backend().get(key())
+    if pk is None:
+        pk = Group.objects.get_or_create(name=name)[0].pk
+        # Creating the group bumped the generation
+        _backend().set(key(), pk, _timeout())
+    return pk
+
+
+def invalidate(*user_ids):
+    if user_ids:
+        _backend().delete_many([_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all():
+    key = f"{_config()['KEY_PREFIX']}:generation"
+    try:
+        _backend().incr(key)
+    except ValueError:
+        _generation()
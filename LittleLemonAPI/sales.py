@@ -0,0 +1,174 @@
+"""
+Daily sales rollups.
+
+DailySales, DailyMenuItemSales and DailyCategorySales hold the totals of the
+orders of each day. Checkout adds each new order with record_order() inside
+its transaction, deleting an order takes it out again, and rebuild()
+recomputes a date range from the Order and OrderItem rows. Orders written
+any other way (admin, fixtures, bulk loads) need a rebuild of their days.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import DailyCategorySales, DailyMenuItemSales, DailySales, Order, OrderItem
+
+
+def _counters(model, key_columns):
+    return [
+        field.column for field in model._meta.concrete_fields
+        if not field.primary_key and field.column not in key_columns
+    ]
+
+
+def _add(model, key_columns, rows):
+    """
+    Add ``rows`` (tuples of the key columns followed by the counters) to the
+    counters of ``model`` in one ``INSERT ... ON CONFLICT DO UPDATE``.
+    """
+    if not rows:
+        return
+    counters = _counters(model, key_columns)
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [*key_columns, *counters]
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(rows))
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in counters)
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES {placeholders} '
+        f'ON CONFLICT ({", ".join(key_columns)}) DO UPDATE SET {updates}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+def _subtract(model, key_columns, rows):
+    """
+    Take ``rows`` off the counters of ``model``, never below zero (an order
+    created outside checkout was never added), and drop the rows left empty.
+    """
+    if not rows:
+        return
+    counters = _counters(model, key_columns)
+    table = connection.ops.quote_name(model._meta.db_table)
+    updates = ', '.join(f'{column} = MAX({column} - %s, 0)' for column in counters)
+    where = ' AND '.join(f'{column} = %s' for column in key_columns)
+    keys = len(key_columns)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET {updates} WHERE {where}',
+            [(*row[keys:], *row[:keys]) for row in rows],
+        )
+        cursor.execute(f'DELETE FROM {table} WHERE {counters[0]} = 0 AND {key_columns[0]} = %s', [rows[0][0]])
+
+
+def record_order(order, order_items, sign=1):
+    """
+    Add ``order`` and its ``order_items`` (with their menu items loaded) to the
+    rollups of the order's date, or take them out with ``sign=-1``.
+    """
+    day = connection.ops.adapt_datefield_value(Order._meta.get_field('date').to_python(order.date))
+    items = 0
+    menuitems = defaultdict(lambda: [0, 0])
+    categories = defaultdict(lambda: [0, 0])
+    for item in order_items:
+        items += item.quantity
+        for totals in (menuitems[item.menuitem_id], categories[item.menuitem.category_id]):
+            totals[0] += item.quantity
+            totals[1] += item.price
+
+    # Counters in model field order: orders, items, revenue / quantity, revenue
+    write = _add if sign > 0 else _subtract
+    write(DailySales, ['date'], [(day, 1, items, order.total)])
+    write(DailyMenuItemSales, ['date', 'menuitem_id'], [
+        (day, menuitem_id, quantity, revenue) for menuitem_id, (quantity, revenue) in menuitems.items()
+    ])
+    write(DailyCategorySales, ['date', 'category_id'], [
+        (day, category_id, quantity, revenue) for category_id, (quantity, revenue) in categories.items()
+    ])
+
+
+def rebuild(date_from=None, date_to=None):
+    """
+    Recompute the rollups of the days between ``date_from`` and ``date_to``
+    (inclusive, either may be None) from the orders with three GROUP BY
+    queries. Returns the number of days written.
+    """
+    day_filters, item_filters = {}, {}
+    if date_from is not None:
+        day_filters['date__gte'] = item_filters['order__date__gte'] = date_from
+    if date_to is not None:
+        day_filters['date__lte'] = item_filters['order__date__lte'] = date_to
+
+    order_items = OrderItem.objects.filter(**item_filters)
+    items_per_day = dict(order_items.values_list('order__date').annotate(Sum('quantity')).order_by())
+    days = [
+        DailySales(date=row['date'], orders=row['orders'], items=items_per_day.get(row['date']) or 0,
+                   revenue=row['revenue'])
+        for row in Order.objects.filter(**day_filters).values('date')
+        .annotate(orders=Count('id'), revenue=Sum('total')).order_by()
+    ]
+    menuitems = [
+        DailyMenuItemSales(date=row['order__date'], menuitem_id=row['menuitem'],
+                           quantity=row['quantity'], revenue=row['revenue'])
+        for row in order_items.values('order__date', 'menuitem')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price')).order_by()
+    ]
+    categories = [
+        DailyCategorySales(date=row['order__date'], category_id=row['menuitem__category'],
+                           quantity=row['quantity'], revenue=row['revenue'])
+        for row in order_items.values('order__date', 'menuitem__category')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('price')).order_by()
+    ]
+
+    with transaction.atomic():
+        for model in (DailySales, DailyMenuItemSales, DailyCategorySales):
+            model.objects.filter(**day_filters).delete()
+        DailySales.objects.bulk_create(days, batch_size=500)
+        DailyMenuItemSales.objects.bulk_create(menuitems, batch_size=500)
+        DailyCategorySales.objects.bulk_create(categories, batch_size=500)
+    return len(days)
+
+
+def report(date_from=None, date_to=None, top=10):
+    """
+    Totals, per-day rows and the best selling menu items and categories of a
+    date range, read from the rollups in three queries.
+    """
+    filters = {}
+    if date_from is not None:
+        filters['date__gte'] = date_from
+    if date_to is not None:
+        filters['date__lte'] = date_to
+
+    days = list(DailySales.objects.filter(**filters).order_by('date'))
+    menuitems = (
+        DailyMenuItemSales.objects.filter(**filters)
+        .values('menuitem', 'menuitem__title')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'menuitem')[:top]
+    )
+    categories = (
+        DailyCategorySales.objects.filter(**filters)
+        .values('category', 'category__title')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'category')
+    )
+    return {
+        'totals': {
+            'orders': sum(day.orders for day in days),
+            'items': sum(day.items for day in days),
+            'revenue': sum((day.revenue for day in days), 0),
+        },
+        'days': days,
+        'menu_items': [
+            {'menuitem': row['menuitem'], 'title': row['menuitem__title'],
+             'quantity': row['quantity'], 'revenue': row['revenue']}
+            for row in menuitems
+        ],
+        'categories': [
+            {'category': row['category'], 'title': row['category__title'],
+             'quantity': row['quantity'], 'revenue': row['revenue']}
+            for row in categories
+        ],
+    }
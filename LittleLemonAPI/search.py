@@ -0,0 +1,87 @@
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Value
+
+from .models import MenuItemSearchEntry
+
+FTS_TABLE = MenuItemSearchEntry._meta.db_table
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_INSERT_SQL = (
+    f'INSERT INTO "{FTS_TABLE}" (rowid, title, category_title) '
+    'SELECT m.id, m.title, c.title FROM "LittleLemonAPI_menuitem" m '
+    'JOIN "LittleLemonAPI_category" c ON c.id = m.category_id'
+)
+
+
+def fts_available():
+    """
+    True when the default database is SQLite and the FTS5 index table, which
+    migration 0002 creates with its bm25() weights, exists.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    ready = getattr(connection, '_littlelemon_fts_ready', None)
+    if ready is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            ready = cursor.fetchone() is not None
+        connection._littlelemon_fts_ready = ready
+    return ready
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+        cursor.execute(_INSERT_SQL)
+
+
+def index_menu_items(menuitem_ids):
+    """(Re)index the given menu items; the FTS rowid is the menu item id."""
+    if not menuitem_ids or not fts_available():
+        return
+    placeholders = ', '.join(['%s'] * len(menuitem_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid IN ({placeholders})', list(menuitem_ids))
+        cursor.execute(f'{_INSERT_SQL} WHERE m.id IN ({placeholders})', list(menuitem_ids))
+
+
+def index_category(category_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM "{FTS_TABLE}" WHERE rowid IN '
+            '(SELECT id FROM "LittleLemonAPI_menuitem" WHERE category_id = %s)',
+            [category_id],
+        )
+        cursor.execute(f'{_INSERT_SQL} WHERE m.category_id = %s', [category_id])
+
+
+def remove_menu_item(menuitem_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [menuitem_id])
+
+
+def match_expression(text):
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix.
+    Words are quoted so user input can never be parsed as FTS5 syntax.
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(text))
+
+
+def search_menu_items(queryset, text):
+    """
+    Filter ``queryset`` to items matching ``text`` and annotate ``search_rank``
+    (lower is better). Falls back to ``title__icontains`` without FTS5.
+    """
+    expression = match_expression(text)
+    if not expression or not fts_available():
+        return queryset.filter(title__icontains=text).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    # Joins the index on rowid = menu item id, so FTS5 drives the query
+    return queryset.filter(search_entry__document__match=expression).annotate(search_rank=F('search_entry__rank'))
@@ -1,9 +1,14 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, MenuItem, Cart, Order, OrderItem
+from .models import Category, MenuItem, Cart, Order, OrderItem, FeaturedItem, DailySales
 import bleach
 from django.contrib.auth import get_user_model 
+from django.db import transaction
 from django.db.models import Q
+from .roles import is_manager, is_delivery_crew
+from . import events
+from .cart import MAX_QUANTITY, check_cart_lines, upsert_cart_lines
+from .profiling import ProfiledListSerializer, ProfiledSerializerMixin
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,13 +16,30 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email']
         
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        fields = ['id', 'slug', 'title']
+        list_serializer_class = ProfiledListSerializer
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class FeaturedField(serializers.BooleanField):
+    # True for the item in the FeaturedItem slot. The slot is read once per
+    # serializer tree, or taken from context['featured_id'] when the caller
+    # already has it.
+    def get_attribute(self, instance):
+        return instance.pk == self.featured_id()
+
+    def featured_id(self):
+        root = self.root
+        if 'featured_id' in root.context:
+            return root.context['featured_id']
+        if not hasattr(root, '_featured_id'):
+            root._featured_id = FeaturedItem.current_id()
+        return root._featured_id
+
+class MenuItemSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    featured = FeaturedField()
     category_id = serializers.IntegerField(write_only=True)
    
     def validate(self, attrs): 
@@ -32,26 +54,39 @@ class MenuItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = MenuItem
         fields = ['id', 'title', 'price', 'featured', 'category', 'category_id']
+        list_serializer_class = ProfiledListSerializer
+    def create(self, validated_data):
+        # The FeaturedItem slot says which item is featured; the legacy
+        # MenuItem.featured column is left False
+        featured = validated_data.pop('featured', False)
+        instance = super().create({**validated_data, 'featured': False})
+        if featured:
+            FeaturedItem.feature(instance)
+        return instance
+
     def update(self, instance, validated_data):
         featured = validated_data.get('featured')
         instance.title = validated_data.get('title', instance.title)
         instance.price = validated_data.get('price', instance.price)
         instance.category_id = validated_data.get('category_id', instance.category_id)
-        if featured == 1 and instance.featured == 0:
-            instance.featured = featured
-            MenuItem.objects.exclude(id=instance.id).update(featured=0) 
+        if featured == 1:
+            # Moving the slot is a single-row write, other items are left alone
+            FeaturedItem.feature(instance)
 
         
         instance.save()
 
         return instance 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     unit_price = serializers.ReadOnlyField(source='menuitem.price')
     price = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
         fields = ['id', 'menuitem', 'quantity', 'unit_price', 'price']
+        list_serializer_class = ProfiledListSerializer
+        # The sales rollups count quantities in PositiveIntegerFields
+        extra_kwargs = {'quantity': {'min_value': 1, 'max_value': MAX_QUANTITY}}
 
     def get_price(self, obj):
         return obj.menuitem.price * obj.quantity
@@ -60,11 +95,62 @@ class CartSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         menuitem = validated_data['menuitem']
         quantity = validated_data['quantity']
-        unit_price = menuitem.price
-        price = unit_price * quantity
 
-        cart = Cart.objects.create(user=user, menuitem=menuitem, quantity=quantity, unit_price=unit_price, price=price)
+        # Adding an item that is already in the cart increases its quantity
+        with transaction.atomic():
+            upsert_cart_lines(user, [(menuitem, quantity)])
+            cart = Cart.objects.select_related('menuitem').get(user=user, menuitem=menuitem)
         return cart
+
+class CartLineSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True, allow_empty=False, max_length=100)
+    mode = serializers.ChoiceField(choices=['add', 'set'], default='add')
+
+    def validate(self, attrs):
+        # Merge repeated menu items, then resolve them all in one query
+        quantities = {}
+        for line in attrs['items']:
+            if attrs['mode'] == 'add':
+                quantities[line['menuitem']] = quantities.get(line['menuitem'], 0) + line['quantity']
+            else:
+                quantities[line['menuitem']] = line['quantity']
+        menuitems = MenuItem.objects.in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(menuitems))
+        if missing:
+            raise serializers.ValidationError({'items': f'Unknown menu items: {missing}'})
+        attrs['lines'] = [(menuitems[pk], quantity) for pk, quantity in quantities.items()]
+        # The merged lines alone; the upsert checks them again against the cart
+        check_cart_lines(attrs['lines'])
+        return attrs
+
+    def save(self):
+        user = self.context['request'].user
+        upsert_cart_lines(user, self.validated_data['lines'], mode=self.validated_data['mode'])
+class UserIdentifierField(serializers.Field):
+    # A user id or a username
+    default_error_messages = {
+        'invalid': 'Expected a user id or a username.',
+        'out_of_range': 'User ids are 64-bit integers.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)) or data == '':
+            self.fail('invalid')
+        # What SQLite can bind
+        if isinstance(data, int) and not -2 ** 63 <= data < 2 ** 63:
+            self.fail('out_of_range')
+        return data
+
+    def to_representation(self, value):
+        return value
+
+class GroupMembersBulkSerializer(serializers.Serializer):
+    users = serializers.ListField(child=UserIdentifierField(), allow_empty=False, max_length=500)
+
 class OrderItemSerializer(serializers.ModelSerializer):
     menuitem = MenuItemSerializer()
 
@@ -73,7 +159,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'menuitem', 'quantity', 'unit_price', 'price']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, read_only=True) 
     status = serializers.BooleanField()
 
@@ -81,6 +167,7 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'user', 'delivery_crew', 'status', 'total', 'date', 'order_items']
         read_only_fields = ['user']
+        list_serializer_class = ProfiledListSerializer
     def get_delivery_crew(self, obj):
         delivery_crew = obj.delivery_crew
         if delivery_crew:
@@ -90,7 +177,7 @@ class OrderSerializer(serializers.ModelSerializer):
     def validate_delivery_crew(self, value):
         user = self.context['request'].user
 
-        if not user.groups.filter(name='Manager').exists() and value is not None:
+        if not is_manager(user) and value is not None:
             raise serializers.ValidationError('You do not have permission to assign a delivery crew.')
 
         return value
@@ -99,9 +186,9 @@ class OrderSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         instance = getattr(self, 'instance', None)
         manager_role , delivery_crew_role , customer_role = False, False, False
-        if user.groups.filter(name='Manager').exists():
+        if is_manager(user):
             manager_role  = True
-        elif user.groups.filter(name='Delivery crew').exists():
+        elif is_delivery_crew(user):
             delivery_crew_role = True
         else:
             customer_role = True
@@ -110,7 +197,7 @@ class OrderSerializer(serializers.ModelSerializer):
         
         if delivery_crew_role:
             # Check if the user is the same as the order's delivery_crew 
-            if instance.delivery_crew == user:
+            if instance.delivery_crew_id == user.pk:
                 #if  value != True:
                 #    raise serializers.ValidationError('You do not have permission to update the status to 0')
                 #else:
@@ -127,6 +214,7 @@ class OrderSerializer(serializers.ModelSerializer):
         delivery_crew = validated_data.get('delivery_crew', instance.delivery_crew)
         status = validated_data.get('status', instance.status)
         user = self.context['request'].user
+        previous = (instance.delivery_crew_id, instance.status)
 
         # Check if the delivery_crew value is an instance of User model
         if isinstance(delivery_crew, User):
@@ -140,5 +228,37 @@ class OrderSerializer(serializers.ModelSerializer):
 
         instance.status = status
         instance.save()
+        if (instance.delivery_crew_id, instance.status) != previous:
+            events.order_changed('order.updated', [instance], previous_crew_id=previous[0])
+
+        return instance 
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ['date', 'orders', 'items', 'revenue']
+
+class SalesTotalsSerializer(serializers.Serializer):
+    orders = serializers.IntegerField()
+    items = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class MenuItemSalesSerializer(serializers.Serializer):
+    menuitem = serializers.IntegerField()
+    title = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class CategorySalesSerializer(serializers.Serializer):
+    category = serializers.IntegerField()
+    title = serializers.CharField()
+    quantity = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
 
-        return instance 
\ No newline at end of file
+class SalesReportSerializer(ProfiledSerializerMixin, serializers.Serializer):
+    # Read-only shape of sales.report()
+    totals = SalesTotalsSerializer()
+    days = DailySalesSerializer(many=True)
+    menu_items = MenuItemSalesSerializer(many=True)
+    categories = CategorySalesSerializer(many=True)
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import roles, search
+from .authentication import token_cache
+from .cache import catalog_cache
+from .models import Category, MenuItem, FeaturedItem, Order
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=FeaturedItem)
+@receiver(post_delete, sender=FeaturedItem)
+def bump_catalog_version(sender, **kwargs):
+    catalog_cache.bump_on_commit()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        roles.invalidate(instance.pk)
+        roles.forget_request_roles(instance)
+    elif pk_set:
+        # group.user_set.add/remove(...)
+        roles.invalidate(*pk_set)
+    else:
+        # group.user_set.clear() does not tell us which users were affected
+        roles.invalidate_all()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_roles_on_user_change(sender, instance, **kwargs):
+    roles.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, **kwargs):
+    roles.invalidate_all()
+
+
+@receiver(post_delete, sender=Token)
+def revoke_cached_token(sender, instance, **kwargs):
+    # Covers auth/token/logout/, which deletes the user's tokens
+    token_cache.revoke(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revoke_cached_user_tokens(sender, instance, **kwargs):
+    # The cached user may have been deactivated or changed
+    token_cache.revoke_user(instance.pk)
+
+
+@receiver(pre_delete, sender=MenuItem)
+def touch_orders_of_menu_item(sender, instance, **kwargs):
+    # Deleting the item cascades to order items, which changes these orders
+    Order.objects.filter(order_items__menuitem=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=MenuItem)
+def index_menu_item(sender, instance, **kwargs):
+    search.index_menu_items([instance.pk])
+
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_menu_item(sender, instance, **kwargs):
+    search.remove_menu_item(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, **kwargs):
+    if not created:
+        search.index_category(instance.pk)
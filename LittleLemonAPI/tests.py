@@ -1,9 +1,72 @@
-from django.contrib.auth.models import User
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import gzip
+import io
+import json
+import re
+from decimal import Decimal
+from unittest import mock, skipIf, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.db import close_old_connections, connection, transaction
+from django.db.models import QuerySet
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
-from rest_framework import status
-from .models import MenuItem, Category
-from .serializers import MenuItemSerializer
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from .models import MenuItem, Category, Order, OrderItem, Cart, FeaturedItem, DailySales, DailyMenuItemSales, DailyCategorySales
+from .serializers import MenuItemSerializer, OrderSerializer
+from .renderers import FastJSONRenderer, msgpack
+from .compression import negotiate, zstandard
+from .cache import catalog_cache
+from .cart import upsert_cart_lines
+from .authentication import TokenCache, token_cache
+from .throttles import TokenBucketStore, bucket_store
+from .profiling import histograms
+from . import events, roles
+
+# Throttling is switched on only by the tests that exercise it; the buckets live
+# in process memory and would otherwise fill up across the whole run.
+_no_throttling = override_settings(THROTTLING={'ENABLED': False})
+
+
+def setUpModule():
+    _no_throttling.enable()
+
+
+def tearDownModule():
+    _no_throttling.disable()
+
+
+class QueryBudgetMixin:
+    """
+    assertQueryBudget(url, grow) requests ``url`` after each call to ``grow(n)``
+    and fails if the number of queries changes as the result set grows.
+    """
+    def assertQueryBudget(self, url, grow, sizes=(1, 4, 8)):
+        # Warm per-user caches (roles) so only the steady state is compared
+        self.client.get(url)
+        counts = []
+        for size in sizes:
+            grow(size)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'{url} query count grows with result size: {dict(zip(sizes, counts))}',
+        )
+
 
 class MenuItemListCreateAPIViewTest(TestCase):
     def setUp(self):
@@ -170,3 +233,1820 @@ class SingleMenuItemRetrieveUpdateDestroyAPIViewTest(TestCase):
         print(response.request.get('PATH_INFO'))
         
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.category = Category.objects.create(slug='category-slug', title='Category Title')
+        self.menu_item = MenuItem.objects.create(title='Test Item', price=9.99, featured=False, category=self.category)
+        catalog_cache.backend.clear()
+        catalog_cache.reset_stats()
+        self.client.login(username='test_manager', password='admin@10!')
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get('/api/menu-items/')
+        with self.assertNumQueries(3):
+            # Session and user lookups and the ETag's page query, the body
+            # comes from the cache
+            second = self.client.get('/api/menu-items/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(catalog_cache.stats()['hits'], 1)
+        self.assertEqual(catalog_cache.stats()['misses'], 1)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.client.get('/api/menu-items/')
+        self.client.get('/api/menu-items/', {'search': 'Test'})
+        self.assertEqual(catalog_cache.stats()['misses'], 2)
+
+    def test_update_bumps_version(self):
+        self.client.get('/api/menu-items/')
+        self.client.patch(f'/api/menu-items/{self.menu_item.pk}/', {'title': 'Renamed Item'})
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed Item')
+        self.assertEqual(catalog_cache.stats()['hits'], 0)
+
+    def test_process_local_cache_expires_quickly(self):
+        # Other workers can't be told of a version bump through a LocMemCache
+        with mock.patch.object(catalog_cache.backend, 'set', wraps=catalog_cache.backend.set) as cache_set:
+            self.client.get('/api/menu-items/')
+        self.assertEqual(cache_set.call_args.args[2], settings.CATALOG_CACHE['LOCAL_TIMEOUT'])
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/catalog-test'}
+        with override_settings(CACHES={**settings.CACHES, 'shared': shared},
+                               CATALOG_CACHE={**settings.CATALOG_CACHE, 'ALIAS': 'shared'}):
+            self.assertEqual(catalog_cache.timeout, settings.CATALOG_CACHE['TIMEOUT'])
+
+    def test_category_create_bumps_version(self):
+        self.client.get('/api/categories/')
+        self.client.post('/api/categories/', {'slug': 'desserts', 'title': 'Desserts'})
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.data['count'], 2)
+
+
+class RoleResolverTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.deliverycrew_user = User.objects.create_user(username='test_deliverycrew', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.deliverycrew_user.groups.create(name='Delivery crew')
+        self.order = Order.objects.create(user=self.customer_user, total=10)
+
+    def group_queries(self, queries):
+        return [q for q in queries if 'auth_user_groups' in q['sql']]
+
+    def test_order_patch_resolves_roles_once(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(
+                f'/api/orders/{self.order.pk}/',
+                {'delivery_crew': self.deliverycrew_user.pk, 'status': True},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.group_queries(ctx.captured_queries)), 1)
+
+    def test_roles_are_cached_across_requests(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        self.client.get('/api/orders/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/orders/')
+        self.assertEqual(self.group_queries(ctx.captured_queries), [])
+
+    def test_membership_change_invalidates_cache(self):
+        self.assertFalse(roles.is_delivery_crew(User.objects.get(pk=self.customer_user.pk)))
+        self.client.login(username='test_manager', password='admin@10!')
+        response = self.client.post('/api/groups/delivery-crew/users/', {'username': 'test_customer'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(roles.is_delivery_crew(User.objects.get(pk=self.customer_user.pk)))
+
+        response = self.client.delete(f'/api/groups/delivery-crew/users/{self.customer_user.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(roles.is_delivery_crew(User.objects.get(pk=self.customer_user.pk)))
+
+    def test_process_local_cache_expires_quickly(self):
+        # Other workers can't be told of a change through a LocMemCache
+        roles.invalidate(self.manager_user.pk)
+        with mock.patch.object(roles._backend(), 'set', wraps=roles._backend().set) as cache_set:
+            roles.is_manager(User.objects.get(pk=self.manager_user.pk))
+        self.assertEqual(cache_set.call_args.args[2], roles.ROLE_CACHE_DEFAULTS['LOCAL_TIMEOUT'])
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/roles-test'}
+        with override_settings(CACHES={**settings.CACHES, 'shared': shared},
+                               ROLE_CACHE={**settings.ROLE_CACHE, 'ALIAS': 'shared'}):
+            self.assertEqual(roles._timeout(), settings.ROLE_CACHE['TIMEOUT'])
+
+    def test_reverse_group_change_invalidates_cache(self):
+        self.assertTrue(roles.is_manager(User.objects.get(pk=self.manager_user.pk)))
+        Group.objects.get(name='Manager').user_set.remove(self.manager_user)
+        self.assertFalse(roles.is_manager(User.objects.get(pk=self.manager_user.pk)))
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.category = Category.objects.create(slug='category-slug', title='Category Title')
+        self.menu_items = [
+            MenuItem.objects.create(title=f'Item {i}', price=2, featured=False, category=self.category)
+            for i in range(20)
+        ]
+        self.client.login(username='test_customer', password='admin@10!')
+
+    def fill_cart(self, size):
+        for menu_item in self.menu_items[:size]:
+            Cart.objects.create(user=self.customer_user, menuitem=menu_item, quantity=3, unit_price=2, price=6)
+
+    def checkout_queries(self, size):
+        self.fill_cart(size)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/', {'date': '2023-07-01'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(ctx.captured_queries), response
+
+    def test_checkout_creates_order_and_empties_cart(self):
+        _, response = self.checkout_queries(3)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total, 18)
+        self.assertEqual(str(order.date), '2023-07-01')
+        self.assertEqual(order.order_items.count(), 3)
+        self.assertEqual(len(response.data['order_items']), 3)
+        self.assertFalse(Cart.objects.filter(user=self.customer_user).exists())
+
+    def test_checkout_query_count_is_independent_of_cart_size(self):
+        small, _ = self.checkout_queries(1)
+        large, _ = self.checkout_queries(20)
+        self.assertEqual(small, large)
+
+    def test_checkout_with_empty_cart(self):
+        response = self.client.post('/api/orders/', {'date': '2023-07-01'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Order.objects.exists())
+
+
+class ListQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.deliverycrew_user = User.objects.create_user(username='test_deliverycrew', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.deliverycrew_user.groups.create(name='Delivery crew')
+        self.created = 0
+
+    def add_orders(self, size):
+        # Every order gets its own category, menu items and delivery crew member
+        # so nothing is shared between rows.
+        for _ in range(size):
+            self.created += 1
+            category = Category.objects.create(slug=f'c{self.created}', title=f'Category {self.created}')
+            order = Order.objects.create(
+                user=self.customer_user, delivery_crew=self.deliverycrew_user, total=4)
+            for i in range(2):
+                menu_item = MenuItem.objects.create(
+                    title=f'Item {self.created}-{i}', price=2, featured=False, category=category)
+                OrderItem.objects.create(order=order, menuitem=menu_item, quantity=1, unit_price=2, price=2)
+
+    def add_cart_items(self, size):
+        for _ in range(size):
+            self.created += 1
+            category = Category.objects.create(slug=f'c{self.created}', title=f'Category {self.created}')
+            menu_item = MenuItem.objects.create(
+                title=f'Item {self.created}', price=2, featured=False, category=category)
+            Cart.objects.create(user=self.customer_user, menuitem=menu_item, quantity=1, unit_price=2, price=2)
+
+    def test_orders_as_manager(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        self.assertQueryBudget('/api/orders/', self.add_orders)
+
+    def test_orders_as_deliverycrew(self):
+        self.client.login(username='test_deliverycrew', password='admin@10!')
+        self.assertQueryBudget('/api/orders/', self.add_orders)
+
+    def test_orders_as_customer(self):
+        self.client.login(username='test_customer', password='admin@10!')
+        self.assertQueryBudget('/api/orders/', self.add_orders)
+
+    def test_menu_items(self):
+        self.client.login(username='test_customer', password='admin@10!')
+        self.assertQueryBudget('/api/menu-items/', self.add_orders)
+
+    def test_categories(self):
+        self.client.login(username='test_customer', password='admin@10!')
+        self.assertQueryBudget('/api/categories/', self.add_orders)
+
+    def test_cart(self):
+        self.client.login(username='test_customer', password='admin@10!')
+        self.assertQueryBudget('/api/cart/menu-items/', self.add_cart_items)
+
+    def add_users(self, size):
+        for _ in range(size):
+            self.created += 1
+            User.objects.create(username=f'user_{self.created}')
+
+    def test_users(self):
+        admin = User.objects.create_superuser(username='test_admin', password='admin@10!')
+        self.client.force_authenticate(admin)
+        self.assertQueryBudget('/api/users/?perpage=100', self.add_users)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.category = Category.objects.create(slug='category-slug', title='Category Title')
+        # Duplicate prices check the id tie-breaker
+        for i, price in enumerate([5, 3, 5, 1, 4, 5, 2]):
+            MenuItem.objects.create(title=f'Item {i}', price=price, featured=False, category=self.category)
+        self.client.login(username='test_customer', password='admin@10!')
+
+    def walk(self, url, params):
+        ids, response = [], self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_walk_by_price(self):
+        ids = self.walk('/api/menu-items/', {'ordering': 'price', 'perpage': 2})
+        expected = list(MenuItem.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_walk_by_descending_title(self):
+        ids = self.walk('/api/menu-items/', {'ordering': '-title', 'perpage': 3})
+        expected = list(MenuItem.objects.order_by('-title', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        first = self.client.get('/api/menu-items/', {'ordering': 'price', 'perpage': 2})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_deep_page_costs_the_same_and_skips_count(self):
+        catalog_cache.backend.clear()
+        self.client.get('/api/menu-items/', {'perpage': 1})
+        with CaptureQueriesContext(connection) as first:
+            response = self.client.get('/api/menu-items/', {'perpage': 1, 'ordering': 'price'})
+        for _ in range(5):
+            response = self.client.get(response.data['next'])
+        catalog_cache.backend.clear()
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(response.data['next'])
+        self.assertEqual(len(first.captured_queries), len(deep.captured_queries))
+        self.assertFalse(any('COUNT(' in q['sql'] for q in deep.captured_queries))
+
+    def test_page_size_is_capped(self):
+        for i in range(120):
+            MenuItem.objects.create(title=f'Extra {i}', price=9, featured=False, category=self.category)
+        response = self.client.get('/api/menu-items/', {'perpage': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/menu-items/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        def cursor(ordering, key):
+            payload = json.dumps([ordering, key, 0]).encode()
+            return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+        Order.objects.create(user=self.customer_user, total=1)
+        self.client.force_authenticate(User.objects.create_superuser(username='admin', password='admin@10!'))
+        cases = [
+            ('/api/menu-items/', 'price', ['abc', 1]),
+            ('/api/menu-items/', 'price', [[5], 1]),
+            ('/api/menu-items/', 'title', ['Item 1', {'id': 1}]),
+            ('/api/menu-items/', 'id', [None]),
+            ('/api/menu-items/', 'id', [10 ** 20]),
+            ('/api/orders/', 'date', ['2023-13-45', 1]),
+            ('/api/orders/', 'date', [20230701, 1]),
+            ('/api/users/', 'id', ['abc']),
+            ('/api/users/', 'username', [['admin']]),
+        ]
+        for url, ordering, key in cases:
+            response = self.client.get(url, {'ordering': ordering, 'cursor': cursor(ordering, key)})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, (url, key))
+        # An untouched one still works, whatever the value types
+        response = self.client.get('/api/menu-items/', {'ordering': 'price', 'cursor': cursor('price', ['3.00', 1])})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_orders_are_paginated_by_date(self):
+        for day in [3, 1, 2, 1]:
+            Order.objects.create(user=self.customer_user, total=1, date=f'2023-07-0{day}')
+        ids = self.walk('/api/orders/', {'ordering': '-date', 'perpage': 1})
+        expected = list(Order.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+
+class OrderExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        category = Category.objects.create(slug='category-slug', title='Category Title')
+        menu_item = MenuItem.objects.create(title='Test Item', price=2, featured=False, category=category)
+        for day in range(1, 6):
+            order = Order.objects.create(user=self.customer_user, total=4, date=f'2023-07-0{day}', status=day % 2)
+            OrderItem.objects.create(order=order, menuitem=menu_item, quantity=2, unit_price=2, price=4)
+
+    def export(self, params):
+        response = self.client.get('/api/orders/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_with_filters(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        response, body = self.export({'date_from': '2023-07-02', 'date_to': '2023-07-04', 'status': '1'})
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['date'] for row in rows], ['2023-07-03'])
+        self.assertEqual(rows[0]['order_items'][0]['price'], '4.00')
+
+    def test_csv(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        response, body = self.export({'format': 'csv'})
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['quantity'], '2')
+
+    def test_orders_are_fetched_in_chunks(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        self.client.get('/api/orders/')
+        with mock.patch('LittleLemonAPI.export.EXPORT_CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as ctx:
+                self.export({})
+        item_queries = [q for q in ctx.captured_queries if 'LittleLemonAPI_orderitem' in q['sql']]
+        self.assertEqual(len(item_queries), 3)
+
+    def test_invalid_filter(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        response = self.client.get('/api/orders/export/', {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_customer_cannot_export(self):
+        self.client.login(username='test_customer', password='admin@10!')
+        response = self.client.get('/api/orders/export/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MenuItemSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.salads = Category.objects.create(slug='salads', title='Lemon Salads')
+        self.chicken = MenuItem.objects.create(title='Lemon Chicken', price=12, featured=False, category=self.mains)
+        self.pasta = MenuItem.objects.create(title='Pasta', price=10, featured=False, category=self.mains)
+        self.greek = MenuItem.objects.create(title='Greek Salad', price=8, featured=False, category=self.salads)
+        self.client.login(username='test_customer', password='admin@10!')
+
+    def search(self, text, **params):
+        response = self.client.get('/api/menu-items/', {'search': text, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['title'] for row in response.data['results']]
+
+    def test_title_matches_rank_above_category_matches(self):
+        self.assertEqual(self.search('lemon'), ['Lemon Chicken', 'Greek Salad'])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('chick'), ['Lemon Chicken'])
+        self.assertEqual(self.search('gre sal'), ['Greek Salad'])
+
+    def test_fts_syntax_in_input_is_ignored(self):
+        self.assertEqual(self.search('"pasta*" -('), ['Pasta'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.pasta.title = 'Lemon Pasta'
+        self.pasta.save()
+        self.assertIn('Lemon Pasta', self.search('lemon'))
+        self.chicken.delete()
+        self.assertNotIn('Lemon Chicken', self.search('lemon'))
+
+    def test_index_follows_category_rename(self):
+        self.mains.title = 'Chef Specials'
+        self.mains.save()
+        self.assertEqual(self.search('specials', ordering='title'), ['Lemon Chicken', 'Pasta'])
+
+    def test_ranked_results_paginate(self):
+        first = self.client.get('/api/menu-items/', {'search': 'lemon', 'perpage': 1})
+        second = self.client.get(first.data['next'])
+        self.assertEqual(
+            [first.data['results'][0]['title'], second.data['results'][0]['title']],
+            ['Lemon Chicken', 'Greek Salad'],
+        )
+        self.assertIsNone(second.data['next'])
+
+
+class FeaturedItemTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.category = Category.objects.create(slug='category-slug', title='Category Title')
+        self.first = MenuItem.objects.create(title='First', price=1, featured=False, category=self.category)
+        self.second = MenuItem.objects.create(title='Second', price=2, featured=False, category=self.category)
+        self.client.login(username='test_manager', password='admin@10!')
+
+    def featured_titles(self):
+        response = self.client.get('/api/menu-items/')
+        return [row['title'] for row in response.data['results'] if row['featured']]
+
+    def test_switching_featured_item_writes_one_menu_item_row(self):
+        self.client.patch(f'/api/menu-items/{self.first.pk}/', {'featured': True})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(f'/api/menu-items/{self.second.pk}/', {'featured': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['featured'])
+        menuitem_updates = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE "LittleLemonAPI_menuitem"')
+        ]
+        self.assertEqual(len(menuitem_updates), 1)
+        self.assertIn(f'WHERE "LittleLemonAPI_menuitem"."id" = {self.second.pk}', menuitem_updates[0])
+        self.assertEqual(self.featured_titles(), ['Second'])
+        # The slot is the only record of it
+        self.assertFalse(MenuItem.objects.filter(featured=True).exists())
+
+    def test_create_featured_item(self):
+        response = self.client.post('/api/menu-items/', {
+            'title': 'Third', 'price': 3, 'featured': True, 'category_id': self.category.pk})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['featured'])
+        self.assertEqual(FeaturedItem.current_id(), response.data['id'])
+        self.assertEqual(self.featured_titles(), ['Third'])
+        self.assertFalse(MenuItem.objects.get(pk=response.data['id']).featured)
+
+    def test_concurrent_first_feature(self):
+        # Another request inserts the slot right after this one found it empty
+        def racing(method, absent):
+            def lookup(queryset, *args, **kwargs):
+                if queryset.model is FeaturedItem and not raced:
+                    raced.append(True)
+                    FeaturedItem.objects.bulk_create([FeaturedItem(pk=FeaturedItem.GLOBAL, menuitem=self.first)])
+                    return absent()
+                return method(queryset, *args, **kwargs)
+            return lookup
+
+        def does_not_exist():
+            raise FeaturedItem.DoesNotExist
+        raced = []
+        with mock.patch.object(QuerySet, 'exists', racing(QuerySet.exists, lambda: False)), \
+                mock.patch.object(QuerySet, 'get', racing(QuerySet.get, does_not_exist)):
+            FeaturedItem.feature(self.second)
+        self.assertTrue(raced)
+        self.assertEqual(FeaturedItem.current_id(), self.second.pk)
+
+    def test_featured_is_read_once_per_list(self):
+        FeaturedItem.feature(self.first)
+        catalog_cache.backend.clear()
+        self.client.get('/api/menu-items/')
+        catalog_cache.backend.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/menu-items/')
+        # Lookups of the featured item, not the ETag's latest() subquery
+        slot_queries = [q for q in ctx.captured_queries if '"LittleLemonAPI_featureditem"."menuitem_id"' in q['sql']]
+        self.assertEqual(len(slot_queries), 1)
+
+
+class CartBulkTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.category = Category.objects.create(slug='category-slug', title='Category Title')
+        self.menu_items = [
+            MenuItem.objects.create(title=f'Item {i}', price='2.50', featured=False, category=self.category)
+            for i in range(10)
+        ]
+        self.client.login(username='test_customer', password='admin@10!')
+
+    def bulk(self, lines, **extra):
+        items = [{'menuitem': item.pk, 'quantity': quantity} for item, quantity in lines]
+        return self.client.post('/api/cart/menu-items/bulk/', {'items': items, **extra}, format='json')
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.customer_user).values_list('menuitem_id', 'quantity'))
+
+    def test_bulk_add_increases_existing_quantities(self):
+        first, second, third = self.menu_items[:3]
+        self.bulk([(first, 1), (second, 2)])
+        response = self.bulk([(second, 3), (third, 1), (third, 1)])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.quantities(), {first.pk: 1, second.pk: 5, third.pk: 2})
+        second_row = Cart.objects.get(user=self.customer_user, menuitem=second)
+        self.assertEqual(second_row.price, Decimal('12.50'))
+        self.assertEqual(len(response.data), 3)
+
+    def test_bulk_set_replaces_quantities(self):
+        first = self.menu_items[0]
+        self.bulk([(first, 4)])
+        self.bulk([(first, 1)], mode='set')
+        self.assertEqual(self.quantities(), {first.pk: 1})
+
+    def test_unknown_menu_item(self):
+        response = self.client.post(
+            '/api/cart/menu-items/bulk/', {'items': [{'menuitem': 999, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.quantities(), {})
+
+    def test_query_count_is_independent_of_line_count(self):
+        self.client.get('/api/cart/menu-items/')
+        with CaptureQueriesContext(connection) as small:
+            self.bulk([(self.menu_items[0], 1)])
+        with CaptureQueriesContext(connection) as large:
+            self.bulk([(item, 1) for item in self.menu_items])
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_single_add_of_existing_item_increases_quantity(self):
+        item = self.menu_items[0]
+        self.client.post('/api/cart/menu-items/', {'menuitem': item.pk, 'quantity': 1})
+        response = self.client.post('/api/cart/menu-items/', {'menuitem': item.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['quantity'], 3)
+        self.assertEqual(self.quantities(), {item.pk: 3})
+
+    def test_add_past_the_column_bounds_is_rejected(self):
+        item = self.menu_items[0]
+        # 3999 x 2.50 fits a cart line's price, 4000 x 2.50 doesn't
+        self.bulk([(item, 3999)])
+        response = self.client.post('/api/cart/menu-items/', {'menuitem': item.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.bulk([(item, 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.quantities(), {item.pk: 3999})
+
+    def test_bulk_merged_lines_past_the_column_bounds_are_rejected(self):
+        item = self.menu_items[0]
+        response = self.bulk([(item, 32767), (item, 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.quantities(), {})
+
+    def test_bulk_line_count_is_bounded(self):
+        response = self.bulk([(self.menu_items[0], 1)] * 101)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncReadEndpointsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.token = Token.objects.create(user=self.customer_user)
+        categories = [Category.objects.create(slug=f'c{i}', title=f'Category {i}') for i in range(4)]
+        items = [
+            MenuItem.objects.create(title=f'Lemon Item {i}', price=i + 1, featured=False, category=categories[i % 4])
+            for i in range(5)
+        ]
+        FeaturedItem.feature(items[2])
+        Cart.objects.create(user=self.customer_user, menuitem=items[0], quantity=2, unit_price=1, price=2)
+        for day in (1, 2):
+            order = Order.objects.create(user=self.customer_user, total=3, date=f'2023-07-0{day}')
+            OrderItem.objects.create(order=order, menuitem=items[day], quantity=1, unit_price=3, price=3)
+        self.order = order
+
+    def assertSameResponse(self, path, params=None):
+        sync = self.client.get(f'/api/{path}', params)
+        asynchronous = self.client.get(f'/api/async/{path}', params)
+        self.assertEqual(sync.status_code, asynchronous.status_code)
+        self.assertEqual(
+            json.loads(sync.content.decode().replace('/api/', '/api/async/')),
+            json.loads(asynchronous.content),
+        )
+
+    def test_same_json_as_sync_endpoints(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertSameResponse('menu-items/')
+        self.assertSameResponse('menu-items/', {'ordering': '-price', 'perpage': 2})
+        self.assertSameResponse('menu-items/', {'search': 'lemon', 'category_id': 1})
+        self.assertSameResponse('menu-items/3/')
+        self.assertSameResponse('menu-items/999/')
+        self.assertSameResponse('categories/')
+        self.assertSameResponse('categories/', {'page': 2})
+        self.assertSameResponse('cart/menu-items/')
+        self.assertSameResponse('orders/', {'ordering': '-date'})
+        self.assertSameResponse(f'orders/{self.order.pk}/')
+
+    def test_orders_as_manager_with_session(self):
+        self.client.login(username='test_manager', password='admin@10!')
+        self.assertSameResponse('orders/')
+        self.assertSameResponse(f'orders/{self.order.pk}/')
+
+    def test_invalid_cursor(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for path in ('menu-items/', 'orders/'):
+            self.assertSameResponse(path, {'cursor': 'garbage'})
+            response = self.client.get(f'/api/async/{path}', {'cursor': 'garbage'})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+    def test_requires_authentication(self):
+        response = self.client.get('/api/async/menu-items/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION='Token wrong')
+        response = self.client.get('/api/async/orders/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_read_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.post('/api/async/cart/menu-items/', {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.token = Token.objects.create(user=self.manager_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        token_cache.reset_stats()
+
+    def token_queries(self, queries):
+        return [q for q in queries if 'authtoken_token' in q['sql']]
+
+    def test_token_lookup_is_cached(self):
+        self.client.get('/api/orders/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.token_queries(ctx.captured_queries), [])
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_logout_revokes_immediately(self):
+        self.assertEqual(self.client.get('/api/orders/').status_code, status.HTTP_200_OK)
+        response = self.client.post('/auth/token/logout/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/orders/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_delete_and_deactivation_revoke(self):
+        self.client.get('/api/orders/')
+        self.manager_user.is_active = False
+        self.manager_user.save()
+        self.assertEqual(self.client.get('/api/orders/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.manager_user.is_active = True
+        self.manager_user.save()
+        self.client.get('/api/orders/')
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/orders/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_does_not_share_role_memo(self):
+        self.client.get('/api/orders/')
+        Group.objects.get(name='Manager').user_set.remove(self.manager_user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lru_bound_and_ttl(self):
+        now = [0.0]
+        cache = TokenCache(clock=lambda: now[0])
+        users = [User(pk=i) for i in range(3)]
+        with self.settings(TOKEN_CACHE={'MAX_SIZE': 2, 'TTL': 10}):
+            cache.set('a', users[0], None)
+            cache.set('b', users[1], None)
+            cache.get('a')
+            cache.set('c', users[2], None)
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('a'))
+            self.assertEqual(cache.stats()['evictions'], 1)
+            now[0] = 10
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.stats()['size'], 1)
+
+    def test_shared_revocation(self):
+        other_process = TokenCache()
+        with self.settings(TOKEN_CACHE={'REVOCATION_ALIAS': 'default'}):
+            other_process.set('a', self.manager_user, self.token)
+            token_cache.revoke('a')
+            self.assertIsNone(other_process.get('a'))
+
+    def test_user_revocation_reaches_keys_cached_elsewhere(self):
+        other_process = TokenCache()
+        key = self.token.key
+        other_process.set(key, self.manager_user, self.token)
+        # This process never cached the user's token
+        token_cache.revoke_user(self.manager_user.pk)
+        self.assertIsNone(other_process.get(key))
+        other_process.set(key, self.manager_user, self.token)
+        self.assertIsNotNone(other_process.get(key))
+
+    def test_async_lookups_are_counted(self):
+        for _ in range(2):
+            response = self.client.get('/api/async/orders/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/orders/')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['token_cache']['hits'], 1)
+        self.assertEqual(response.data['token_cache']['hit_rate'], 0.5)
+        self.assertIn('hit_rate', response.data['catalog_cache'])
+
+
+class TokenBucketThrottleTest(TestCase):
+    rates = {
+        'anon': '2/min',
+        'customer': '5/min',
+        'manager': '8/min',
+        'endpoint': '100/min',
+        'order-list-create': '2/min',
+        'async-order-list': '2/min',
+    }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        bucket_store.clear()
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': self.rates}
+        throttled = self.settings(THROTTLING={'ENABLED': True}, REST_FRAMEWORK=rest_framework)
+        throttled.enable()
+        self.addCleanup(throttled.disable)
+
+    def statuses(self, url, count):
+        return [self.client.get(url).status_code for _ in range(count)]
+
+    def test_per_user_limit_by_role(self):
+        self.client.force_authenticate(self.customer_user)
+        self.assertEqual(self.statuses('/api/categories/', 6), [200] * 5 + [429])
+        response = self.client.get('/api/categories/')
+        self.assertIn('Retry-After', response)
+
+        self.client.force_authenticate(self.manager_user)
+        self.assertEqual(self.statuses('/api/categories/', 9), [200] * 8 + [429])
+
+    def test_per_endpoint_limit(self):
+        self.client.force_authenticate(self.customer_user)
+        self.assertEqual(self.statuses('/api/orders/', 3), [200, 200, 429])
+        self.assertEqual(self.client.get('/api/categories/').status_code, status.HTTP_200_OK)
+
+    def test_async_endpoints_are_throttled(self):
+        token = Token.objects.create(user=self.customer_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.statuses('/api/async/orders/', 3), [200, 200, 429])
+        self.assertIn('Retry-After', self.client.get('/api/async/orders/'))
+
+    def test_bucket_refills_and_idle_keys_are_evicted(self):
+        now = [0.0]
+        store = TokenBucketStore(clock=lambda: now[0])
+        self.assertEqual(store.consume('a', 2, 1.0), 0)
+        self.assertEqual(store.consume('a', 2, 1.0), 0)
+        self.assertEqual(store.consume('a', 2, 1.0), 1.0)
+        now[0] = 1.0
+        self.assertEqual(store.consume('a', 2, 1.0), 0)
+        now[0] = 3.0
+        # 'a' is full again, so adding another key drops it
+        store.consume('b', 2, 1.0)
+        self.assertEqual(len(store), 1)
+
+    def test_max_keys(self):
+        store = TokenBucketStore(clock=lambda: 0.0)
+        with self.settings(THROTTLING={'MAX_KEYS': 2}):
+            for key in 'abc':
+                store.consume(key, 5, 1.0)
+        self.assertEqual(len(store), 2)
+
+
+class BenchCommandTest(TestCase):
+    def test_every_route_has_a_scenario(self):
+        from .management.commands import bench
+        covered = {scenario.route for scenario in bench.SCENARIOS}
+        self.assertEqual([route for route in bench.routes() if route not in covered], [])
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.client.force_authenticate(self.manager_user)
+        category = Category.objects.create(slug='mains', title='Mains')
+        menuitem = MenuItem.objects.create(title='Pasta', price=8, featured=False, category=category)
+        order = Order.objects.create(user=self.manager_user, total=8)
+        OrderItem.objects.create(order=order, menuitem=menuitem, quantity=1, unit_price=8, price=8)
+        histograms.reset()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_sampled_request_gets_server_timing(self):
+        with self.settings(PROFILING={'SAMPLE_RATE': 1.0}), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'serializer', 'permissions', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+
+        [entry] = histograms.snapshot()['routes']
+        self.assertEqual((entry['route'], entry['method']), ('api/orders/', 'GET'))
+        self.assertEqual(entry['phases']['total']['count'], 1)
+        self.assertGreater(entry['phases']['serializer']['sum'], 0)
+        self.assertGreater(entry['phases']['permissions']['sum'], 0)
+        self.assertEqual(entry['queries']['sum'], len(ctx.captured_queries))
+
+    def test_rest_framework_classes_are_not_patched(self):
+        for attribute in (serializers.Serializer.data.fget, serializers.ListSerializer.data.fget,
+                          APIView.check_permissions, APIView.check_object_permissions):
+            self.assertFalse(hasattr(attribute, '__wrapped__'), attribute)
+        with self.settings(PROFILING={'SAMPLE_RATE': 1.0, 'SERVER_TIMING': False}):
+            self.client.get('/api/menu-items/')
+            self.client.get('/api/orders/', {'perpage': 1})
+        for entry in histograms.snapshot()['routes']:
+            with self.subTest(route=entry['route']):
+                self.assertGreater(entry['phases']['permissions']['sum'], 0)
+
+    def test_async_request_is_profiled(self):
+        token = Token.objects.create(user=self.manager_user)
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with self.settings(PROFILING={'SAMPLE_RATE': 1.0}):
+            response = self.client.get('/api/async/orders/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    def test_unsampled_request(self):
+        with self.settings(PROFILING={'SAMPLE_RATE': 0.0}):
+            response = self.client.get('/api/orders/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(histograms.snapshot()['routes'], [])
+
+    def test_prometheus_metrics(self):
+        with self.settings(PROFILING={'SAMPLE_RATE': 1.0}):
+            self.client.get('/api/orders/')
+        response = self.client.get('/api/metrics/', HTTP_ACCEPT='text/plain')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE littlelemon_request_phase_seconds histogram', text)
+        self.assertIn(
+            'littlelemon_request_phase_seconds_bucket{route="api/orders/",method="GET",phase="total",le="+Inf"} 1',
+            text)
+        self.assertIn('littlelemon_token_cache_hits_total ', text)
+        self.assertEqual(self.client.get('/api/metrics/').json()['requests']['routes'][0]['route'], 'api/orders/')
+
+
+class SQLiteConnectionProfileTest(TestCase):
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            # 1 = NORMAL
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(cursor.execute('PRAGMA cache_size').fetchone()[0], -16000)
+
+    def test_connections_are_not_persistent(self):
+        # ASGI may leave persistent connections open per async context
+        self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 0)
+        self.assertFalse(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+
+    def test_journal_mode_is_left_to_the_migration(self):
+        # Setting it per connection would rewrite the database file on every command
+        self.assertNotIn('journal_mode', settings.DATABASES['default']['PRAGMAS'])
+
+    def test_atomic_begins_immediate(self):
+        with mock.patch.object(connection, 'cursor') as cursor:
+            connection._start_transaction_under_autocommit()
+        cursor.return_value.execute.assert_called_once_with('BEGIN IMMEDIATE')
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.desserts = Category.objects.create(slug='desserts', title='Desserts')
+        self.pasta = MenuItem.objects.create(title='Pasta', price='8.50', featured=False, category=self.mains)
+        self.lamb = MenuItem.objects.create(title='Lamb', price=12, featured=False, category=self.mains)
+        self.cake = MenuItem.objects.create(title='Cake', price='4.25', featured=False, category=self.desserts)
+
+    def checkout(self, date, *lines):
+        self.client.force_authenticate(self.customer_user)
+        for menuitem, quantity in lines:
+            response = self.client.post('/api/cart/menu-items/', {'menuitem': menuitem.pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/orders/', {'date': date})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def rollups(self):
+        return (
+            list(DailySales.objects.order_by('date').values_list('date', 'orders', 'items', 'revenue')),
+            sorted(DailyMenuItemSales.objects.values_list('date', 'menuitem', 'quantity', 'revenue')),
+            sorted(DailyCategorySales.objects.values_list('date', 'category', 'quantity', 'revenue')),
+        )
+
+    def test_cart_quantity_must_be_positive(self):
+        # A negative line would reach the PositiveIntegerField rollups at checkout
+        self.client.force_authenticate(self.customer_user)
+        for quantity in (0, -1):
+            response = self.client.post('/api/cart/menu-items/', {'menuitem': self.pasta.pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(serializers.ValidationError):
+            upsert_cart_lines(self.customer_user, [(self.pasta, -1)])
+        self.assertFalse(Cart.objects.exists())
+        self.checkout('2023-07-01', (self.pasta, 1))
+
+    def test_checkout_updates_rollups(self):
+        self.checkout('2023-07-01', (self.pasta, 2), (self.cake, 1))
+        self.checkout('2023-07-01', (self.pasta, 1))
+        self.checkout('2023-07-02', (self.lamb, 1))
+        days, menuitems, categories = self.rollups()
+        self.assertEqual([(str(day), orders, items, revenue) for day, orders, items, revenue in days], [
+            ('2023-07-01', 2, 4, Decimal('29.75')),
+            ('2023-07-02', 1, 1, Decimal('12.00')),
+        ])
+        self.assertIn((days[0][0], self.pasta.pk, 3, Decimal('25.50')), menuitems)
+        self.assertIn((days[0][0], self.mains.pk, 3, Decimal('25.50')), categories)
+        self.assertIn((days[0][0], self.desserts.pk, 1, Decimal('4.25')), categories)
+
+    def test_backfill_matches_incremental_rollups(self):
+        self.checkout('2023-07-01', (self.pasta, 2), (self.cake, 1))
+        self.checkout('2023-07-03', (self.lamb, 2))
+        incremental = self.rollups()
+        DailySales.objects.all().delete()
+        DailyMenuItemSales.objects.filter(date='2023-07-03').delete()
+        call_command('backfill_sales', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_deleting_an_order_removes_it(self):
+        self.checkout('2023-07-01', (self.pasta, 2))
+        order_id = self.checkout('2023-07-01', (self.cake, 1))
+        # Not placed through checkout, so never added to the rollups
+        untracked = Order.objects.create(user=self.customer_user, total=99, date='2023-07-09')
+        self.client.force_authenticate(self.manager_user)
+        for pk in (order_id, untracked.pk):
+            response = self.client.delete(f'/api/orders/{pk}/')
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        days, menuitems, categories = self.rollups()
+        self.assertEqual([row[1:] for row in days], [(1, 2, Decimal('17.00'))])
+        self.assertEqual([row[1] for row in menuitems], [self.pasta.pk])
+        self.assertEqual([row[1] for row in categories], [self.mains.pk])
+
+    def test_report_reads_rollups(self):
+        self.checkout('2023-07-01', (self.pasta, 2), (self.cake, 1))
+        self.checkout('2023-07-02', (self.lamb, 1))
+        self.checkout('2023-07-05', (self.cake, 4))
+        self.client.force_authenticate(self.manager_user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/reports/sales/', {'date_from': '2023-07-01', 'date_to': '2023-07-02'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in ctx.captured_queries if 'LittleLemonAPI_order' in q['sql']])
+        self.assertEqual(response.data['totals'], {'orders': 2, 'items': 4, 'revenue': '33.25'})
+        self.assertEqual([day['date'] for day in response.data['days']], ['2023-07-01', '2023-07-02'])
+        self.assertEqual(
+            [(row['title'], row['quantity'], row['revenue']) for row in response.data['menu_items']],
+            [('Pasta', 2, '17.00'), ('Lamb', 1, '12.00'), ('Cake', 1, '4.25')])
+        self.assertEqual([row['title'] for row in response.data['categories']], ['Mains', 'Desserts'])
+
+        response = self.client.get('/api/reports/sales/', {'date_from': 'July'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(self.customer_user)
+        self.assertEqual(self.client.get('/api/reports/sales/').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderDispatchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        crew = Group.objects.create(name='Delivery crew')
+        self.crew = [User.objects.create_user(username=f'crew_{i}', password='admin@10!') for i in range(3)]
+        crew.user_set.add(*self.crew)
+
+    def orders(self, count, **kwargs):
+        return [Order.objects.create(user=self.customer_user, total=10, **kwargs).pk for _ in range(count)]
+
+    def open_orders(self):
+        return [Order.objects.filter(delivery_crew=crew, status=False).count() for crew in self.crew]
+
+    def test_dispatch_balances_open_orders(self):
+        self.orders(3, delivery_crew=self.crew[0])
+        self.orders(1, delivery_crew=self.crew[2])
+        # Delivered orders don't count towards the load
+        self.orders(5, delivery_crew=self.crew[1], status=True)
+        delivered = self.orders(1, status=True)
+        pending = self.orders(5)
+        self.client.force_authenticate(self.manager_user)
+        response = self.client.post('/api/orders/dispatch/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['dispatched'], 5)
+        self.assertEqual(self.open_orders(), [3, 3, 3])
+        # Ties go to the lower user id
+        self.assertEqual(
+            [(row['username'], row['orders'], row['open_orders']) for row in response.data['assignments']],
+            [('crew_1', [pending[0], pending[1], pending[3]], 3), ('crew_2', [pending[2], pending[4]], 3)])
+        self.assertIsNone(Order.objects.get(pk=delivered[0]).delivery_crew)
+
+        # Nothing left to dispatch
+        response = self.client.post('/api/orders/dispatch/')
+        self.assertEqual(response.data, {'dispatched': 0, 'assignments': []})
+
+    def test_limit_takes_the_oldest_orders(self):
+        newer = self.orders(2, date='2023-07-02')
+        older = self.orders(2, date='2023-07-01')
+        self.client.force_authenticate(self.manager_user)
+        response = self.client.post('/api/orders/dispatch/', {'limit': 2})
+        self.assertEqual(response.data['dispatched'], 2)
+        self.assertEqual(sorted(Order.objects.filter(delivery_crew__isnull=True).values_list('pk', flat=True)), newer)
+        self.assertEqual(sorted(pk for row in response.data['assignments'] for pk in row['orders']), older)
+        response = self.client.post('/api/orders/dispatch/', {'limit': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.client.force_authenticate(self.manager_user)
+        # Resolve the manager's roles before counting
+        self.client.post('/api/orders/dispatch/')
+        counts = []
+        for count in (3, 30):
+            self.orders(count)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/orders/dispatch/')
+            self.assertEqual(response.data['dispatched'], count)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_permissions_and_empty_crew(self):
+        self.orders(1)
+        self.client.force_authenticate(self.crew[0])
+        self.assertEqual(self.client.post('/api/orders/dispatch/').status_code, status.HTTP_403_FORBIDDEN)
+        Group.objects.get(name='Delivery crew').user_set.clear()
+        self.client.force_authenticate(self.manager_user)
+        response = self.client.post('/api/orders/dispatch/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(Order.objects.get().delivery_crew)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.other_user = User.objects.create_user(username='test_other', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        crew = User.objects.create_user(username='test_crew', password='admin@10!')
+        crew.groups.create(name='Delivery crew')
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=8, featured=False, category=self.category)
+        self.lamb = MenuItem.objects.create(title='Lamb', price=12, featured=False, category=self.category)
+        self.order = Order.objects.create(user=self.customer_user, total=8)
+        OrderItem.objects.create(order=self.order, menuitem=self.pasta, quantity=1, unit_price=8, price=8)
+        self.client.force_authenticate(self.customer_user)
+
+    def revalidate(self, url, response, header='ETag'):
+        # Ask again with the validator of ``response``
+        if header == 'ETag':
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        return self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_cached_catalog_list_etag_follows_the_rows(self):
+        catalog_cache.backend.clear()
+        response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            not_modified = self.revalidate('/api/menu-items/', response)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertNotEqual(self.client.get('/api/menu-items/?perpage=1')['ETag'], response['ETag'])
+
+        # A worker whose catalog version missed the write still sees the change
+        version = catalog_cache.version()
+        self.category.title = 'Main courses'
+        self.category.save()
+        catalog_cache.backend.clear()
+        catalog_cache.backend.set(catalog_cache._version_key(), version)
+        response = self.revalidate('/api/menu-items/', response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['category']['title'], 'Main courses')
+
+    @override_settings(CATALOG_CACHE={'ENABLED': False})
+    def test_uncached_list_uses_one_aggregate_query(self):
+        for url in ('/api/menu-items/', '/api/categories/'):
+            response = self.client.get(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, response).status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get('/api/menu-items/')
+        # Deleting leaves the latest updated_at alone but not the count
+        MenuItem.objects.filter(pk=self.lamb.pk).delete()
+        self.assertEqual(self.revalidate('/api/menu-items/', response).status_code, status.HTTP_200_OK)
+
+    def test_menu_item_detail(self):
+        url = f'/api/menu-items/{self.pasta.pk}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        for header in ('ETag', 'Last-Modified'):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, response, header).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Featuring another item changes this one's featured flag
+        FeaturedItem.feature(self.lamb)
+        FeaturedItem.feature(self.pasta)
+        response = self.revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['featured'])
+        self.assertEqual(self.client.get('/api/menu-items/999/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_order_list(self):
+        response = self.client.get('/api/orders/')
+        self.assertEqual(self.revalidate('/api/orders/', response).status_code, status.HTTP_304_NOT_MODIFIED)
+        # Dispatching writes with QuerySet.update()
+        self.client.force_authenticate(self.manager_user)
+        self.assertEqual(self.client.post('/api/orders/dispatch/').data['dispatched'], 1)
+        self.client.force_authenticate(self.customer_user)
+        response = self.revalidate('/api/orders/', response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Orders embed their menu items
+        self.pasta.price = 9
+        self.pasta.save()
+        self.assertEqual(self.revalidate('/api/orders/', response).status_code, status.HTTP_200_OK)
+
+        # Same rows, different user
+        self.client.force_authenticate(self.other_user)
+        self.assertEqual(self.revalidate('/api/orders/', response).status_code, status.HTTP_200_OK)
+
+    def test_list_validators_read_only_the_page(self):
+        Order.objects.create(user=self.customer_user, total=12)
+        self.client.force_authenticate(self.manager_user)
+        with override_settings(CATALOG_CACHE={'ENABLED': False}):
+            for url in ('/api/orders/?perpage=1', '/api/menu-items/?perpage=1'):
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                for query in ctx.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+                    if 'SELECT' in query['sql'] and 'IN (' not in query['sql']:
+                        self.assertIn('LIMIT', query['sql'])
+
+        # A new order after the page leaves it alone, a change on it does not
+        response = self.client.get('/api/orders/?perpage=1')
+        Order.objects.create(user=self.other_user, total=5)
+        self.assertEqual(self.revalidate('/api/orders/?perpage=1', response).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.patch(f'/api/orders/{self.order.pk}/', {'status': True})
+        self.assertEqual(self.revalidate('/api/orders/?perpage=1', response).status_code, status.HTTP_200_OK)
+
+    def test_order_detail(self):
+        url = f'/api/orders/{self.order.pk}/'
+        response = self.client.get(url)
+        for header in ('ETag', 'Last-Modified'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.revalidate(url, response, header).status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(len(ctx.captured_queries), 1)
+
+        # Not the other user's order, whatever validators they send
+        self.client.force_authenticate(self.other_user)
+        self.assertEqual(self.revalidate(url, response).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.manager_user)
+        self.client.patch(url, {'status': True})
+        self.client.force_authenticate(self.customer_user)
+        response = self.revalidate(url, response)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['status'])
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class FastPathTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        crew = User.objects.create_user(username='test_crew', password='admin@10!')
+        # Characters the JSON encoders could treat differently
+        titles = ['Pasta', 'Crème brûlée', 'Line\u2028separator', 'Quote " and \\ and \t', '寿司']
+        categories = [Category.objects.create(slug=f'c{i}', title=title) for i, title in enumerate(titles)]
+        menu_items = [
+            MenuItem.objects.create(title=title, price=Decimal(f'{i + 1}.{i}5'), featured=False, category=categories[-i])
+            for i, title in enumerate(titles)
+        ]
+        FeaturedItem.feature(menu_items[2])
+        for i, menuitem in enumerate(menu_items):
+            Cart.objects.create(user=self.customer_user, menuitem=menuitem, quantity=i + 1,
+                                unit_price=menuitem.price, price=menuitem.price * (i + 1))
+        for i in range(4):
+            order = Order.objects.create(user=self.customer_user, total=f'{i}.50', date=f'2023-07-0{i + 1}',
+                                         delivery_crew=crew if i % 2 else None, status=i == 3)
+            for menuitem in menu_items[i:]:
+                OrderItem.objects.create(order=order, menuitem=menuitem, quantity=2,
+                                         unit_price=menuitem.price, price=menuitem.price * 2)
+
+    def assertSameBytes(self, user, url):
+        self.client.force_authenticate(user)
+        with self.settings(FASTPATH={'ENABLED': False}):
+            expected = self.client.get(url)
+        actual = self.client.get(url)
+        self.assertEqual(actual.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_list_endpoints_render_identical_bytes(self):
+        for url in ('/api/menu-items/', '/api/menu-items/?perpage=2&ordering=-price',
+                    '/api/menu-items/?search=pasta', '/api/categories/', '/api/categories/?page=2',
+                    '/api/cart/menu-items/', '/api/orders/', '/api/orders/?ordering=-date&perpage=2'):
+            with self.subTest(url=url):
+                response = self.assertSameBytes(self.customer_user, url)
+        self.assertSameBytes(self.manager_user, '/api/orders/')
+        # Cursors made from the value rows lead to the same next page
+        self.assertSameBytes(self.customer_user, response.data['next'])
+
+    def test_category_fields(self):
+        self.client.force_authenticate(self.customer_user)
+        for fastpath_enabled in (True, False):
+            with self.settings(FASTPATH={'ENABLED': fastpath_enabled}):
+                category = self.client.get('/api/categories/').data['results'][0]
+                menu_item = self.client.get('/api/menu-items/').data['results'][0]
+            self.assertEqual(list(category), ['id', 'slug', 'title'])
+            self.assertEqual(list(menu_item['category']), ['id', 'slug', 'title'])
+
+    def test_fast_path_skips_serializers(self):
+        self.client.force_authenticate(self.customer_user)
+        with mock.patch.object(OrderSerializer, 'to_representation') as to_representation:
+            self.client.get('/api/orders/')
+        to_representation.assert_not_called()
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'decimal': Decimal('12.50'), 'date': datetime.date(2023, 7, 1),
+            'datetime': datetime.datetime(2023, 7, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'text': 'café \u2028 \u2029 \x01', 'none': None, 'float': 0.1, 'list': (1, 2),
+            'queryset': Category.objects.order_by('pk').values_list('slug', flat=True),
+            'error': serializers.ErrorDetail('Invalid', code='invalid'), 3: 'int key',
+            'big': 2 ** 70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'))
+
+
+class MenuItemImportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.create(name='Manager')
+        self.mains = Category.objects.create(slug='mains', title='Mains')
+        self.salads = Category.objects.create(slug='salads', title='Salads')
+        self.pasta = MenuItem.objects.create(title='Pasta', price=10, featured=False, category=self.mains)
+        self.client.force_authenticate(self.manager_user)
+
+    def upload(self, name, content, content_type='application/octet-stream'):
+        return self.client.post('/api/menu-items/import/', {'file': SimpleUploadedFile(name, content, content_type)})
+
+    def test_csv_upload_creates_updates_and_reports_errors(self):
+        content = '\n'.join([
+            'title,price,category_id,featured',
+            f'Pasta,10.00,{self.salads.pk},',
+            f'Greek Salad,8.50,{self.salads.pk},',
+            f'Soup,abc,{self.mains.pk},',
+            f'Bread,2.00,{self.salads.pk + 100},',
+            f',3.00,{self.mains.pk},',
+            f'Greek Salad,8.50,{self.mains.pk},true',
+        ]).encode('utf-8-sig')
+        response = self.upload('menu.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'created', 'updated')},
+            {'rows': 6, 'created': 1, 'updated': 1})
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in response.data['errors']],
+            [(2, ['non_field_errors']), (3, ['price']), (4, ['category_id']), (5, ['title'])])
+        self.pasta.refresh_from_db()
+        self.assertEqual(self.pasta.category, self.salads)
+        # The later duplicate row was used, and its featured flag took the slot
+        greek = MenuItem.objects.get(title='Greek Salad')
+        self.assertEqual(greek.category, self.mains)
+        self.assertEqual(FeaturedItem.current_id(), greek.pk)
+
+    def test_non_utf8_upload_writes_nothing(self):
+        lines = ['title,price,category_id'] + [f'Dish {i},{i}.00,{self.mains.pk}' for i in range(600)]
+        content = '\n'.join(lines).encode() + f'\nCr\xe8me,4.00,{self.mains.pk}\n'.encode('latin-1')
+        for name in ('menu.csv', 'menu.ndjson'):
+            response = self.upload(name, content)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('file', response.data)
+        self.assertEqual(MenuItem.objects.count(), 1)
+
+    def test_unparseable_csv_row_is_reported(self):
+        content = '\n'.join([
+            'title,price,category_id',
+            f'Soup,4.00,{self.mains.pk}',
+            f'{"x" * (csv.field_size_limit() + 1)},5.00,{self.mains.pk}',
+            f'Bread,2.00,{self.mains.pk}',
+        ]).encode()
+        response = self.upload('menu.csv', content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['rows'], response.data['created']), (3, 2))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+
+    def test_titles_are_sanitized(self):
+        self.client.post('/api/menu-items/import/', [
+            {'title': '<script>alert(1)</script>Soup', 'price': '4.00', 'category_id': self.mains.pk},
+        ], format='json')
+        self.assertTrue(MenuItem.objects.filter(title='&lt;script&gt;alert(1)&lt;/script&gt;Soup').exists())
+
+    def test_imported_items_are_searchable_and_listed(self):
+        # Fill the catalog cache first
+        self.client.get('/api/menu-items/')
+        response = self.client.post('/api/menu-items/import/', [
+            {'title': 'Lemon Tart', 'price': '6.00', 'category_id': self.mains.pk},
+        ], format='json')
+        self.assertEqual(response.data['created'], 1)
+        titles = [row['title'] for row in self.client.get('/api/menu-items/').data['results']]
+        self.assertIn('Lemon Tart', titles)
+        response = self.client.get('/api/menu-items/', {'search': 'lemon'})
+        self.assertEqual([row['title'] for row in response.data['results']], ['Lemon Tart'])
+
+    def test_json_and_ndjson_uploads(self):
+        rows = [{'title': 'Soup', 'price': '4.00', 'category_id': self.mains.pk}]
+        response = self.upload('menu.json', json.dumps(rows).encode())
+        self.assertEqual(response.data['created'], 1)
+
+        content = b'\n'.join([
+            json.dumps({'title': 'Bread', 'price': '2.00', 'category_id': self.mains.pk}).encode(),
+            b'{not json',
+            b'',
+            json.dumps({'title': 'Soup', 'price': '4.00', 'category_id': self.salads.pk}).encode(),
+        ])
+        response = self.upload('menu', content, 'application/x-ndjson')
+        self.assertEqual(
+            (response.data['rows'], response.data['created'], response.data['updated']), (3, 1, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+
+        response = self.upload('menu.json', b'{"title": "Soup"}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.upload('menu.xlsx', b'')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/menu-items/import/', {'title': 'Soup'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def import_rows(count, prefix):
+            rows = [{'title': f'{prefix} {i}', 'price': '5.00', 'category_id': self.mains.pk} for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/menu-items/import/', rows, format='json')
+            self.assertEqual(response.data['created'], count)
+            return len(queries)
+
+        # Warm up the role cache; then within one batch (and one INSERT, which
+        # SQLite caps at 999 parameters) the count is fixed
+        import_rows(1, 'Warm-up')
+        self.assertEqual(import_rows(5, 'Small'), import_rows(150, 'Large'))
+
+    def test_only_managers_can_import(self):
+        self.client.force_authenticate(self.customer_user)
+        response = self.client.post('/api/menu-items/import/', [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ResponseFormatTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        category = Category.objects.create(slug='mains', title='Mains')
+        for i in range(40):
+            MenuItem.objects.create(title=f'Dish {i}', price=10 + i, featured=False, category=category)
+        order = Order.objects.create(user=self.customer_user, total=21)
+        for item in MenuItem.objects.all()[:2]:
+            OrderItem.objects.create(order=order, menuitem=item, quantity=1, unit_price=item.price, price=item.price)
+        self.client.force_authenticate(self.customer_user)
+
+    @staticmethod
+    def rows(table):
+        return [dict(zip(table['columns'], row)) for row in table['rows']]
+
+    def test_columnar_json_holds_the_same_rows(self):
+        for url in ('/api/menu-items/?perpage=40', '/api/orders/'):
+            with self.subTest(url=url):
+                expected = json.loads(self.client.get(url).content)
+                response = self.client.get(url, HTTP_ACCEPT='application/vnd.littlelemon.columnar+json')
+                self.assertEqual(response['Content-Type'], 'application/vnd.littlelemon.columnar+json')
+                data = json.loads(response.content)
+                data['results'] = self.rows(data['results'])
+                if url == '/api/orders/':
+                    for order in data['results']:
+                        order['order_items'] = self.rows(order['order_items'])
+                self.assertEqual(data, expected)
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_messagepack_decodes_to_the_json_data(self):
+        expected = json.loads(self.client.get('/api/orders/').content)
+        response = self.client.get('/api/orders/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    @skipIf(msgpack, 'msgpack is installed')
+    def test_messagepack_is_not_acceptable_without_msgpack(self):
+        response = self.client.get('/api/orders/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    def test_large_bodies_are_gzipped(self):
+        plain = self.client.get('/api/menu-items/?perpage=40')
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get('/api/menu-items/?perpage=40', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        # A conditional GET still matches the compressed response's ETag
+        response = self.client.get('/api/menu-items/?perpage=40', HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @skipUnless(zstandard, 'zstandard is not installed')
+    def test_zstd_is_preferred_when_accepted(self):
+        plain = self.client.get('/api/menu-items/?perpage=40')
+        response = self.client.get('/api/menu-items/?perpage=40', HTTP_ACCEPT_ENCODING='gzip, zstd')
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(zstandard.ZstdDecompressor().decompress(response.content), plain.content)
+
+    def test_small_bodies_and_refused_codings_are_not_compressed(self):
+        response = self.client.get('/api/menu-items/?perpage=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        response = self.client.get('/api/menu-items/?perpage=40', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', response)
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'COMPRESSION': {'ENABLED': False}}):
+            response = self.client.get('/api/menu-items/?perpage=40', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_negotiate_coding(self):
+        codings = ['zstd', 'gzip']
+        best = 'zstd' if zstandard else 'gzip'
+        self.assertEqual(negotiate('gzip, zstd', codings), best)
+        self.assertEqual(negotiate('zstd;q=0.5, gzip', codings), 'gzip')
+        self.assertEqual(negotiate('*', codings), best)
+        self.assertEqual(negotiate('*;q=0.1, gzip;q=0', codings), 'zstd' if zstandard else None)
+        self.assertIsNone(negotiate('br, deflate', codings))
+        self.assertIsNone(negotiate('', codings))
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.other_user = User.objects.create_user(username='test_other', password='admin@10!')
+        self.crew_user = User.objects.create_user(username='test_crew', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.crew_user.groups.create(name='Delivery crew')
+        self.manager_user.groups.create(name='Manager')
+        self.tokens = {
+            user.username: Token.objects.create(user=user).key
+            for user in (self.customer_user, self.other_user, self.crew_user, self.manager_user)
+        }
+        self.order = Order.objects.create(user=self.customer_user, total=10)
+
+    async def connect(self, username, **headers):
+        response = await AsyncClient().get(
+            '/api/async/orders/events/', headers={'Authorization': f'Token {self.tokens[username]}', **headers})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await self.read(response.streaming_content), 'retry: 3000\n\n')
+        return response
+
+    @staticmethod
+    def disconnect(response):
+        # What the server does at the end of a response, without closing the
+        # test transaction's connection
+        request_finished.disconnect(close_old_connections)
+        response.close()
+        request_finished.connect(close_old_connections)
+
+    async def read(self, stream):
+        return (await asyncio.wait_for(anext(stream), 2)).decode()
+
+    @override_settings(ORDER_EVENTS={'KEEPALIVE': 0.05})
+    async def test_events_are_scoped_by_role(self):
+        responses = {username: await self.connect(username) for username in self.tokens}
+        streams = {username: response.streaming_content for username, response in responses.items()}
+        try:
+            self.assertEqual(events.hub.subscriber_count(), 4)
+            # Published from another thread, like a sync view's on_commit
+            order = Order(pk=self.order.pk, user_id=self.customer_user.pk, delivery_crew_id=self.crew_user.pk, status=False)
+            event_id = await asyncio.to_thread(events.hub.publish, *events.order_event('order.updated', order))
+            expected = (
+                f'id: {event_id}\nevent: order.updated\n'
+                f'data: {{"id":{self.order.pk},"user":{self.customer_user.pk},'
+                f'"delivery_crew":{self.crew_user.pk},"status":false}}\n\n'
+            )
+            for username in ('test_customer', 'test_crew', 'test_manager'):
+                self.assertEqual(await self.read(streams[username]), expected)
+            self.assertEqual(await self.read(streams['test_other']), ': keep-alive\n\n')
+        finally:
+            for response in responses.values():
+                self.disconnect(response)
+        self.assertEqual(events.hub.subscriber_count(), 0)
+
+    async def test_reconnect_replays_missed_events(self):
+        order = Order(pk=self.order.pk, user_id=self.customer_user.pk, delivery_crew_id=None, status=False)
+        first = events.hub.publish(*events.order_event('order.created', order))
+        events.hub.publish(*events.order_event('order.updated', Order(pk=0, user_id=self.other_user.pk)))
+        second = events.hub.publish(*events.order_event('order.updated', order))
+        response = await self.connect('test_customer', **{'Last-Event-ID': str(first - 1)})
+        stream = response.streaming_content
+        try:
+            self.assertTrue((await self.read(stream)).startswith(f'id: {first}\nevent: order.created\n'))
+            self.assertTrue((await self.read(stream)).startswith(f'id: {second}\nevent: order.updated\n'))
+        finally:
+            self.disconnect(response)
+
+    async def test_unknown_last_event_id_resets(self):
+        hub = events.Hub(history=2)
+        order = Order(pk=1, user_id=1)
+        for _ in range(4):
+            hub.publish(*events.order_event('order.updated', order))
+        scope = events.customer_scope(1)
+        self.assertEqual(hub.subscribe(scope, '2').queue.qsize(), 2)
+        for last_event_id in ('1', '5', 'x'):
+            self.assertEqual(hub.subscribe(scope, last_event_id).queue.get_nowait(), events.RESET)
+
+    async def test_slow_subscriber_gets_a_reset_and_is_dropped(self):
+        hub = events.Hub()
+        subscription = hub.subscribe(events.MANAGER_SCOPE, queue_size=2)
+        for pk in range(3):
+            hub.publish(*events.order_event('order.updated', Order(pk=pk, user_id=1)))
+        await asyncio.sleep(0)
+        self.assertEqual(hub.subscriber_count(), 0)
+        stream = events.EventStream(subscription, events.events_config())
+        chunks = [chunk async for chunk in stream]
+        self.assertEqual(len(chunks), 4)
+        self.assertTrue(chunks[2].startswith('id: 2\n'))
+        self.assertEqual(chunks[3], events.RESET)
+
+    def published(self, publish):
+        return [(kind, data['id'], data['delivery_crew'], data['status'], audience)
+                for (kind, data, audience), _ in publish.call_args_list]
+
+    def test_writes_publish_when_committed(self):
+        customer, crew = events.customer_scope(self.customer_user.pk), events.delivery_crew_scope(self.crew_user.pk)
+        with mock.patch.object(events.hub, 'publish') as publish:
+            self.client.force_authenticate(self.manager_user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/orders/{self.order.pk}/', {'delivery_crew': self.crew_user.pk})
+                # Unchanged: no event
+                self.client.patch(f'/api/orders/{self.order.pk}/', {'delivery_crew': self.crew_user.pk})
+            self.assertEqual(self.published(publish), [
+                ('order.updated', self.order.pk, self.crew_user.pk, False,
+                 frozenset({events.MANAGER_SCOPE, customer, crew})),
+            ])
+
+            publish.reset_mock()
+            self.client.force_authenticate(self.crew_user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/orders/{self.order.pk}/', {'status': True})
+            self.assertEqual(self.published(publish)[0][1:4], (self.order.pk, self.crew_user.pk, True))
+
+            publish.reset_mock()
+            item = MenuItem.objects.create(title='Soup', price=4, featured=False,
+                                           category=Category.objects.create(slug='mains', title='Mains'))
+            Cart.objects.create(user=self.customer_user, menuitem=item, quantity=1, unit_price=4, price=4)
+            self.client.force_authenticate(self.customer_user)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/orders/')
+            self.assertEqual(self.published(publish), [
+                ('order.created', response.data['id'], None, False, frozenset({events.MANAGER_SCOPE, customer}))])
+
+            publish.reset_mock()
+            self.client.force_authenticate(self.manager_user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/orders/dispatch/')
+                self.client.delete(f'/api/orders/{self.order.pk}/')
+            self.assertEqual(
+                [event[:3] for event in self.published(publish)],
+                [('order.updated', response.data['id'], self.crew_user.pk),
+                 ('order.deleted', self.order.pk, self.crew_user.pk)])
+
+    def test_nothing_is_published_on_rollback(self):
+        with mock.patch.object(events.hub, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        events.order_changed('order.updated', [self.order])
+                        raise ValueError
+                except ValueError:
+                    pass
+            publish.assert_not_called()
+
+
+@override_settings(CATALOG_CACHE={'ENABLED': False})
+class QueryPlanTest(TestCase):
+    """
+    EXPLAIN QUERY PLAN of every SELECT the hot endpoints run, per role and
+    ordering. The catalog cache is off, or it would answer the menu lists.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        self.crew_user = User.objects.create_user(username='test_crew', password='admin@10!')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.crew_user.groups.create(name='Delivery crew')
+        self.manager_user.groups.create(name='Manager')
+        self.category = Category.objects.create(slug='mains', title='Mains')
+        items = [MenuItem.objects.create(title=f'Dish {i}', price=i + 1, featured=False, category=self.category)
+                 for i in range(4)]
+        FeaturedItem.feature(items[0])
+        for i in range(4):
+            order = Order.objects.create(user=self.customer_user, delivery_crew=self.crew_user if i % 2 else None,
+                                         total=1, date=f'2023-07-0{i + 1}')
+            OrderItem.objects.create(order=order, menuitem=items[i], quantity=1, unit_price=1, price=1)
+        Cart.objects.create(user=self.customer_user, menuitem=items[0], quantity=1, unit_price=1, price=1)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, user, method, url, allow_scan=None):
+        """
+        Request ``url`` twice (the first warms the role cache) and check the
+        plans of the second, which must run at least one SELECT: no sort, and
+        no unbounded scan.
+        """
+        allow_scan = allow_scan or {}
+        self.client.force_authenticate(user)
+        getattr(self.client, method)(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 300)
+        selects = [query for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects, f'{url} ran no SELECT to check')
+        for query in selects:
+            for detail in self.plan(query['sql']):
+                with self.subTest(url=url, user=user.username, sql=query['sql'][:120], plan=detail):
+                    self.assertNotIn('USE TEMP B-TREE', detail)
+                    self.assertBoundedScan(detail, query['sql'], allow_scan)
+        return response
+
+    def assertBoundedScan(self, detail, sql, allow_scan):
+        """
+        A scan in index order must stop at the statement's LIMIT, or be a
+        latest() subquery (aliased U0...); a scan in rowid order is only
+        allowed of the tables in ``allow_scan`` ({table: SQL fragment}) by
+        the queries containing their fragment.
+        """
+        scan = re.fullmatch(r'SCAN (\S+)( USING (?:COVERING )?INDEX \S+)?', detail)
+        if scan is None:
+            return
+        table, indexed = scan.groups()
+        if not indexed:
+            self.assertIn(allow_scan.get(table, '\0'), sql)
+        elif not re.fullmatch(r'U\d+', table):
+            self.assertRegex(sql, r' LIMIT \d+$')
+
+    def test_order_list_per_role(self):
+        for ordering in ('date', '-date', 'id', '-id'):
+            url = f'/api/orders/?ordering={ordering}&perpage=1'
+            response = self.assertIndexed(self.customer_user, 'get', url)
+            self.assertIndexed(self.customer_user, 'get', response.data['next'])
+            self.assertIndexed(self.crew_user, 'get', url)
+            # The first page of all orders by id reads the table in rowid
+            # order, up to its LIMIT; nothing else may scan it
+            allow_scan = None
+            if ordering in ('id', '-id'):
+                direction = 'DESC' if ordering.startswith('-') else 'ASC'
+                allow_scan = {'LittleLemonAPI_order': f'ORDER BY "LittleLemonAPI_order"."id" {direction} LIMIT'}
+            self.assertIndexed(self.manager_user, 'get', url, allow_scan=allow_scan)
+
+    def test_unsupported_ordering_falls_back_to_date(self):
+        response = self.assertIndexed(self.customer_user, 'get', '/api/orders/?ordering=total')
+        dates = [order['date'] for order in response.data['results']]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_menu_items_by_category(self):
+        for ordering in ('id', 'price', '-price', 'title', '-title', 'rank', 'featured'):
+            self.assertIndexed(self.customer_user, 'get',
+                               f'/api/menu-items/?category_id={self.category.pk}&ordering={ordering}')
+        self.assertIndexed(self.customer_user, 'get', '/api/menu-items/?ordering=price')
+
+    def test_cart_and_order_detail(self):
+        self.assertIndexed(self.customer_user, 'get', '/api/cart/menu-items/')
+        self.assertIndexed(self.customer_user, 'get', f'/api/orders/{Order.objects.first().pk}/')
+
+    def test_dispatch(self):
+        self.assertIndexed(self.manager_user, 'post', '/api/orders/dispatch/')
+
+
+class UserDirectoryTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin@10!', email='a@example.com')
+        self.customer_user = User.objects.create_user(username='test_customer', password='admin@10!')
+        for name in ('ann', 'anna', 'Anne', 'bob', 'annex'):
+            User.objects.create(username=name, email=f'{name}@example.com')
+
+    def usernames(self, response):
+        return [row['username'] for row in response.data['results']]
+
+    def test_pages_by_username_with_userid(self):
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get('/api/users/', {'perpage': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0], {
+            'email': 'Anne@example.com', 'username': 'Anne', 'userid': User.objects.get(username='Anne').pk})
+        seen = self.usernames(response)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += self.usernames(response)
+        self.assertEqual(seen, sorted(User.objects.values_list('username', flat=True)))
+        for row in response.data['results']:
+            self.assertEqual(User.objects.get(pk=row['userid']).username, row['username'])
+
+        response = self.client.get('/api/users/', {'ordering': '-id', 'perpage': 2})
+        self.assertEqual(self.usernames(response), ['annex', 'bob'])
+
+    def test_username_prefix_search(self):
+        self.client.force_authenticate(self.admin_user)
+        self.assertEqual(self.usernames(self.client.get('/api/users/', {'search': 'ann'})), ['ann', 'anna', 'annex'])
+        self.assertEqual(self.usernames(self.client.get('/api/users/', {'search': 'Ann'})), ['Anne'])
+        self.assertEqual(self.usernames(self.client.get('/api/users/', {'search': '%'})), [])
+        # The character after U+D7FF is U+E000, past the surrogates
+        for name in ('\ud7ff', '\ud7ffa', '\ue000'):
+            User.objects.create(username=name, email='x@example.com')
+        response = self.client.get('/api/users/', {'search': '\ud7ff'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.usernames(response), ['\ud7ff', '\ud7ffa'])
+        self.assertEqual(self.usernames(self.client.get('/api/users/', {'search': '\U0010ffff'})), [])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/users/', {'search': 'ann'})
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries.captured_queries[-1]['sql'])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_non_staff_only_see_themselves(self):
+        self.client.force_authenticate(self.customer_user)
+        response = self.client.get('/api/users/')
+        self.assertEqual(self.usernames(response), ['test_customer'])
+
+
+class MembershipBulkTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin@10!', email='a@example.com')
+        self.manager_user = User.objects.create_user(username='test_manager', password='admin@10!')
+        self.manager_user.groups.add(Group.objects.get_or_create(name=roles.MANAGER)[0])
+        self.users = [User.objects.create_user(username=f'crew_{i}', password='admin@10!') for i in range(10)]
+        self.client.force_authenticate(self.manager_user)
+
+    def bulk(self, method, users, group='delivery-crew'):
+        return getattr(self.client, method)(f'/api/groups/{group}/users/bulk/', {'users': users}, format='json')
+
+    def crew(self):
+        return set(User.objects.filter(groups__name=roles.DELIVERY_CREW).values_list('username', flat=True))
+
+    def test_add_and_remove_report_each_user(self):
+        first, second, third = self.users[:3]
+        self.bulk('post', [first.username])
+        response = self.bulk('post', [first.username, second.pk, 'nobody', 999, second.username])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'added': ['crew_1'], 'unchanged': ['crew_0'], 'not_found': ['nobody', 999]})
+        self.assertEqual(self.crew(), {'crew_0', 'crew_1'})
+
+        response = self.bulk('delete', [first.pk, third.username, 'nobody'])
+        self.assertEqual(response.data, {'removed': ['crew_0'], 'unchanged': ['crew_2'], 'not_found': ['nobody']})
+        self.assertEqual(self.crew(), {'crew_1'})
+
+    def test_roles_change_immediately(self):
+        crew = self.users[0]
+        self.assertFalse(roles.is_delivery_crew(crew))
+        self.bulk('post', [crew.username])
+        self.assertTrue(roles.is_delivery_crew(User.objects.get(pk=crew.pk)))
+        self.bulk('delete', [crew.username])
+        self.assertFalse(roles.is_delivery_crew(User.objects.get(pk=crew.pk)))
+
+    def test_query_count_is_independent_of_user_count(self):
+        self.bulk('post', [self.users[0].username])
+        counts = []
+        for method in ('post', 'delete'):
+            for users in (self.users[1:2], self.users[2:]):
+                with CaptureQueriesContext(connection) as queries:
+                    self.bulk(method, [user.username for user in users])
+                counts.append(len(queries.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[2], counts[3])
+
+    def test_permissions(self):
+        self.assertEqual(self.bulk('post', ['crew_0'], group='manager').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.bulk('post', ['crew_0']).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.admin_user)
+        response = self.bulk('post', ['crew_0'], group='manager')
+        self.assertEqual(response.data['added'], ['crew_0'])
+        self.assertTrue(roles.is_manager(User.objects.get(username='crew_0')))
+
+    def test_invalid_lists(self):
+        for users in ([], [''], [True], [{'id': 1}], 'crew_0', [10 ** 20], [-2 ** 63 - 1]):
+            self.assertEqual(self.bulk('post', users).status_code, status.HTTP_400_BAD_REQUEST, users)
+        self.assertEqual(self.crew(), set())
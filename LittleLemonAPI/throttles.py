@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .roles import DELIVERY_CREW, MANAGER, get_roles
+
+THROTTLING_DEFAULTS = {
+    'ENABLED': True,
+    # Hard cap on tracked buckets; the least recently used one goes first
+    'MAX_KEYS': 100000,
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def throttling_config():
+    return {**THROTTLING_DEFAULTS, **getattr(settings, 'THROTTLING', {})}
+
+
+_parsed_rates = {}
+
+
+def parse_rate(rate):
+    """
+    Turn a DRF style rate such as ``'100/min'`` into ``(capacity, refill per
+    second)``; the bucket holds one period's worth of requests.
+    """
+    parsed = _parsed_rates.get(rate)
+    if parsed is None:
+        num, period = rate.split('/')
+        capacity = int(num)
+        parsed = _parsed_rates[rate] = (capacity, capacity / PERIODS[period[0]])
+    return parsed
+
+
+class TokenBucketStore:
+    """
+    Token buckets kept in process memory, one ``[tokens, stamp, full_at]``
+    list per key.
+
+    Keys are kept in least recently used order. A bucket that has refilled
+    completely is indistinguishable from a new one, so idle buckets are
+    dropped from the old end as they are passed, and ``MAX_KEYS`` bounds the
+    total.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def consume(self, key, capacity, refill):
+        """Take one token from ``key``'s bucket; return the wait in seconds, 0 if allowed."""
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill)
+                self._buckets.move_to_end(key)
+            if tokens < 1:
+                wait = (1 - tokens) / refill
+            else:
+                tokens -= 1
+                wait = 0
+            if bucket is None:
+                self._buckets[key] = [tokens, now, now + (capacity - tokens) / refill]
+                self._evict(now)
+            else:
+                bucket[0], bucket[1], bucket[2] = tokens, now, now + (capacity - tokens) / refill
+        return wait
+
+    def _evict(self, now):
+        buckets = self._buckets
+        max_keys = throttling_config()['MAX_KEYS']
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if oldest[2] > now and len(buckets) <= max_keys:
+                break
+            buckets.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+bucket_store = TokenBucketStore()
+
+
+def client_role(user):
+    if user is None or not user.is_authenticated:
+        return 'anon'
+    roles = get_roles(user)
+    if MANAGER in roles:
+        return 'manager'
+    if DELIVERY_CREW in roles:
+        return 'delivery_crew'
+    return 'customer'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class: ``get_rate`` picks the rate from
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] and ``get_bucket_key`` the bucket.
+    """
+    store = bucket_store
+
+    def get_rate(self, request, view, role):
+        raise NotImplementedError
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError
+
+    def get_client_key(self, request):
+        user = request.user
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'anon:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        if not throttling_config()['ENABLED']:
+            return True
+        rate = self.get_rate(request, view, client_role(request.user))
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+        self.wait_seconds = self.store.consume(self.get_bucket_key(request, view), capacity, refill)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per client across the whole API, sized by role."""
+
+    def get_rate(self, request, view, role):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(role)
+
+    def get_bucket_key(self, request, view):
+        return self.get_client_key(request)
+
+
+class EndpointTokenBucketThrottle(TokenBucketThrottle):
+    """
+    One bucket per client and endpoint. The endpoint is the view's
+    ``throttle_scope`` or its URL name; its rate is looked up as
+    ``<scope>.<role>``, ``<scope>``, ``endpoint.<role>`` then ``endpoint``.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None and request.resolver_match is not None:
+            scope = request.resolver_match.url_name
+        return scope or 'endpoint'
+
+    def get_rate(self, request, view, role):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        scope = self.get_scope(request, view)
+        for name in (f'{scope}.{role}', scope, f'endpoint.{role}', 'endpoint'):
+            if name in rates:
+                return rates[name]
+        return None
+
+    def get_bucket_key(self, request, view):
+        return f'{self.get_scope(request, view)}:{self.get_client_key(request)}'
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from .views import MenuItemListCreateAPIView, SingleMenuItemRetrieveUpdateDestroyAPIView, CustomUserViewSet, CartItemsAPIView, CategoryListCreateAPIView
-from . import views
+from . import views, async_views
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
 
@@ -13,18 +13,34 @@ urlpatterns = [
     path('', include(router.urls)),
     path('menu-items/<int:pk>/', SingleMenuItemRetrieveUpdateDestroyAPIView.as_view(), name='singlemenuitem-retrieve-update-destroy'),  
     path('menu-items/', MenuItemListCreateAPIView.as_view(), name='menuitem-list-create'), 
+    path('menu-items/import/', views.MenuItemImport, name='menuitem-import'),
     path('categories/', CategoryListCreateAPIView.as_view(), name='category-list-create'), 
     path('groups/manager/users/', views.ManagerUser, name='groups-manager-user-list-create'), 
     path('groups/manager/users/<int:pk>/', views.ManagerUserRemove, name='groups-manager-user-delete'), 
+    path('groups/manager/users/bulk/', views.ManagerUserBulk, name='groups-manager-user-bulk'),
     path('groups/delivery-crew/users/', views.DeliveryCrewUser, name='groups-deliverycrew-user-list-create'),    
     path('groups/delivery-crew/users/<int:pk>/', views.DeliveryCrewUserRemove, name='groups-deliverycrew-user-delete'),    
+    path('groups/delivery-crew/users/bulk/', views.DeliveryCrewUserBulk, name='groups-deliverycrew-user-bulk'),
     path('users/', CustomUserViewSet.as_view({'post': 'create', 'get':'list'}), name='custom-user-create'),  
     path('users/users/me/', views.Me, name='custom-user-getusername'), 
     path('token/login/', views.TokenCreateView.as_view(), name='token-create'), 
     path('auth-token/', obtain_auth_token, name='auth-token'),
     path('cart/menu-items/', CartItemsAPIView.as_view(), name='cart-items'),
+    path('cart/menu-items/bulk/', views.CartBulkAPIView.as_view(), name='cart-items-bulk'),
     path('orders/', views.OrderListCreate, name='order-list-create'),
     path('cart/orders/', views.OrderListCreate, name='order-list-create'),
+    path('orders/export/', views.OrderExport, name='order-export'),
+    path('orders/dispatch/', views.OrderDispatch, name='order-dispatch'),
     path('orders/<int:orderId>/', views.OrderDetail, name='singleorderitem-retrieve-update-destroy'),  
+    path('metrics/', views.Metrics, name='metrics'),
+    path('reports/sales/', views.SalesReport, name='sales-report'),
+    # Async (ASGI) read-only variants of the endpoints above
+    path('async/menu-items/', async_views.menu_items, name='async-menuitem-list'),
+    path('async/menu-items/<int:pk>/', async_views.menu_item, name='async-singlemenuitem'),
+    path('async/categories/', async_views.categories, name='async-category-list'),
+    path('async/cart/menu-items/', async_views.cart, name='async-cart-items'),
+    path('async/orders/', async_views.orders, name='async-order-list'),
+    path('async/orders/<int:orderId>/', async_views.order, name='async-singleorder'),
+    path('async/orders/events/', async_views.order_events, name='async-order-events'),
  
 ]
\ No newline at end of file
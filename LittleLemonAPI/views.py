@@ -1,16 +1,32 @@
+import sys
 from rest_framework import generics, permissions, status, viewsets, mixins
 from django.contrib.auth.models import Group, User
 from django.contrib.auth import get_user_model
-from .models import Category, MenuItem, Cart, Order, OrderItem
-from .serializers import  CategorySerializer, MenuItemSerializer, CartSerializer, OrderSerializer
+from .models import Category, MenuItem, FeaturedItem, Cart, Order
+from .serializers import  CategorySerializer, MenuItemSerializer, CartSerializer, CartBulkSerializer, OrderSerializer, SalesReportSerializer, GroupMembersBulkSerializer
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import permission_classes, parser_classes, renderer_classes, action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from djoser.views import UserViewSet, TokenCreateView
 from djoser.serializers import UserSerializer
 from rest_framework.pagination import PageNumberPagination
+from .cache import CatalogCacheMixin
+from .conditional import ConditionalGetMixin, conditional_response, latest, page_validators, validators
+from .fastpath import FastListMixin
+from .roles import DELIVERY_CREW, MANAGER, is_manager, is_delivery_crew
+from .checkout import checkout
+from .dispatch import dispatch_orders
+from .pagination import MenuItemCursorPagination, OrderCursorPagination, UserCursorPagination
+from .profiling import ProfiledAPIViewMixin, api_view
+from .renderers import NDJSONRenderer, CSVRenderer, PrometheusRenderer
+from rest_framework.renderers import JSONRenderer
+from . import events, export, fastpath, memberships, menu_import, metrics, sales
+from django.db import transaction
+from .search import search_menu_items
 
  
 class IsManagerOrReadOnly(permissions.BasePermission):
@@ -20,13 +36,13 @@ class IsManagerOrReadOnly(permissions.BasePermission):
         if request.method == 'GET':
             return request.user.is_authenticated
         else:
-            return request.user.is_authenticated and request.user.groups.filter(name='Manager').exists() 
+            return request.user.is_authenticated and is_manager(request.user)
 class IsAdminOrManagerOrReadOnly(permissions.BasePermission):
     message = "You must have the Admin or Manager role to perform this action."
     def has_permission(self, request, view):
         if request.method in ['GET', 'HEAD', 'OPTIONS']:
             return request.user.is_authenticated
-        return request.user.is_authenticated and (request.user.is_superuser or request.user.groups.filter(name='Manager').exists())
+        return request.user.is_authenticated and (request.user.is_superuser or is_manager(request.user))
 class IsAdminOrReadOnly(permissions.BasePermission):
     message = "You must have the Admin role to perform this action."
     def has_permission(self, request, view):
@@ -38,59 +54,103 @@ class IsManager(permissions.BasePermission):
     message = "You must have the Manager role to perform this action."
 
     def has_permission(self, request, view): 
-        return request.user.is_authenticated  and request.user.groups.filter(name='Manager').exists()  
-class MenuItemListCreateAPIView(generics.ListCreateAPIView):
+        return request.user.is_authenticated and is_manager(request.user)
+class MenuItemListCreateAPIView(ProfiledAPIViewMixin, ConditionalGetMixin, CatalogCacheMixin, FastListMixin, generics.ListCreateAPIView):
      
     serializer_class = MenuItemSerializer
+    fast_listing = fastpath.MENU_ITEMS
+    conditional_related = ['category__updated_at', latest(FeaturedItem)]
+    catalog_cache_name = 'menu-items'
     permission_classes = [IsAdminOrManagerOrReadOnly] 
+    # Sorting (ordering=price|-price|title|-title, by relevance when searching) and page size (perpage) are handled by the paginator
+    pagination_class = MenuItemCursorPagination
+    # ...so OrderingFilter takes no fields of its own
+    ordering_fields = []
     def get_queryset(self):
         category_id = self.request.query_params.get('category_id')  # Get the category ID from query parameters
-        ordering_fields=['price']  # Get the sort by price parameter
         search_query = self.request.query_params.get('search')  # Get the search for title field
-        perpage = self.request.query_params.get('perpage', default=3)  # Get the perpage number of items by perpage parameter
-        page = self.request.query_params.get('page', default=1)  # Get the current page number by page parameter
         
-        
-        queryset = MenuItem.objects.all()
+        queryset = MenuItem.objects.select_related('category')
 
         if category_id:
             queryset = queryset.filter(category_id=category_id)
     
         if search_query:
-            queryset = queryset.filter(title__icontains=search_query)
+            # Ranked full-text search over item and category titles, prefix matching each word
+            queryset = search_menu_items(queryset, search_query)
              
         
         return queryset
-class CategoryListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Category.objects.all()
+@api_view(['POST'])
+@permission_classes([IsManager])
+@parser_classes([JSONParser, MultiPartParser])
+def MenuItemImport(request):
+    # Create or update menu items from an uploaded CSV, JSON or NDJSON "file",
+    # or from a JSON list body, in batches; rows with errors are skipped and
+    # reported with their row number
+    if isinstance(request.data, list):
+        rows = request.data
+    elif 'file' in request.FILES:
+        rows = menu_import.read_rows(request.FILES['file'])
+    else:
+        return Response({'file': 'Upload a CSV, JSON or NDJSON file, or post a JSON list of rows.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(menu_import.import_menu_items(rows))
+
+class CategoryListCreateAPIView(ProfiledAPIViewMixin, ConditionalGetMixin, CatalogCacheMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = Category.objects.order_by('pk')
     serializer_class = CategorySerializer
+    fast_listing = fastpath.CATEGORIES
+    catalog_cache_name = 'categories'
     permission_classes = [IsAdminOrManagerOrReadOnly]
-class SingleMenuItemRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MenuItem.objects.all()
+    # Indexed columns only; OrderingFilter ignores any other ?ordering=
+    ordering_fields = ['id', 'slug', 'title', 'updated_at']
+class SingleMenuItemRetrieveUpdateDestroyAPIView(ProfiledAPIViewMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MenuItem.objects.select_related('category')
     serializer_class = MenuItemSerializer
+    conditional_related = ['category__updated_at', latest(FeaturedItem)]
     permission_classes = [IsAdminOrManagerOrReadOnly] 
-class CustomUserViewSet(UserViewSet):
+def username_prefix(queryset, prefix):
+    # A range on the unique username index: SQLite's LIKE, which
+    # __startswith uses, is case-insensitive and can't use it
+    following = ord(prefix[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # Surrogates can't be encoded (nor stored), the next character is U+E000
+        following = 0xE000
+    if following > sys.maxunicode:
+        return queryset.filter(username__startswith=prefix)
+    return queryset.filter(username__gte=prefix, username__lt=prefix[:-1] + chr(following))
+
+class CustomUserViewSet(ProfiledAPIViewMixin, UserViewSet):
     permission_classes = [permissions.AllowAny]
+    # Sorted by ordering=username|-username|id|-id and paginated by cursor
+    pagination_class = UserCursorPagination
+    ordering_fields = []
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        # Add 'userid' field to each user in the response
-        data = serializer.data
-        for i, user_data in enumerate(data):
-            user_data['userid'] = queryset[i].id
-        return Response(data)
+        # Usernames starting with ?search=
+        prefix = request.query_params.get('search')
+        if prefix:
+            queryset = username_prefix(queryset, prefix)
+        page = self.paginate_queryset(queryset)
+        data = self.get_serializer(page, many=True).data
+        # Add 'userid' field to each user in the response, from the same rows
+        for user, user_data in zip(page, data):
+            user_data['userid'] = user.pk
+        return self.get_paginated_response(data)
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers) 
-class CartItemsAPIView(APIView):
+class CartItemsAPIView(ProfiledAPIViewMixin, APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        cart_items = Cart.objects.filter(user=user)
+        cart_items = Cart.objects.filter(user=user).select_related('menuitem')
+        if fastpath.enabled():
+            return Response(fastpath.CART_LINES.build(fastpath.CART_LINES.values(cart_items)))
         serializer = CartSerializer(cart_items, many=True)
         return Response(serializer.data)
 
@@ -107,6 +167,23 @@ class CartItemsAPIView(APIView):
         Cart.objects.filter(user=user).delete()
         return Response(status=204)
 
+class CartBulkAPIView(ProfiledAPIViewMixin, APIView):
+    # Add or update many cart lines in one request:
+    # {"items": [{"menuitem": 1, "quantity": 2}, ...], "mode": "add" | "set"}
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartBulkSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        with transaction.atomic():
+            serializer.save()
+            cart_items = list(Cart.objects.filter(user=request.user).select_related('menuitem'))
+        return Response(CartSerializer(cart_items, many=True).data)
+
+# Orders embed their items' menu items, with their category and featured flag
+ORDER_RELATED = [latest(MenuItem), latest(Category), latest(FeaturedItem)]
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated]) 
 def OrderListCreate(request):
@@ -115,63 +192,44 @@ def OrderListCreate(request):
 
     if request.method == 'GET':
         # Check the role of the user
-        if user.groups.filter(name='Manager').exists():
+        if is_manager(user):
             # Manager role, retrieve all orders with items
-            orders = Order.objects.all()
+            orders = Order.objects.with_items()
              
-        elif user.groups.filter(name='Delivery crew').exists():
+        elif is_delivery_crew(user):
             # Delivery crew role, retrieve orders assigned to the user with items
-            orders = Order.objects.filter(delivery_crew=user)
+            orders = Order.objects.with_items().filter(delivery_crew=user)
             
         else:
             # Customer role, retrieve orders created by the user with items
-            orders = Order.objects.filter(user=user)
-         
-        ordering = request.query_params.get('ordering') 
-        
-        if ordering:
-            ordering_fields = ordering.split(",")
-            orders = orders.order_by(*ordering_fields)
+            orders = Order.objects.with_items().filter(user=user)
          
+        def respond():
+            # Sorted by ordering=date|-date|id|-id and paginated by cursor
+            paginator = OrderCursorPagination()
+            if fastpath.enabled():
+                return paginator.get_paginated_response(fastpath.paginate(fastpath.ORDERS, paginator, orders, request))
+            page = paginator.paginate_queryset(orders, request)
 
-        # Serialize the request
-        serializer = OrderSerializer(orders, many=True)
- 
-        return Response(serializer.data)
+            # Serialize the request
+            serializer = OrderSerializer(page, many=True)
+
+            return paginator.get_paginated_response(serializer.data)
+
+        # 304 when the client's copy of the page is current, checked with one
+        # query bounded by the page size
+        page = OrderCursorPagination().get_page_queryset(orders, request)
+        etag = page_validators(request, page, ORDER_RELATED, scope=[user.pk])
+        return conditional_response(request, etag, None, respond)
 
     if request.method == 'POST':
-        # Get the cart items for the current user
-        cart_items = Cart.objects.filter(user=user)
-        if not cart_items:
+        # Move the cart into a new order in one transaction
+        order = checkout(user, date=request.data.get('date'))
+        if order is None:
             return Response({'message':'There is no cart related to this user!'} , status=status.HTTP_404_NOT_FOUND)
-            
-        # Create a new order
-        order = Order.objects.create(user=user, status=False, total=0)
-
-        # Iterate through the cart items and add them to the order items
-        order_items = []
-        total_price = 0
-        for cart_item in cart_items:
-            menuitem = MenuItem.objects.get(pk=cart_item.menuitem.pk)
-            order_item = OrderItem.objects.create(
-                order=order,
-                menuitem=menuitem,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.menuitem.price,
-                price=cart_item.price
-            )
-            order_items.append(order_item)
-            total_price += cart_item.price
-
-        # Set the total price for the order
-        order.total = total_price
-        order.date = request.data['date']
-        order.save()
-
-        # Delete all items from the cart for this user
-        cart_items.delete()
 
         # Serialize the order and order items
+        order = Order.objects.with_items().get(pk=order.pk)
         serializer = OrderSerializer(order)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -182,12 +240,21 @@ def OrderDetail(request, orderId):
     # Get the current user
     user = request.user
 
+    if request.method == 'GET':
+        # Validators from the order row alone when it is the user's, so an
+        # unchanged order is a 304 without loading its items
+        count, etag, last_modified = validators(request, Order.objects.filter(id=orderId, user=user), ORDER_RELATED)
+        if count:
+            return conditional_response(
+                request, etag, last_modified,
+                lambda: Response(OrderSerializer(get_object_or_404(Order.objects.with_items(), id=orderId)).data))
+
     # Retrieve the order by orderId
-    order = get_object_or_404(Order, id=orderId)
+    order = get_object_or_404(Order.objects.with_items(), id=orderId)
 
     if request.method == 'GET':
         # Check if the order belongs to the current user
-        if order.user != user:
+        if order.user_id != user.pk:
             return Response({'message': 'This order does not belong to the current user.'}, status=status.HTTP_403_FORBIDDEN)
         
         serializer = OrderSerializer(order)
@@ -209,15 +276,71 @@ def OrderDetail(request, orderId):
 
     if request.method == 'DELETE':
         # Check if the user has the Manager role
-        if user.groups.filter(name='Manager').exists():
-            # Manager can delete the order
-            order.delete()
+        if is_manager(user):
+            # Manager can delete the order; it leaves the daily sales rollups too
+            with transaction.atomic():
+                sales.record_order(order, order.order_items.all(), sign=-1)
+                events.order_changed('order.deleted', [order])
+                order.delete()
             return Response({'message': 'Order deleted.'}, status=status.HTTP_204_NO_CONTENT)
 
         # Customer and Delivery crew are not allowed to delete the order
         return Response({'message': 'You are not allowed to delete this order.'}, status=status.HTTP_403_FORBIDDEN)
 
 
+@api_view(['GET'])
+@permission_classes([IsManager])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def OrderExport(request):
+    # Stream orders with their items as NDJSON (default) or CSV (?format=csv),
+    # optionally filtered by date_from, date_to and status
+    orders = export.export_queryset(export.parse_filters(request.query_params))
+
+    if request.accepted_renderer.format == 'csv':
+        response = StreamingHttpResponse(export.stream_csv(orders), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
+    else:
+        response = StreamingHttpResponse(export.stream_ndjson(orders), content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="orders.ndjson"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsManager])
+def OrderDispatch(request):
+    # Assign every unassigned, undelivered order (or the oldest ?limit= of
+    # them) to the delivery crew member with the fewest open orders
+    limit = request.data.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return Response({'limit': 'Must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'limit': 'Must be at least 1.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    assignments = dispatch_orders(limit)
+    if assignments is None:
+        return Response({'message': 'There is no delivery crew to dispatch orders to.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'dispatched': sum(len(assignment['orders']) for assignment in assignments.values()),
+        'assignments': [
+            {'delivery_crew': crew_id, **assignment} for crew_id, assignment in assignments.items()
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+def SalesReport(request):
+    # Revenue, order and item counts for ?date_from=&date_to= (inclusive),
+    # read from the daily rollups instead of the orders
+    date_from, date_to = export.parse_date_range(request.query_params)
+    try:
+        top = min(max(int(request.query_params.get('top', 10)), 1), 100)
+    except ValueError:
+        return Response({'top': 'Must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+    data = SalesReportSerializer(sales.report(date_from, date_to, top=top)).data
+    return Response({'date_from': date_from, 'date_to': date_to, **data})
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsManager])
 def DeliveryCrewUser(request):
@@ -241,7 +364,7 @@ def DeliveryCrewUser(request):
 @permission_classes([IsManager])
 def DeliveryCrewUserRemove(request, pk):
     user = get_object_or_404(User, pk=pk)
-    if not user.groups.filter(name='Delivery crew').exists():
+    if not is_delivery_crew(user):
         return Response({"message": "The user is not in delivery crew role."}, status=status.HTTP_404_NOT_FOUND)
     delivery_crews = Group.objects.get(name="Delivery crew")
     
@@ -274,7 +397,7 @@ def ManagerUser(request):
 @permission_classes([IsAdminUser])
 def ManagerUserRemove(request, pk):
     user = get_object_or_404(User, pk=pk)
-    if not user.groups.filter(name='Manager').exists():
+    if not is_manager(user):
         return Response({"message": "The user is not in manager role."}, status=status.HTTP_404_NOT_FOUND)
     managers = Group.objects.get(name="Manager")
     
@@ -284,6 +407,35 @@ def ManagerUserRemove(request, pk):
      
     return Response({"message": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
+def bulk_membership(request, group_name):
+    # POST adds, DELETE removes the listed users ({"users": [id or username, ...]})
+    serializer = GroupMembersBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    users = serializer.validated_data['users']
+    if request.method == 'POST':
+        return Response(memberships.add_members(group_name, users))
+    return Response(memberships.remove_members(group_name, users))
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAdminUser])
+def ManagerUserBulk(request):
+    return bulk_membership(request, MANAGER)
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsManager])
+def DeliveryCrewUserBulk(request):
+    return bulk_membership(request, DELIVERY_CREW)
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@renderer_classes([JSONRenderer, PrometheusRenderer])
+def Metrics(request):
+    # Hit rates and lookup latency of the token and catalog caches, and the
+    # per-route request histograms; Prometheus text with ?format=prometheus
+    # or Accept: text/plain
+    return Response(metrics.collect())
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def Me(request):